@@ -0,0 +1,238 @@
+from typing import Optional, List, Dict, Any, Callable, TypedDict
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from cpe_manager.corpus import CASES, load_page, available_parsers
+from cpe_manager.parsers import get_parser
+
+# Benchmarks de cpe_manager. Micro: parseo de cada tipo de pagina del corpus. Startup: import y get_controller en un
+# interprete nuevo. Macro: ciclo login/consulta/logout de un equipo y barridos de flota contra el simulador local.
+# Los resultados se guardan por commit para comparar.
+
+RESULTS_PATH = os.path.join(".bench", "results.jsonl")
+
+class Bench_Result(TypedDict):
+    name: str
+    group: str
+    iterations: int
+    seconds: float
+    ops_per_second: float
+    p50_ms: float
+    p99_ms: float
+    peak_rss_mb: float
+    errors: int
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+def peak_rss_mb() -> float:
+    # ru_maxrss es el maximo de todo el proceso, viene en KB en linux y en bytes en macOS.
+    # Por eso cada benchmark corre en su propio interprete (run_isolated), si no se arrastra el pico del anterior
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def summarize(name: str, group: str, samples: List[float], seconds: float, errors: int = 0,
+              peak_rss: Optional[float] = None) -> Bench_Result:
+    return {
+        "name": name,
+        "group": group,
+        "iterations": len(samples),
+        "seconds": seconds,
+        "ops_per_second": len(samples) / seconds if seconds else 0.0,
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "peak_rss_mb": peak_rss_mb() if peak_rss is None else peak_rss,
+        "errors": errors
+    }
+
+ISOLATED_SCRIPT = """
+import json, sys
+from cpe_manager import bench
+spec = json.loads(sys.argv[1])
+result = getattr(bench, spec["function"])(*spec["args"], **spec["kwargs"])
+print(json.dumps(result))
+"""
+
+def run_isolated(function: str, *args, **kwargs) -> Bench_Result:
+    """ Corre un benchmark de este modulo en un interprete nuevo, asi peak_rss_mb es solo el suyo """
+    spec = json.dumps({"function": function, "args": args, "kwargs": kwargs})
+    output = subprocess.run([sys.executable, "-c", ISOLATED_SCRIPT, spec], capture_output=True, text=True, check=True).stdout
+    # Los controladores pueden imprimir algo, el resultado es la ultima linea
+    return json.loads(output.strip().splitlines()[-1])
+
+def time_calls(name: str, group: str, function: Callable[[], Any], iterations: int) -> Bench_Result:
+    samples = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        call_start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - call_start)
+    return summarize(name, group, samples, time.perf_counter() - start)
+
+# ------------ micro ----------------
+def micro_benchmark(parser_name: str, case_index: int, iterations: int = 500) -> Bench_Result:
+    """ Un parser sobre una pagina del corpus (CASES[case_index]) """
+    case = CASES[case_index]
+    page = load_page(case["model"], case["page"])
+    method = getattr(get_parser(parser_name), case["method"])
+    # En un interprete nuevo la primera llamada paga los imports del parser (bs4), no es parte de lo que se mide
+    method(page)
+    return time_calls(f"{parser_name}:{case['model']}/{case['page']}:{case['method']}", "micro", lambda: method(page), iterations)
+
+def micro_benchmarks(iterations: int = 500, parsers: Optional[List[str]] = None) -> List[Bench_Result]:
+    return [ run_isolated("micro_benchmark", parser_name, case_index, iterations)
+             for parser_name in parsers or available_parsers() for case_index in range(len(CASES)) ]
+
+# ------------ arranque ----------------
+# Modulos que un script corto no deberia cargar solo por pedir un controlador
+HEAVY_MODULES = ("selenium", "psutil", "bs4", "lxml", "pyarrow", "numpy")
+
+STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import cpe_manager.cpe_manager
+controller = cpe_manager.cpe_manager.get_controller(sys.argv[1]) if sys.argv[1] else None
+seconds = time.perf_counter() - start
+from cpe_manager.bench import peak_rss_mb
+print(json.dumps({"seconds": seconds, "heavy": [name for name in sys.argv[2:] if name in sys.modules], "peak_rss_mb": peak_rss_mb()}))
+"""
+
+def startup_benchmarks(iterations: int = 20, models: Optional[List[str]] = None) -> List[Bench_Result]:
+    """ Tiempo de import del registro y de get_controller, cada muestra en un interprete nuevo.
+        Se cuenta como error cada corrida que termino importando alguno de HEAVY_MODULES """
+    results = []
+    for model in [""] + (models or ["vsol_v2802dac", "vsol_acz"]):
+        samples, errors, peak_rss = [], 0, 0.0
+        start = time.perf_counter()
+        for _ in range(iterations):
+            output = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT, model, *HEAVY_MODULES],
+                                    capture_output=True, text=True, check=True).stdout
+            sample = json.loads(output)
+            samples.append(sample["seconds"])
+            errors += bool(sample["heavy"])
+            # El pico que importa es el del interprete medido, no el de este proceso
+            peak_rss = max(peak_rss, sample["peak_rss_mb"])
+        results.append(summarize(f"startup:{model or 'registry'}", "startup", samples, time.perf_counter() - start, errors, peak_rss))
+    return results
+
+# ------------ macro ----------------
+def _is_success(result: Any) -> bool:
+    return isinstance(result, list) or (isinstance(result, tuple) and bool(result) and result[0].name == "SUCCESS")
+
+def device_cycle_benchmark(iterations: int = 200, operation: str = "get_wifi_clients", **simulator_config) -> Bench_Result:
+    """ login -> operacion -> logout contra una sola ONU simulada """
+    from cpe_manager.fleet import build_controller, run_operation
+    from cpe_manager.simulator import ONU_Simulator_Process
+
+    with ONU_Simulator_Process(1, **simulator_config) as simulator:
+        device = simulator.inventory()[0]
+        samples, errors = [], 0
+        start = time.perf_counter()
+        for _ in range(iterations):
+            call_start = time.perf_counter()
+            result = run_operation(build_controller(device), operation) # type: ignore
+            samples.append(time.perf_counter() - call_start)
+            errors += not _is_success(result)
+        return summarize(f"device_cycle:{operation}", "macro", samples, time.perf_counter() - start, errors)
+
+def fleet_sweep_benchmark(size: int, operation: str = "get_wifi_clients", max_workers: int = 64,
+                          per_group_limit: int = 64, **simulator_config) -> Bench_Result:
+    """ Barrido de toda la flota simulada con Fleet_Executor, la latencia es la de cada equipo """
+    from cpe_manager.fleet import Fleet_Executor
+    from cpe_manager.simulator import ONU_Simulator_Process
+
+    executor = Fleet_Executor(max_workers=max_workers, per_group_limit=per_group_limit)
+    with ONU_Simulator_Process(size, **simulator_config) as simulator:
+        devices = simulator.inventory()
+
+        def timed(device):
+            call_start = time.perf_counter()
+            result = executor.run_device(device, operation)
+            return time.perf_counter() - call_start, result
+
+        samples, errors = [], 0
+        start = time.perf_counter()
+        for _, (elapsed, result) in executor.dispatch(devices, timed):
+            samples.append(elapsed)
+            errors += not _is_success(result["result"])
+        return summarize(f"fleet_sweep:{operation}:{size}", "macro", samples, time.perf_counter() - start, errors)
+
+def macro_benchmarks(sizes: List[int], iterations: int = 200, **simulator_config) -> List[Bench_Result]:
+    results = [run_isolated("device_cycle_benchmark", iterations, **simulator_config)]
+    for size in sizes:
+        results.append(run_isolated("fleet_sweep_benchmark", size, **simulator_config))
+    return results
+
+# ------------ resultados ----------------
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def save_results(results: List[Bench_Result], path: str = RESULTS_PATH) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    run = {"revision": git_revision(), "timestamp": time.time(), "python": platform.python_version(), "host": platform.node()}
+    with open(path, "a", encoding="utf-8") as results_file:
+        for result in results:
+            results_file.write(json.dumps(dict(run, **result)) + "\n")
+
+def load_results(revision: str, path: str = RESULTS_PATH) -> Dict[str, Dict[str, Any]]:
+    """ Ultimo resultado de cada benchmark para un commit """
+    results = {}
+    if not os.path.exists(path):
+        return results
+    with open(path, encoding="utf-8") as results_file:
+        for line in results_file:
+            result = json.loads(line)
+            if result["revision"] == revision:
+                results[result["name"]] = result
+    return results
+
+def print_results(results: List[Bench_Result], baseline: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
+    print(f"{'benchmark':<78} {'ops/s':>11} {'p50 ms':>9} {'p99 ms':>9} {'rss MB':>8} {'err':>5}")
+    for result in results:
+        line = (f"{result['name']:<78} {result['ops_per_second']:>11.1f} {result['p50_ms']:>9.3f} "
+                f"{result['p99_ms']:>9.3f} {result['peak_rss_mb']:>8.1f} {result['errors']:>5}")
+        if baseline and result["name"] in baseline and baseline[result["name"]]["ops_per_second"]:
+            change = result["ops_per_second"] / baseline[result["name"]]["ops_per_second"] - 1
+            line += f"  {change:+.1%}"
+        print(line)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmarks de cpe_manager")
+    parser.add_argument("--micro", action="store_true", help="solo parseo de paginas")
+    parser.add_argument("--macro", action="store_true", help="solo ciclos contra el simulador")
+    parser.add_argument("--startup", action="store_true", help="solo tiempo de import y get_controller")
+    parser.add_argument("--sizes", default="100,1000,10000", help="tamaños de flota para los barridos")
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="latencia de las ONUs simuladas")
+    parser.add_argument("--compare", metavar="REV", help="compara contra los resultados guardados de otro commit")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    run_all = not args.micro and not args.macro and not args.startup
+    results: List[Bench_Result] = []
+    if args.startup or run_all:
+        results += startup_benchmarks()
+    if args.micro or run_all:
+        results += micro_benchmarks(args.iterations)
+    if args.macro or run_all:
+        sizes = [int(size) for size in args.sizes.split(",") if size]
+        results += macro_benchmarks(sizes, min(args.iterations, 200), latency_ms=args.latency_ms)
+
+    print_results(results, load_results(args.compare) if args.compare else None)
+    if not args.no_save:
+        save_results(results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+from typing import Optional, List, Callable, Any
+from contextlib import contextmanager
+import atexit
+import os
+import queue
+import threading
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+def chrome_factory() -> Any:
+    """ Crea un Chrome headless, selenium solo se importa aqui """
+    from selenium import webdriver
+    options = webdriver.ChromeOptions()
+    options.add_argument('--headless')
+    options.add_argument('--disable-gpu')
+    options.add_argument('--disable-extensions')
+    options.add_argument('--no-sandbox')
+    return webdriver.Chrome(options = options)
+
+def _process_tree_rss(pid: int) -> Optional[int]:
+    """ RSS en bytes del proceso y todos sus hijos (chromedriver -> chrome -> renderers) """
+    if psutil is not None:
+        try:
+            process = psutil.Process(pid)
+            return sum(p.memory_info().rss for p in [process] + process.children(recursive=True))
+        except psutil.Error:
+            return None
+
+    # Sin psutil se lee /proc directamente, solo funciona en linux
+    total = 0
+    pending = [pid]
+    try:
+        while pending:
+            current = pending.pop()
+            with open(f"/proc/{current}/status") as status:
+                for line in status:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as children:
+                    pending.extend(int(child) for child in children.read().split())
+    except (OSError, ValueError):
+        return None
+    return total
+
+class _Pooled_Browser:
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages = 0
+
+    def pid(self) -> Optional[int]:
+        try:
+            return self.driver.service.process.pid
+        except AttributeError:
+            return None
+
+    def rss(self) -> Optional[int]:
+        pid = self.pid()
+        return _process_tree_rss(pid) if pid else None
+
+    def is_healthy(self) -> bool:
+        try:
+            return self.driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    def quit(self) -> None:
+        try:
+            self.driver.quit()
+        except Exception:
+            pass
+
+class Browser_Pool:
+    """ Pool de navegadores headless que se mantienen abiertos y se prestan a los controladores """
+    SIZE = 2
+    # Cada navegador se cierra y se vuelve a crear luego de esta cantidad de paginas
+    MAX_PAGES = 100
+    # Techo de memoria de todo el pool, cada navegador puede usar como maximo su parte
+    MAX_MEMORY_MB = 1024
+    BORROW_TIMEOUT = 120
+
+    def __init__(self, size: Optional[int] = None, max_pages: Optional[int] = None,
+                 max_memory_mb: Optional[int] = None, borrow_timeout: Optional[float] = None,
+                 driver_factory: Callable[[], Any] = chrome_factory):
+        self.SIZE = size or self.SIZE
+        self.MAX_PAGES = max_pages or self.MAX_PAGES
+        self.MAX_MEMORY_MB = max_memory_mb or self.MAX_MEMORY_MB
+        self.BORROW_TIMEOUT = borrow_timeout or self.BORROW_TIMEOUT
+        self.driver_factory = driver_factory
+        self._idle: "queue.LifoQueue[_Pooled_Browser]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.SIZE)
+        self._lock = threading.Lock()
+        self._browsers: List[_Pooled_Browser] = []
+        self._closed = False
+
+    @property
+    def max_browser_rss(self) -> int:
+        return self.MAX_MEMORY_MB * 1024 * 1024 // self.SIZE
+
+    def _create(self) -> _Pooled_Browser:
+        browser = _Pooled_Browser(self.driver_factory())
+        with self._lock:
+            self._browsers.append(browser)
+        return browser
+
+    def _destroy(self, browser: _Pooled_Browser) -> None:
+        with self._lock:
+            if browser in self._browsers:
+                self._browsers.remove(browser)
+        browser.quit()
+
+    def _over_memory(self, browser: _Pooled_Browser) -> bool:
+        rss = browser.rss()
+        return rss is not None and rss > self.max_browser_rss
+
+    def _acquire(self) -> _Pooled_Browser:
+        if not self._slots.acquire(timeout=self.BORROW_TIMEOUT):
+            raise TimeoutError(f"No hay navegadores libres luego de {self.BORROW_TIMEOUT}s")
+        try:
+            while True:
+                try:
+                    browser = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._create()
+                # La memoria tambien se mira al prestarlo: un navegador que crecio mientras esperaba (timers, workers
+                # de la pagina anterior) no se vuelve a usar
+                if not self._over_memory(browser) and browser.is_healthy():
+                    return browser
+                self._destroy(browser)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _release(self, browser: _Pooled_Browser, failed: bool) -> None:
+        try:
+            browser.pages += 1
+            if failed or self._closed or browser.pages >= self.MAX_PAGES or self._over_memory(browser):
+                self._destroy(browser)
+                return
+            try:
+                # Se limpia para que la siguiente pagina no vea nada del CPE anterior
+                browser.driver.delete_all_cookies()
+                browser.driver.get("about:blank")
+            except Exception:
+                self._destroy(browser)
+                return
+            self._idle.put(browser)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def borrow(self):
+        """ Presta un navegador (el driver de selenium) y lo devuelve al pool al salir del bloque """
+        if self._closed:
+            raise RuntimeError("El pool de navegadores ya fue cerrado")
+        browser = self._acquire()
+        failed = False
+        try:
+            yield browser.driver
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._release(browser, failed)
+
+    def render(self, url: str) -> str:
+        """ Carga la URL y devuelve el HTML ya renderizado """
+        with self.borrow() as driver:
+            driver.get(url)
+            return driver.page_source
+
+    def memory_usage(self) -> int:
+        with self._lock:
+            browsers = list(self._browsers)
+        return sum(browser.rss() or 0 for browser in browsers)
+
+    def close(self) -> None:
+        self._closed = True
+        with self._lock:
+            browsers = list(self._browsers)
+        for browser in browsers:
+            self._destroy(browser)
+
+_default_pool: Optional[Browser_Pool] = None
+_default_pool_lock = threading.Lock()
+
+def configure_browser_pool(**kwargs) -> Browser_Pool:
+    """ Reemplaza el pool compartido, recibe los mismos parametros que Browser_Pool """
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is not None:
+            _default_pool.close()
+        _default_pool = Browser_Pool(**kwargs)
+        return _default_pool
+
+def get_browser_pool() -> Browser_Pool:
+    """ Pool compartido por todos los controladores, se crea en el primer uso """
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = Browser_Pool()
+        return _default_pool
+
+@atexit.register
+def _close_default_pool() -> None:
+    if _default_pool is not None:
+        _default_pool.close()
@@ -0,0 +1,83 @@
+# Paginas de cada firmware soportado, para comparar velocidad y resultados de los parsers sin tener un CPE a mano
+from typing import Optional, List, Dict, Any, Iterable, TypedDict
+import json
+import os
+import time
+from cpe_manager.parsers import PARSERS, BS4_Parser, get_parser
+
+CORPUS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+class Corpus_Case(TypedDict, total=False):
+    model: str
+    page: str
+    # Metodo de Page_Parser que se usa con esta pagina
+    method: str
+    # JSON con la salida correcta, para los metodos que comparten todos los parsers (comparar contra bs4 no prueba nada)
+    expected: str
+
+CASES: List[Corpus_Case] = [
+    {"model": "vsol_v2802dac", "page": "login.asp", "method": "csrf_token"},
+    {"model": "vsol_v2802dac", "page": "login.asp", "method": "verification_code"},
+    {"model": "vsol_v2802dac", "page": "mgm_usr_user.asp", "method": "csrf_token"},
+    {"model": "vsol_v2802dac", "page": "formWlanSetup.html", "method": "result_message"},
+    {"model": "vsol_v2802dac", "page": "formWlanSetup.html", "method": "csrf_token"},
+    # Token comentado, atributos data-* y un <h4> dentro de un script
+    {"model": "vsol_v2802dac", "page": "formWlanSetup.tricky.html", "method": "result_message"},
+    {"model": "vsol_v2802dac", "page": "formWlanSetup.tricky.html", "method": "csrf_token"},
+    {"model": "vsol_v2802dac", "page": "status_wlan_info_11n.asp", "method": "vsol_2802dac_wifi_clients"},
+    {"model": "vsol_v2802dac", "page": "status_ethernet_info.asp", "method": "dhcp_js"},
+    # Nombres reales con parentesis, comillas y escapes de JS
+    {"model": "vsol_v2802dac", "page": "status_ethernet_info.names.asp", "method": "dhcp_js", "expected": "status_ethernet_info.names.json"},
+    {"model": "vsol_v2802dac", "page": "status_ethernet_info.rendered.html", "method": "dhcp_table"},
+    {"model": "vsol_acz", "page": "Status_Connected_User.html", "method": "vsol_acz_wifi_clients"},
+    {"model": "vsol_acz", "page": "E8BDhcpClientList", "method": "acz_dhcp_list"},
+]
+
+def page_path(model: str, page: str) -> str:
+    return os.path.join(CORPUS_DIR, model, page)
+
+def load_page(model: str, page: str) -> str:
+    with open(page_path(model, page), encoding="utf-8") as page_file:
+        return page_file.read()
+
+def available_parsers() -> List[str]:
+    """ Los backends que se pueden instanciar aqui (lxml es opcional) """
+    names = []
+    for name in PARSERS:
+        try:
+            get_parser(name)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+def compare_parsers(parsers: Optional[Iterable[str]] = None, repeat: int = 200,
+                    cases: Optional[List[Corpus_Case]] = None) -> List[Dict[str, Any]]:
+    """ Corre cada parser sobre el corpus, mide el tiempo por pagina y compara contra la salida de BeautifulSoup """
+    parsers = list(parsers or available_parsers())
+    reference = get_parser(BS4_Parser.NAME)
+    results = []
+    for case in cases or CASES:
+        page = load_page(case["model"], case["page"])
+        if case.get("expected"):
+            with open(page_path(case["model"], case["expected"]), encoding="utf-8") as expected_file:
+                expected = json.load(expected_file)
+        else:
+            expected = getattr(reference, case["method"])(page)
+        for name in parsers:
+            method = getattr(get_parser(name), case["method"])
+            output = method(page)
+            start = time.perf_counter()
+            for _ in range(repeat):
+                method(page)
+            elapsed = time.perf_counter() - start
+            results.append({
+                "model": case["model"],
+                "page": case["page"],
+                "method": case["method"],
+                "parser": name,
+                "us_per_page": elapsed / repeat * 1e6,
+                "matches_reference": output == expected,
+                "records": len(output) if isinstance(output, list) else None
+            })
+    return results
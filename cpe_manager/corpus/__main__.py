@@ -0,0 +1,4 @@
+from cpe_manager.corpus import compare_parsers
+for result in compare_parsers():
+    print(f"{result['model']:<15} {result['page']:<36} {result['method']:<26} {result['parser']:<6} "
+          f"{result['us_per_page']:>10.1f}us  {'ok' if result['matches_reference'] else 'DIFFERENT'}")
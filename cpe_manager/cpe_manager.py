@@ -1,10 +1,75 @@
-from typing import Optional
-from cpe_manager.models.base import CPE_HTTP_Controller
-from cpe_manager.models import vsol
+from typing import Optional, Dict, List, Type, Union, TYPE_CHECKING
+from importlib import import_module
+import threading
 
-CONTROLLERS = {
-    'vsol_v2802dac': vsol._2802dac.Controller
+if TYPE_CHECKING:
+    from cpe_manager.models.base import CPE_HTTP_Controller
+
+# Los modelos se registran como "modulo:clase" y recien se importan la primera vez que se piden, asi un script
+# que solo usa un modelo no paga el import de todos los demas (ni de sus dependencias).
+# Modelos de terceros se agregan con un entry point en el grupo "cpe_manager.controllers", por ejemplo en su setup.py:
+#   entry_points={"cpe_manager.controllers": ["marca_modelo = paquete.modulo:Clase"]}
+ENTRY_POINT_GROUP = "cpe_manager.controllers"
+
+CONTROLLERS: Dict[str, Union[str, Type["CPE_HTTP_Controller"]]] = {
+    'vsol_v2802dac': "cpe_manager.models.vsol._2802dac:Controller",
+    'vsol_acz': "cpe_manager.models.vsol._acz:VSOL_ACZ"
 }
 
-def get_controller(model_name: str) -> Optional[CPE_HTTP_Controller]:
-    return CONTROLLERS.get(model_name)
+# Modelo a usar en el inventario cuando no se sabe, se detecta con cpe_manager.fingerprint
+AUTO_MODEL = "auto"
+
+_lock = threading.Lock()
+_entry_points_loaded = False
+
+def _load(target: str) -> Type["CPE_HTTP_Controller"]:
+    module_name, _, attribute = target.partition(":")
+    return getattr(import_module(module_name), attribute)
+
+def _entry_points() -> list:
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        return []
+    found = entry_points()
+    if hasattr(found, "select"):
+        return list(found.select(group=ENTRY_POINT_GROUP))
+    return list(found.get(ENTRY_POINT_GROUP, []))
+
+def discover_controllers() -> None:
+    """ Agrega los modelos de los entry points instalados, sin importarlos. Los registrados a mano tienen prioridad """
+    global _entry_points_loaded
+    with _lock:
+        if _entry_points_loaded:
+            return
+        for entry_point in _entry_points():
+            CONTROLLERS.setdefault(entry_point.name, entry_point.value)
+        _entry_points_loaded = True
+
+def register_controller(model_name: str, controller: Union[str, Type["CPE_HTTP_Controller"]]) -> None:
+    """ Registra un modelo, como clase o como "modulo:clase" para importarlo recien cuando se use """
+    with _lock:
+        CONTROLLERS[model_name] = controller
+
+def available_controllers() -> List[str]:
+    discover_controllers()
+    return sorted(CONTROLLERS)
+
+def get_controller(model_name: str) -> Optional[Type["CPE_HTTP_Controller"]]:
+    controller = CONTROLLERS.get(model_name)
+    if controller is None and not _entry_points_loaded:
+        # Los entry points solo se leen si el modelo no es uno de los propios, leer la metadata de los paquetes no es gratis
+        discover_controllers()
+        controller = CONTROLLERS.get(model_name)
+    if isinstance(controller, str):
+        loaded = _load(controller)
+        with _lock:
+            CONTROLLERS[model_name] = loaded
+        return loaded
+    return controller
+
+def detect_controller(cpe_address: str, cache=None) -> Optional[Type["CPE_HTTP_Controller"]]:
+    """ Controlador para el modelo detectado en el CPE (ver cpe_manager.fingerprint), None si no se reconoce """
+    from cpe_manager.fingerprint import detect
+    fingerprint = detect(cpe_address, cache)
+    return get_controller(fingerprint["model"]) if fingerprint else None
@@ -0,0 +1,212 @@
+from typing import Optional, List, Dict, Any, Iterable, Iterator, TypedDict
+import hashlib
+import json
+import os
+import threading
+import time
+from cpe_manager.fleet import Fleet_Device, Fleet_Executor, Fleet_Result, Operation
+
+# Polling incremental: se guarda la ultima lista de clientes de cada CPE y en cada consulta solo se emiten
+# los clientes que entraron, salieron o cambiaron, mas un checkpoint completo cada tanto para poder reconstruir.
+# Los CPE cuya lista no cambia se consultan cada vez menos seguido.
+
+class Client_Event(TypedDict):
+    timestamp: float
+    cpe_address: str
+    # join, leave, change o checkpoint
+    event: str
+    # None en los checkpoint y en los clientes sin MAC
+    mac: Optional[str]
+    # El cliente como lo devolvio el controlador (el anterior en los leave), en los checkpoint la lista completa
+    client: Any
+    # Solo en los change: {campo: [antes, ahora]}
+    changes: Optional[Dict[str, List[Any]]]
+
+class _CPE_State(TypedDict):
+    digest: str
+    clients: Dict[str, Dict[str, Any]]
+    polls_since_checkpoint: int
+    interval: float
+    next_poll: float
+
+def client_mac(client: Dict[str, Any]) -> Optional[str]:
+    """ MAC normalizada del cliente, sirve para los dict de la V2802DAC (device_mac) y de la ACZ (macAddr) """
+    mac = client.get("device_mac") or client.get("macAddr")
+    return mac.lower().replace("-", ":") if mac else None
+
+def client_key(client: Dict[str, Any]) -> str:
+    """ Con que se reconoce al cliente entre consultas: la MAC, o si no vino (ip, nombre). La posicion en la lista
+        no sirve, el CPE puede devolverla en otro orden """
+    mac = client_mac(client)
+    if mac:
+        return mac
+    return "#" + json.dumps([client.get("device_ip") or client.get("ipAddr"), client.get("device_name") or client.get("devname")])
+
+def _event(cpe_address: str, event: str, mac: Optional[str], client: Any,
+           changes: Optional[Dict[str, List[Any]]] = None) -> Client_Event:
+    return {"timestamp": time.time(), "cpe_address": cpe_address, "event": event, "mac": mac, "client": client, "changes": changes}
+
+class Delta_Engine:
+    """ Compara cada consulta de clientes con la anterior del mismo CPE y devuelve solo las diferencias """
+    # Cada cuantas consultas de un CPE se emite su lista completa
+    CHECKPOINT_EVERY = 50
+    # Campos que cambian en cada consulta (contadores, tiempos de lease), no generan eventos change
+    VOLATILE_FIELDS = ("packets_sent", "packets_received", "send_rate_mbps", "lease_time", "liveTime")
+    # El RSSI oscila solo, se considera cambio recien a partir de esta diferencia en dBm
+    RSSI_THRESHOLD = 6
+    # Intervalo de polling adaptativo: empieza en MIN_INTERVAL, se multiplica por BACKOFF cada consulta sin cambios
+    # hasta MAX_INTERVAL y vuelve a MIN_INTERVAL con el primer cambio
+    MIN_INTERVAL = 60.0
+    MAX_INTERVAL = 900.0
+    BACKOFF = 2.0
+
+    def __init__(self, path: Optional[str] = None, checkpoint_every: Optional[int] = None,
+                 min_interval: Optional[float] = None, max_interval: Optional[float] = None):
+        self.path = path
+        self.CHECKPOINT_EVERY = checkpoint_every or self.CHECKPOINT_EVERY
+        self.MIN_INTERVAL = min_interval or self.MIN_INTERVAL
+        self.MAX_INTERVAL = max_interval or self.MAX_INTERVAL
+        self._lock = threading.Lock()
+        self._state: Dict[str, _CPE_State] = {}
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    # ------------ diff ----------------
+    def _digest(self, clients: List[Dict[str, Any]]) -> str:
+        # Huella de la lista sin los campos volatiles, si es igual a la anterior no hace falta comparar cliente por cliente
+        stable = sorted(json.dumps({ key: value for key, value in client.items() if key not in self.VOLATILE_FIELDS },
+                                   sort_keys=True, default=str) for client in clients)
+        return hashlib.blake2b("\n".join(stable).encode(), digest_size=16).hexdigest()
+
+    def _changes(self, before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, List[Any]]:
+        changes = {}
+        for key in set(before) | set(after):
+            if key in self.VOLATILE_FIELDS or before.get(key) == after.get(key):
+                continue
+            if key == "rssi_dbm":
+                try:
+                    if abs(int(before[key]) - int(after[key])) < self.RSSI_THRESHOLD:
+                        continue
+                except (KeyError, TypeError, ValueError):
+                    pass
+            changes[key] = [before.get(key), after.get(key)]
+        return changes
+
+    def update(self, cpe_address: str, clients: List[Dict[str, Any]], now: Optional[float] = None) -> List[Client_Event]:
+        """ Registra una consulta de clientes del CPE y devuelve los eventos que generó """
+        now = time.time() if now is None else now
+        digest = self._digest(clients)
+        with self._lock:
+            state = self._state.get(cpe_address)
+            events: List[Client_Event] = []
+            current: Dict[str, Dict[str, Any]] = {}
+            for client in clients:
+                key = base = client_key(client)
+                # Dos clientes sin MAC con la misma ip y nombre se distinguen por cual aparece primero
+                repeated = 0
+                while key in current:
+                    repeated += 1
+                    key = f"{base}#{repeated}"
+                current[key] = client
+
+            if state is None:
+                # Primera consulta del CPE: no hay con que comparar, se emite directamente el checkpoint
+                state = self._state[cpe_address] = {"digest": digest, "clients": current, "polls_since_checkpoint": self.CHECKPOINT_EVERY - 1,
+                                                    "interval": self.MIN_INTERVAL, "next_poll": now}
+            elif digest != state["digest"]:
+                # La base de comparacion de cada cliente es la ultima version que genero un evento, asi una deriva
+                # lenta de RSSI termina generando un change aunque cada paso quede bajo el umbral
+                previous = state["clients"]
+                baseline = {}
+                for key, client in current.items():
+                    if key not in previous:
+                        events.append(_event(cpe_address, "join", client_mac(client), client))
+                        baseline[key] = client
+                        continue
+                    changes = self._changes(previous[key], client)
+                    if changes:
+                        events.append(_event(cpe_address, "change", client_mac(client), client, changes))
+                    baseline[key] = client if changes else previous[key]
+                for key, client in previous.items():
+                    if key not in current:
+                        events.append(_event(cpe_address, "leave", client_mac(client), client))
+                state["clients"] = baseline
+                state["digest"] = digest
+
+            # Los CPE sin cambios se consultan cada vez menos, el primer cambio vuelve al intervalo minimo
+            state["interval"] = self.MIN_INTERVAL if events else min(state["interval"] * self.BACKOFF, self.MAX_INTERVAL)
+            state["next_poll"] = now + state["interval"]
+
+            state["polls_since_checkpoint"] += 1
+            if state["polls_since_checkpoint"] >= self.CHECKPOINT_EVERY:
+                events.append(_event(cpe_address, "checkpoint", None, clients))
+                state["polls_since_checkpoint"] = 0
+            return events
+
+    def feed(self, results: Iterable[Fleet_Result]) -> Iterator[Client_Event]:
+        """ Recibe resultados de Fleet_Executor.stream(). Los que no son listas de clientes (errores) no cambian el estado,
+            un CPE que no respondio no significa que sus clientes se fueron """
+        for result in results:
+            if isinstance(result["result"], list):
+                yield from self.update(result["cpe_address"], result["result"])
+
+    # ------------ polling adaptativo ----------------
+    def interval(self, cpe_address: str) -> float:
+        with self._lock:
+            state = self._state.get(cpe_address)
+            return state["interval"] if state else self.MIN_INTERVAL
+
+    def is_due(self, cpe_address: str, now: Optional[float] = None) -> bool:
+        now = time.time() if now is None else now
+        with self._lock:
+            state = self._state.get(cpe_address)
+            return state is None or state["next_poll"] <= now
+
+    def due_devices(self, devices: Iterable[Fleet_Device], now: Optional[float] = None) -> Iterator[Fleet_Device]:
+        """ Solo los equipos a los que ya les toca ser consultados """
+        now = time.time() if now is None else now
+        for device in devices:
+            if self.is_due(device["cpe_address"], now): # type: ignore
+                yield device
+
+    def poll(self, executor: Fleet_Executor, devices: Iterable[Fleet_Device], operation: Operation = "get_wifi_clients",
+             *args, **kwargs) -> Iterator[Client_Event]:
+        """ Una pasada: consulta los equipos que corresponde y entrega los eventos a medida que llegan """
+        return self.feed(executor.stream(self.due_devices(devices), operation, *args, **kwargs))
+
+    # ------------ persistencia ----------------
+    def save(self, path: Optional[str] = None) -> None:
+        """ Escribe el estado en disco (JSON), primero a un temporal para no dejar el archivo a medias """
+        path = path or self.path
+        if path is None:
+            raise ValueError("Delta_Engine.save necesita un path")
+        with self._lock:
+            data = json.dumps(self._state, default=str)
+        temporary = f"{path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as state_file:
+            state_file.write(data)
+            state_file.flush()
+            os.fsync(state_file.fileno())
+        os.replace(temporary, path)
+
+    def load(self, path: Optional[str] = None) -> None:
+        path = path or self.path
+        with open(path, encoding="utf-8") as state_file: # type: ignore
+            state = json.load(state_file)
+        with self._lock:
+            self._state = state
+
+    def forget(self, cpe_address: str) -> None:
+        """ Olvida el CPE, la siguiente consulta se toma como la primera (checkpoint) """
+        with self._lock:
+            self._state.pop(cpe_address, None)
+
+    def __len__(self) -> int:
+        return len(self._state)
+
+    def __enter__(self) -> "Delta_Engine":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self.path is not None:
+            self.save()
@@ -0,0 +1,191 @@
+from typing import Optional, Dict, Tuple, TypedDict
+import re
+import sqlite3
+import threading
+import time
+from cpe_manager import transport
+
+# Deteccion del modelo de un CPE con una o dos peticiones sin login, para no depender de lo que diga el inventario.
+# Se mira el contenido de la pagina de login (la de /admin/login.asp o a la que redirija la raiz):
+#   V2802DAC: form de formLogin con el script que llena check_code
+#   ACZ: form de formLogin con usuario y psd, sin check_code
+# El resultado se guarda por direccion (y MAC si se conoce) con un TTL, las pasadas siguientes no vuelven a preguntar.
+
+class Fingerprint(TypedDict):
+    cpe_address: str
+    # MAC del CPE segun la tabla ARP de este host, None si no esta en la misma red
+    mac: Optional[str]
+    model: str
+    firmware: Optional[str]
+    detected_at: float
+
+# En orden, la raiz solo se pide si login.asp no es una pagina de login conocida
+PROBE_URLS = ("http://{cpe_address}/admin/login.asp", "http://{cpe_address}/")
+LOGIN_FORM_MARKER = "/boaform/admin/formLogin"
+CHECK_CODE_MARKER = "check_code"
+PASSWORD_FIELD_REGEX_PATTERN = r"name\s*=\s*[\"']psd[\"']"
+FIRMWARE_REGEX_PATTERN = r"(?:[Ff]irmware|[Ss]oftware)\s*[Vv]ersion\s*:?\s*(?:<[^>]+>\s*)*([\w][\w.\-]*\d[\w.\-]*)"
+# Timeouts cortos, si el equipo no contesta la deteccion falla y el circuit breaker de scheduling se encarga
+PROBE_TIMEOUT = (3.0, 5.0)
+ARP_TABLE_PATH = "/proc/net/arp"
+# Segundos que se reutiliza la tabla ARP leida, en una pasada por toda la flota se lee una vez y no una por equipo
+ARP_TABLE_TTL = 5.0
+
+_arp_lock = threading.Lock()
+_arp_table: Dict[str, str] = {}
+_arp_read_at = float("-inf")
+
+def arp_table(max_age: float = ARP_TABLE_TTL) -> Dict[str, str]:
+    """ {ip: mac} de la tabla ARP de linux, se vuelve a leer si la ultima lectura tiene mas de max_age segundos """
+    global _arp_table, _arp_read_at
+    with _arp_lock:
+        if time.monotonic() - _arp_read_at < max_age:
+            return _arp_table
+        table = {}
+        try:
+            with open(ARP_TABLE_PATH, encoding="ascii") as arp_file:
+                for line in arp_file.readlines()[1:]:
+                    fields = line.split()
+                    if len(fields) >= 4 and fields[3] != "00:00:00:00:00:00":
+                        table[fields[0]] = fields[3].lower()
+        except OSError:
+            pass
+        _arp_table, _arp_read_at = table, time.monotonic()
+        return table
+
+def arp_mac(cpe_address: str, max_age: float = ARP_TABLE_TTL) -> Optional[str]:
+    """ MAC de la direccion en la tabla ARP de linux, sin tocar el equipo """
+    return arp_table(max_age).get(cpe_address.split(":")[0])
+
+def firmware_version(page: str) -> Optional[str]:
+    match = re.search(FIRMWARE_REGEX_PATTERN, page)
+    return match.group(1) if match else None
+
+def model_from_page(page: str) -> Optional[str]:
+    """ Modelo segun el form de login de la pagina, None si no es uno conocido """
+    if LOGIN_FORM_MARKER not in page:
+        return None
+    if CHECK_CODE_MARKER in page:
+        return "vsol_v2802dac"
+    if re.search(PASSWORD_FIELD_REGEX_PATTERN, page):
+        return "vsol_acz"
+    return None
+
+def probe_model(cpe_address: str, timeout: Tuple[float, float] = PROBE_TIMEOUT) -> Optional[Tuple[str, Optional[str]]]:
+    """ Devuelve (modelo, firmware) o None si no se reconoce o no responde """
+    session = transport.new_session()
+    try:
+        for url in PROBE_URLS:
+            try:
+                page = session.get(url.format(cpe_address=cpe_address), timeout=timeout)
+            except Exception:
+                return None
+            model = model_from_page(page.text) if page.status_code == 200 else None
+            if model is not None:
+                return (model, firmware_version(page.text))
+        return None
+    finally:
+        session.close()
+
+class Fingerprint_Cache:
+    """ Huellas ya detectadas, en memoria. Si la MAC del equipo cambio (se reemplazo la ONU) la huella no vale """
+    # Segundos que vale una huella, los equipos cambian poco de modelo pero si de firmware
+    TTL = 7 * 24 * 3600
+
+    def __init__(self, ttl: Optional[float] = None):
+        self.TTL = ttl or self.TTL
+        self._lock = threading.Lock()
+        self._fingerprints: Dict[str, Fingerprint] = {}
+
+    def get(self, cpe_address: str, mac: Optional[str] = None) -> Optional[Fingerprint]:
+        fingerprint = self._get(cpe_address)
+        if fingerprint is None or time.time() - fingerprint["detected_at"] >= self.TTL:
+            return None
+        if mac and fingerprint["mac"] and mac != fingerprint["mac"]:
+            return None
+        return fingerprint
+
+    def put(self, fingerprint: Fingerprint) -> None:
+        self._set(fingerprint)
+
+    def invalidate(self, cpe_address: str) -> None:
+        self._delete(cpe_address)
+
+    def _get(self, cpe_address: str) -> Optional[Fingerprint]:
+        with self._lock:
+            return self._fingerprints.get(cpe_address)
+
+    def _set(self, fingerprint: Fingerprint) -> None:
+        with self._lock:
+            self._fingerprints[fingerprint["cpe_address"]] = fingerprint
+
+    def _delete(self, cpe_address: str) -> None:
+        with self._lock:
+            self._fingerprints.pop(cpe_address, None)
+
+class SQLite_Fingerprint_Cache(Fingerprint_Cache):
+    """ Igual que Fingerprint_Cache pero en un archivo SQLite, sobrevive entre ejecuciones y se comparte entre procesos """
+
+    def __init__(self, path: str, ttl: Optional[float] = None):
+        super().__init__(ttl)
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS fingerprints (cpe_address TEXT PRIMARY KEY, mac TEXT, model TEXT NOT NULL, "
+                               "firmware TEXT, detected_at REAL NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS fingerprints_mac ON fingerprints (mac)")
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _get(self, cpe_address: str) -> Optional[Fingerprint]:
+        row = self._connection().execute("SELECT cpe_address, mac, model, firmware, detected_at FROM fingerprints WHERE cpe_address = ?",
+                                         (cpe_address,)).fetchone()
+        if row is None:
+            return None
+        return {"cpe_address": row[0], "mac": row[1], "model": row[2], "firmware": row[3], "detected_at": row[4]}
+
+    def by_mac(self, mac: str) -> Optional[Fingerprint]:
+        """ Para cuando la ONU cambio de IP (DHCP en la gestion) pero sigue siendo el mismo equipo """
+        row = self._connection().execute("SELECT cpe_address FROM fingerprints WHERE mac = ? ORDER BY detected_at DESC LIMIT 1",
+                                         (mac.lower(),)).fetchone()
+        return self._get(row[0]) if row else None
+
+    def _set(self, fingerprint: Fingerprint) -> None:
+        with self._connection() as connection:
+            connection.execute("INSERT INTO fingerprints (cpe_address, mac, model, firmware, detected_at) VALUES (?, ?, ?, ?, ?) "
+                               "ON CONFLICT(cpe_address) DO UPDATE SET mac = excluded.mac, model = excluded.model, "
+                               "firmware = excluded.firmware, detected_at = excluded.detected_at",
+                               (fingerprint["cpe_address"], fingerprint["mac"], fingerprint["model"], fingerprint["firmware"],
+                                fingerprint["detected_at"]))
+
+    def _delete(self, cpe_address: str) -> None:
+        with self._connection() as connection:
+            connection.execute("DELETE FROM fingerprints WHERE cpe_address = ?", (cpe_address,))
+
+_default_cache = Fingerprint_Cache()
+
+def detect(cpe_address: str, cache: Optional[Fingerprint_Cache] = None, refresh: bool = False) -> Optional[Fingerprint]:
+    """ Huella del equipo, de la cache si hay una vigente y si no preguntandole al CPE """
+    cache = cache or _default_cache
+    if not refresh:
+        fingerprint = cache.get(cpe_address)
+        # La tabla ARP solo hace falta para confirmar que sigue siendo el mismo equipo de la huella
+        if fingerprint is not None and fingerprint["mac"]:
+            fingerprint = cache.get(cpe_address, arp_mac(cpe_address))
+        if fingerprint is not None:
+            return fingerprint
+    detected = probe_model(cpe_address)
+    if detected is None:
+        return None
+    # Despues del probe la direccion ya esta en la tabla ARP si el equipo esta en la misma red
+    fingerprint: Fingerprint = {"cpe_address": cpe_address, "mac": arp_mac(cpe_address, max_age=0), "model": detected[0],
+                                "firmware": detected[1], "detected_at": time.time()}
+    cache.put(fingerprint)
+    return fingerprint
@@ -0,0 +1,259 @@
+from typing import Optional, List, Dict, Any, AsyncIterator, Callable, Iterable, Iterator, Tuple, Type, TypedDict, Union
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from ipaddress import IPv4Network
+import asyncio
+import inspect
+import threading
+from cpe_manager.cpe_manager import AUTO_MODEL, get_controller, detect_controller
+from cpe_manager.models.base import CPE_HTTP_Controller, Return_Codes
+
+class Fleet_Device(TypedDict, total=False):
+    cpe_address: str
+    # Nombre en CONTROLLERS o "auto" para detectarlo en el equipo
+    model: str
+    username: str
+    password: str
+    # OLT o subred a la que pertenece el CPE, si no se indica se usa la /24 de su direccion
+    group: Optional[str]
+
+class Fleet_Result(TypedDict):
+    cpe_address: str
+    model: str
+    result: Any
+
+# Una operacion puede ser el nombre de un metodo del controlador ("get_wifi_clients") o una funcion que recibe el controlador
+Operation = Union[str, Callable[..., Any]]
+
+def default_group(device: Fleet_Device) -> str:
+    """ Agrupa los CPE por su /24, es lo mas parecido a "misma OLT" cuando el inventario no lo dice """
+    if device.get("group"):
+        return device["group"] # type: ignore
+    host = device["cpe_address"].split(":")[0]
+    try:
+        return str(IPv4Network(f"{host}/24", strict=False))
+    except ValueError:
+        return host
+
+def resolve_model(device: Fleet_Device, fingerprint_cache=None) -> Fleet_Device:
+    """ Con model "auto" devuelve una copia del equipo con el modelo detectado, o el mismo si no se reconoce """
+    if device.get("model") != AUTO_MODEL:
+        return device
+    from cpe_manager.fingerprint import detect
+    fingerprint = detect(device["cpe_address"], fingerprint_cache)
+    if fingerprint is None:
+        return device
+    return dict(device, model=fingerprint["model"]) # type: ignore
+
+def controller_class_for(device: Fleet_Device, fingerprint_cache=None) -> Optional[Type[CPE_HTTP_Controller]]:
+    if device["model"] == AUTO_MODEL:
+        return detect_controller(device["cpe_address"], fingerprint_cache)
+    return get_controller(device["model"])
+
+def build_controller(device: Fleet_Device, fingerprint_cache=None) -> Optional[CPE_HTTP_Controller]:
+    controller_class = controller_class_for(device, fingerprint_cache)
+    if controller_class is None:
+        return None
+    return controller_class(device["cpe_address"], device["username"], device["password"]) # type: ignore
+
+def _call(controller: CPE_HTTP_Controller, operation: Operation, *args, **kwargs) -> Any:
+    if callable(operation):
+        return operation(controller, *args, **kwargs)
+    return getattr(controller, operation)(*args, **kwargs)
+
+def run_operation(controller: CPE_HTTP_Controller, operation: Operation, *args, **kwargs) -> Any:
+    """ Hace login -> operacion -> logout sobre un CPE, igual que los scripts que lo hacen a mano.
+        Con un registro de sesiones no se hace logout, la sesion queda para la siguiente pasada """
+    try:
+        login = controller.ensure_login()
+        if not controller.Loged_In:
+            if isinstance(login, tuple):
+                return login
+            return (Return_Codes.ERROR, f"cpe: {controller.CPE_ADDRESS} - msg: login fallido")
+        try:
+            return _call(controller, operation, *args, **kwargs)
+        finally:
+            if controller.SESSION_REGISTRY is None:
+                controller.logout()
+    except Exception as e:
+        return (Return_Codes.EXCEPTION, f"cpe: {controller.CPE_ADDRESS} - msg: {e}")
+
+class Fleet_Executor:
+    """ Ejecuta una operacion sobre muchos CPE a la vez, con un limite global y otro por grupo (OLT/subred) """
+    MAX_WORKERS = 64
+    PER_GROUP_LIMIT = 8
+    # Cuantos equipos por worker se leen por adelantado del inventario mientras sus grupos estan ocupados
+    LOOKAHEAD = 16
+
+    def __init__(self, max_workers: Optional[int] = None, per_group_limit: Optional[int] = None,
+                 group_key: Callable[[Fleet_Device], str] = default_group, scheduler=None, fingerprint_cache=None):
+        self.MAX_WORKERS = max_workers or self.MAX_WORKERS
+        self.PER_GROUP_LIMIT = per_group_limit or self.PER_GROUP_LIMIT
+        self.group_key = group_key
+        # cpe_manager.scheduling.Scheduler, agrega reintentos, circuit breaker y concurrencia adaptativa
+        self.scheduler = scheduler
+        # cpe_manager.fingerprint.Fingerprint_Cache para los equipos con model "auto" (SQLite_Fingerprint_Cache para
+        # que dure entre ejecuciones), con None se usa la cache en memoria del proceso
+        self.fingerprint_cache = fingerprint_cache
+
+    def resolve_model(self, device: Fleet_Device) -> Fleet_Device:
+        return resolve_model(device, self.fingerprint_cache)
+
+    def _capacity(self) -> int:
+        """ Equipos en curso permitidos ahora, con un Scheduler el limite lo va ajustando el """
+        if self.scheduler is None:
+            return self.MAX_WORKERS
+        return self.scheduler.capacity(self.MAX_WORKERS)
+
+    def run_device(self, device: Fleet_Device, operation: Operation, *args, **kwargs) -> Fleet_Result:
+        """ Un solo equipo, con el Scheduler si hay uno. Los limites de concurrencia los pone dispatch """
+        # Un equipo mal cargado en el inventario (modelo o direccion invalidos) no puede cortar el barrido
+        try:
+            # El resultado lleva el modelo detectado y no "auto"
+            device = self.resolve_model(device)
+            if device.get("model") == AUTO_MODEL:
+                result = (Return_Codes.ERROR, f"cpe: {device.get('cpe_address')} - msg: no se pudo detectar el modelo")
+            elif self.scheduler is not None:
+                return self.scheduler.run_device(device, operation, *args, **kwargs)
+            else:
+                controller = build_controller(device)
+                if controller is None:
+                    result = (Return_Codes.ERROR, f"cpe: {device.get('cpe_address')} - msg: modelo desconocido {device.get('model')}")
+                else:
+                    result = run_operation(controller, operation, *args, **kwargs)
+        except Exception as e:
+            result = (Return_Codes.EXCEPTION, f"cpe: {device.get('cpe_address')} - msg: {e}")
+        return {"cpe_address": device.get("cpe_address"), "model": device.get("model"), "result": result} # type: ignore
+
+    def dispatch(self, devices: Iterable[Any], task: Callable[[Any], Any],
+                 device_of: Optional[Callable[[Any], Fleet_Device]] = None) -> Iterator[Tuple[int, Any]]:
+        """ Reparte los equipos en el pool respetando ambos limites, devuelve (indice, resultado) segun van terminando.
+            Con device_of se pueden repartir otras cosas (trabajos de cpe_manager.jobs), device_of da su equipo """
+        # Solo se envian al pool los equipos que pueden correr ya, asi ningun hilo queda bloqueado esperando su grupo.
+        # El inventario se va leyendo a medida que hay lugar, y como es un generador no se envia trabajo nuevo
+        # hasta que quien consume pide el siguiente resultado: un consumidor lento frena a los pollers.
+        source = iter(enumerate(devices))
+        exhausted = False
+        waiting: Dict[str, deque] = {}
+        waiting_count = 0
+        running: Dict[str, int] = {}
+        in_flight: Dict[Future, Tuple[int, str]] = {}
+        max_waiting = self.MAX_WORKERS * self.LOOKAHEAD
+
+        with ThreadPoolExecutor(max_workers=self.MAX_WORKERS) as pool:
+            def submit(index: int, device: Fleet_Device, group: str) -> None:
+                running[group] = running.get(group, 0) + 1
+                in_flight[pool.submit(task, device)] = (index, group)
+
+            def fill() -> None:
+                nonlocal exhausted, waiting_count
+                for group, queue in waiting.items():
+                    while queue and running.get(group, 0) < self.PER_GROUP_LIMIT and len(in_flight) < self._capacity():
+                        submit(*queue.popleft(), group)
+                        waiting_count -= 1
+                while not exhausted and len(in_flight) < self._capacity() and waiting_count < max_waiting:
+                    try:
+                        index, device = next(source)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    group = self.group_key(device if device_of is None else device_of(device))
+                    if running.get(group, 0) < self.PER_GROUP_LIMIT and not waiting.get(group):
+                        submit(index, device, group)
+                    else:
+                        waiting.setdefault(group, deque()).append((index, device))
+                        waiting_count += 1
+
+            fill()
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, group = in_flight.pop(future)
+                    running[group] -= 1
+                    yield index, future.result()
+                fill()
+
+    def run(self, devices: Iterable[Fleet_Device], operation: Operation, *args, **kwargs) -> List[Fleet_Result]:
+        """ Corre la operacion en todos los equipos, los resultados vuelven en el mismo orden del inventario """
+        devices = list(devices)
+        results: List[Any] = [None] * len(devices)
+        for index, result in self.dispatch(devices, lambda device: self.run_device(device, operation, *args, **kwargs)):
+            results[index] = result
+        return results
+
+    def stream(self, devices: Iterable[Fleet_Device], operation: Operation, *args, **kwargs) -> Iterator[Fleet_Result]:
+        """ Igual que run, pero entrega cada resultado apenas termina (en orden de llegada) sin juntar todo en memoria """
+        for _, result in self.dispatch(devices, lambda device: self.run_device(device, operation, *args, **kwargs)):
+            yield result
+
+    async def astream(self, devices: Iterable[Fleet_Device], operation: Operation, *args,
+                      buffer_size: Optional[int] = None, **kwargs) -> AsyncIterator[Fleet_Result]:
+        """ stream() como iterador asincrono. Los pollers corren en un hilo y dejan los resultados en una cola acotada,
+            si el consumidor no la vacia los pollers se detienen """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size or self.MAX_WORKERS)
+        done = object()
+        cancelled = threading.Event()
+
+        def produce() -> None:
+            try:
+                for result in self.stream(devices, operation, *args, **kwargs):
+                    if cancelled.is_set():
+                        return
+                    asyncio.run_coroutine_threadsafe(queue.put(result), loop).result()
+            except BaseException as e:
+                asyncio.run_coroutine_threadsafe(queue.put(e), loop).result()
+            finally:
+                asyncio.run_coroutine_threadsafe(queue.put(done), loop).result()
+
+        producer = threading.Thread(target=produce, name="fleet-astream", daemon=True)
+        producer.start()
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            cancelled.set()
+            # Se vacia la cola para que el hilo no quede bloqueado en un put
+            while producer.is_alive():
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    await asyncio.sleep(0.01)
+
+    async def run_async(self, devices: Iterable[Fleet_Device], operation: Operation, *args, **kwargs) -> List[Fleet_Result]:
+        """ Version asyncio, si la operacion es una corrutina se espera directamente y si no se manda a un pool de hilos """
+        devices = list(devices)
+        global_limit = asyncio.Semaphore(self.MAX_WORKERS)
+        group_limits: Dict[str, asyncio.Semaphore] = {}
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=self.MAX_WORKERS)
+
+        async def run_one(device: Fleet_Device) -> Fleet_Result:
+            group_limit = group_limits.setdefault(self.group_key(device), asyncio.Semaphore(self.PER_GROUP_LIMIT))
+            async with group_limit, global_limit:
+                if inspect.iscoroutinefunction(operation):
+                    return await self._run_device_async(device, operation, *args, **kwargs)
+                return await loop.run_in_executor(executor, lambda: self.run_device(device, operation, *args, **kwargs))
+
+        try:
+            return await asyncio.gather(*(run_one(device) for device in devices))
+        finally:
+            executor.shutdown(wait=False)
+
+    async def _run_device_async(self, device: Fleet_Device, operation: Callable[..., Any], *args, **kwargs) -> Fleet_Result:
+        # Para controladores asincronos la operacion se encarga de su propio login/logout
+        try:
+            device = await asyncio.get_running_loop().run_in_executor(None, self.resolve_model, device)
+            controller = build_controller(device)
+            if controller is None:
+                result = (Return_Codes.ERROR, f"cpe: {device.get('cpe_address')} - msg: modelo desconocido {device.get('model')}")
+            else:
+                result = await operation(controller, *args, **kwargs)
+        except Exception as e:
+            result = (Return_Codes.EXCEPTION, f"cpe: {device.get('cpe_address')} - msg: {e}")
+        return {"cpe_address": device.get("cpe_address"), "model": device.get("model"), "result": result} # type: ignore
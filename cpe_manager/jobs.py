@@ -0,0 +1,365 @@
+from typing import Optional, List, Dict, Set, Any, Callable, Iterable, Iterator, TypedDict
+import argparse
+import json
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+import zlib
+from cpe_manager.fleet import Fleet_Device, Fleet_Executor, Fleet_Result
+from cpe_manager.models.base import Return_Codes
+from cpe_manager.scheduling import Sent_Tracker
+from cpe_manager.sinks import _plain, result_status
+
+# Cola de trabajos durable para repartir barridos y cambios de configuracion entre varios procesos (y hosts que
+# compartan el archivo). Los workers toman trabajos con un lease: si el worker muere el lease vence y el trabajo
+# vuelve a la cola. Nunca se entregan a la vez dos trabajos del mismo CPE, las ONU llevan la sesion por IP de
+# origen y dos sesiones simultaneas desde hosts distintos se pisan. Los trabajos de un mismo CPE corren en el orden
+# en que se encolaron. Un cambio de configuracion que llego al CPE y fallo no se reintenta: queda en 'check' para
+# revisarlo a mano, repetirlo podria aplicarlo dos veces.
+
+class Job(TypedDict):
+    id: int
+    # Referencia al equipo, sin usuario ni contraseña (ver Credentials_Provider)
+    device: Fleet_Device
+    # Nombre del metodo del controlador, como en Fleet_Executor
+    operation: str
+    args: List[Any]
+    attempts: int
+    max_attempts: int
+
+# Los CPE se reparten en SHARDS grupos por su direccion, un worker puede atender solo algunos (por ejemplo uno por host)
+SHARDS = 64
+
+def shard_of(cpe_address: str) -> int:
+    return zlib.crc32(cpe_address.encode()) % SHARDS
+
+def shards_for(node: int, nodes: int) -> List[int]:
+    """ Shards que le tocan al nodo numero node de nodes """
+    return [shard for shard in range(SHARDS) if shard % nodes == node]
+
+# Las credenciales no se guardan en la cola, el worker las pide con la referencia del equipo
+CREDENTIAL_FIELDS = ("username", "password")
+Credentials_Provider = Callable[[Fleet_Device], Dict[str, str]]
+
+def device_reference(device: Fleet_Device) -> Fleet_Device:
+    return { key: value for key, value in device.items() if key not in CREDENTIAL_FIELDS } # type: ignore
+
+def inventory_credentials(devices: Iterable[Fleet_Device]) -> Credentials_Provider:
+    """ Credenciales sacadas de un inventario, normalmente el mismo que se encolo """
+    credentials = { device["cpe_address"]: { field: device[field] for field in CREDENTIAL_FIELDS if field in device } # type: ignore
+                    for device in devices }
+    return lambda device: credentials.get(device["cpe_address"], {}) # type: ignore
+
+class Job_Queue:
+    """ Cola en un archivo SQLite (WAL), segura entre hilos y procesos """
+    # Segundos que un worker tiene un trabajo antes de que vuelva a la cola si no hace ack/nack/heartbeat
+    LEASE_SECONDS = 300.0
+    MAX_ATTEMPTS = 3
+    # Backoff de los reintentos, con jitter para no golpear al mismo CPE en sincronia
+    RETRY_DELAY = 30.0
+    MAX_RETRY_DELAY = 1800.0
+
+    def __init__(self, path: str, lease_seconds: Optional[float] = None):
+        self.path = path
+        self.LEASE_SECONDS = lease_seconds or self.LEASE_SECONDS
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                cpe_address TEXT NOT NULL,
+                shard INTEGER NOT NULL,
+                device TEXT NOT NULL,
+                operation TEXT NOT NULL,
+                args TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                available_at REAL NOT NULL,
+                lease_owner TEXT,
+                lease_expires REAL,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL)""")
+            connection.execute("CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, shard, available_at)")
+            # Para buscar el trabajo pendiente mas viejo de un CPE sin recorrer la tabla (lease)
+            connection.execute("DROP INDEX IF EXISTS jobs_cpe")
+            connection.execute("CREATE INDEX IF NOT EXISTS jobs_cpe_order ON jobs (cpe_address, status, id)")
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    # ------------ productores ----------------
+    def enqueue(self, device: Fleet_Device, operation: str, *args, max_attempts: Optional[int] = None) -> int:
+        return self.enqueue_many([device], operation, *args, max_attempts=max_attempts)[0]
+
+    def enqueue_many(self, devices: Iterable[Fleet_Device], operation: str, *args, max_attempts: Optional[int] = None) -> List[int]:
+        """ Un trabajo por equipo con la misma operacion (un barrido), todo en una transaccion """
+        now = time.time()
+        encoded_args = json.dumps(_plain(list(args)))
+        connection = self._connection()
+        ids = []
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            for device in devices:
+                cursor = connection.execute(
+                    "INSERT INTO jobs (cpe_address, shard, device, operation, args, max_attempts, available_at, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (device["cpe_address"], shard_of(device["cpe_address"]), json.dumps(device_reference(device)), operation, encoded_args, # type: ignore
+                     max_attempts or self.MAX_ATTEMPTS, now, now, now))
+                ids.append(cursor.lastrowid)
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return ids
+
+    # ------------ workers ----------------
+    def lease(self, owner: str, limit: int = 1, shards: Optional[Iterable[int]] = None) -> List[Job]:
+        """ Toma hasta limit trabajos listos, como mucho uno por CPE y ninguno de un CPE que ya tenga un lease vigente.
+            De cada CPE solo se puede tomar el trabajo pendiente mas viejo, aunque este esperando su backoff """
+        now = time.time()
+        shard_filter, shard_params = "", []
+        if shards is not None:
+            shard_params = list(shards)
+            shard_filter = f"AND j.shard IN ({','.join('?' * len(shard_params))})"
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            # Un lease vencido ya conto su intento, si era el ultimo el trabajo falla en vez de volver a la cola
+            connection.execute("UPDATE jobs SET status = 'failed', error = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+                               "WHERE status = 'leased' AND lease_expires <= ? AND attempts >= max_attempts",
+                               (json.dumps(_plain((Return_Codes.ERROR, "msg: el lease vencio en el ultimo intento"))), now, now))
+            # El trabajo pendiente mas viejo de cada CPE libre, si ya le toca. Se parte de los pendientes (jobs_ready)
+            # y se descartan los que tienen otro mas viejo del mismo CPE (jobs_cpe_order), los terminados no se leen
+            rows = connection.execute(f"""
+                SELECT j.id, j.device, j.operation, j.args, j.attempts, j.max_attempts FROM jobs j
+                WHERE j.status IN ('queued', 'leased') AND (j.status = 'queued' OR j.lease_expires <= ?) AND j.available_at <= ? {shard_filter}
+                  AND NOT EXISTS (SELECT 1 FROM jobs o WHERE o.cpe_address = j.cpe_address AND o.status IN ('queued', 'leased') AND o.id < j.id)
+                  AND NOT EXISTS (SELECT 1 FROM jobs l WHERE l.cpe_address = j.cpe_address AND l.status = 'leased' AND l.lease_expires > ?)
+                ORDER BY j.id LIMIT ?""", (now, now, *shard_params, now, limit)).fetchall()
+            jobs: List[Job] = []
+            for job_id, device, operation, args, attempts, max_attempts in rows:
+                connection.execute("UPDATE jobs SET status = 'leased', lease_owner = ?, lease_expires = ?, attempts = attempts + 1, "
+                                   "updated_at = ? WHERE id = ?", (owner, now + self.LEASE_SECONDS, now, job_id))
+                jobs.append({"id": job_id, "device": json.loads(device), "operation": operation, "args": json.loads(args),
+                             "attempts": attempts + 1, "max_attempts": max_attempts})
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return jobs
+
+    def heartbeat(self, job_id: int, owner: str) -> bool:
+        """ Extiende el lease de un trabajo largo, False si ya no es de este worker """
+        now = time.time()
+        with self._connection() as connection:
+            cursor = connection.execute("UPDATE jobs SET lease_expires = ?, updated_at = ? WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+                                        (now + self.LEASE_SECONDS, now, job_id, owner))
+        return cursor.rowcount == 1
+
+    def ack(self, job_id: int, owner: str, result: Any = None) -> bool:
+        """ Marca el trabajo como hecho. False si el lease habia vencido y otro worker lo tomo """
+        with self._connection() as connection:
+            cursor = connection.execute("UPDATE jobs SET status = 'done', result = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+                                        "WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+                                        (json.dumps(_plain(result), ensure_ascii=False), time.time(), job_id, owner))
+        return cursor.rowcount == 1
+
+    def nack(self, job_id: int, owner: str, error: Any = None) -> bool:
+        """ Devuelve el trabajo a la cola con backoff, o lo marca failed si se acabaron los intentos """
+        now = time.time()
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute("SELECT attempts, max_attempts FROM jobs WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+                                     (job_id, owner)).fetchone()
+            if row is not None:
+                attempts, max_attempts = row
+                status = "failed" if attempts >= max_attempts else "queued"
+                delay = random.uniform(0.5, 1.0) * min(self.MAX_RETRY_DELAY, self.RETRY_DELAY * 2 ** (attempts - 1))
+                connection.execute("UPDATE jobs SET status = ?, error = ?, available_at = ?, lease_owner = NULL, lease_expires = NULL, "
+                                   "updated_at = ? WHERE id = ?",
+                                   (status, json.dumps(_plain(error), ensure_ascii=False), now + delay, now, job_id))
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return row is not None
+
+    def check(self, job_id: int, owner: str, error: Any = None) -> bool:
+        """ Saca el trabajo de la cola sin reintentarlo, para un cambio que llego al CPE y no se sabe si se aplico """
+        with self._connection() as connection:
+            cursor = connection.execute("UPDATE jobs SET status = 'check', error = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+                                        "WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+                                        (json.dumps(_plain(error), ensure_ascii=False), time.time(), job_id, owner))
+        return cursor.rowcount == 1
+
+    # ------------ consulta ----------------
+    def stats(self) -> Dict[str, int]:
+        rows = self._connection().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return { status: count for status, count in rows }
+
+    def results(self, status: str = "done") -> Iterator[Fleet_Result]:
+        for device, result, error in self._connection().execute("SELECT device, result, error FROM jobs WHERE status = ? ORDER BY id", (status,)):
+            device = json.loads(device)
+            yield {"cpe_address": device["cpe_address"], "model": device["model"], "result": json.loads(result or error or "null")}
+
+    def purge(self, older_than: float) -> int:
+        """ Borra los trabajos terminados (done o failed) hace mas de older_than segundos """
+        with self._connection() as connection:
+            cursor = connection.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?", (time.time() - older_than,))
+        return cursor.rowcount
+
+class Job_Worker:
+    """ Toma trabajos de la cola y los corre con Fleet_Executor.dispatch, con sus limites por grupo y su Scheduler """
+    # Trabajos en paralelo por worker
+    CONCURRENCY = 16
+    # Espera cuando la cola esta vacia
+    IDLE_SLEEP = 1.0
+
+    def __init__(self, queue: Job_Queue, credentials: Credentials_Provider, owner: Optional[str] = None,
+                 shards: Optional[Iterable[int]] = None, concurrency: Optional[int] = None, executor: Optional[Fleet_Executor] = None):
+        if credentials is None:
+            raise ValueError("Job_Worker necesita credentials, la cola no guarda usuario ni contraseña")
+        self.queue = queue
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{id(self):x}"
+        self.shards = list(shards) if shards is not None else None
+        self.CONCURRENCY = concurrency or self.CONCURRENCY
+        self.executor = executor or Fleet_Executor(max_workers=self.CONCURRENCY)
+        # Usuario y contraseña de cada equipo, se agregan a la referencia guardada en el trabajo
+        self.credentials = credentials
+        self._stop = threading.Event()
+        # Trabajos tomados por este worker que no terminaron, y cuales de ellos ya estan corriendo
+        self._state = threading.Condition()
+        self._leased: Set[int] = set()
+        self._started: Set[int] = set()
+        self._finished = 0
+
+    def _device(self, job: Job) -> Fleet_Device:
+        device = dict(job["device"])
+        device.update(self.credentials(job["device"]))
+        return device # type: ignore
+
+    def run_job(self, job: Job) -> Fleet_Result:
+        """ ack si salio bien. Si fallo se reintenta (nack) solo si era una lectura o no llego a enviarse nada,
+            un cambio que llego al CPE queda en check """
+        with self._state:
+            self._started.add(job["id"])
+        try:
+            tracker = Sent_Tracker(job["operation"])
+            result = self.executor.run_device(self._device(job), tracker, *job["args"])
+            if result_status(result["result"]) == "SUCCESS":
+                self.queue.ack(job["id"], self.owner, result["result"])
+            elif tracker.sent and not tracker.read:
+                self.queue.check(job["id"], self.owner, result["result"])
+            else:
+                self.queue.nack(job["id"], self.owner, result["result"])
+            return result
+        finally:
+            with self._state:
+                self._leased.discard(job["id"])
+                self._started.discard(job["id"])
+                self._finished += 1
+                self._state.notify_all()
+
+    def _leased_jobs(self) -> Iterator[Job]:
+        """ Toma trabajos a medida que se libera lugar. Si no hay ninguno listo espera a que termine alguno en curso;
+            la tanda se cierra cuando no queda nada corriendo, o si hay trabajos tomados esperando su grupo (solo
+            se mandan al pool al cerrar la tanda) y en IDLE_SLEEP no termino ninguno """
+        while not self._stop.is_set():
+            with self._state:
+                finished = self._finished
+                free = self.CONCURRENCY - len(self._leased)
+            jobs = self.queue.lease(self.owner, free, self.shards) if free > 0 else []
+            if jobs:
+                with self._state:
+                    self._leased.update(job["id"] for job in jobs)
+                yield from jobs
+                continue
+            with self._state:
+                if not self._leased:
+                    return
+                waiting_group = len(self._started) < len(self._leased)
+                if not self._state.wait_for(lambda: self._finished != finished, self.IDLE_SLEEP) and waiting_group:
+                    return
+
+    def _heartbeat(self, done: threading.Event) -> None:
+        """ Extiende el lease de los trabajos tomados mientras la tanda sigue, un equipo lento no se corre dos veces """
+        while not done.wait(self.queue.LEASE_SECONDS / 3):
+            with self._state:
+                job_ids = list(self._leased)
+            for job_id in job_ids:
+                self.queue.heartbeat(job_id, self.owner)
+
+    def run_once(self) -> int:
+        """ Una tanda: va tomando trabajos mientras haya lugar y devuelve cuantos corrio """
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(done,), name="job-heartbeat", daemon=True)
+        heartbeat.start()
+        count = 0
+        try:
+            for _ in self.executor.dispatch(self._leased_jobs(), self.run_job, device_of=lambda job: job["device"]):
+                count += 1
+        finally:
+            done.set()
+        return count
+
+    def run(self, stop_when_empty: bool = False) -> None:
+        while not self._stop.is_set():
+            if not self.run_once():
+                if stop_when_empty:
+                    return
+                self._stop.wait(self.IDLE_SLEEP)
+
+    def stop(self) -> None:
+        self._stop.set()
+
+def _cli_argument(value: str) -> Any:
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Cola de trabajos de cpe_manager")
+    parser.add_argument("--db", required=True, help="archivo SQLite de la cola")
+    commands = parser.add_subparsers(dest="command", required=True)
+    enqueue = commands.add_parser("enqueue", help="encola una operacion para cada equipo de un inventario JSON")
+    enqueue.add_argument("inventory", help="archivo JSON con una lista de Fleet_Device")
+    enqueue.add_argument("operation", help="metodo del controlador, por ejemplo get_wifi_clients")
+    enqueue.add_argument("args", nargs="*", help="argumentos de la operacion, cada uno se lee como JSON o si no como texto")
+    enqueue.add_argument("--max-attempts", type=int, default=Job_Queue.MAX_ATTEMPTS)
+    worker = commands.add_parser("worker", help="corre un worker")
+    worker.add_argument("--inventory", required=True, help="inventario JSON de donde se toman usuario y contraseña de cada equipo")
+    worker.add_argument("--concurrency", type=int, default=Job_Worker.CONCURRENCY)
+    worker.add_argument("--node", type=int, default=0, help="numero de este nodo, para repartir los shards")
+    worker.add_argument("--nodes", type=int, default=1)
+    worker.add_argument("--until-empty", action="store_true")
+    commands.add_parser("stats", help="trabajos por estado (check: cambios que llegaron al CPE y fallaron, revisar a mano)")
+    args = parser.parse_args()
+
+    queue = Job_Queue(args.db)
+    if args.command == "enqueue":
+        with open(args.inventory, encoding="utf-8") as inventory_file:
+            devices = json.load(inventory_file)
+        print(len(queue.enqueue_many(devices, args.operation, *map(_cli_argument, args.args), max_attempts=args.max_attempts)))
+    elif args.command == "worker":
+        with open(args.inventory, encoding="utf-8") as inventory_file:
+            credentials = inventory_credentials(json.load(inventory_file))
+        Job_Worker(queue, credentials, shards=shards_for(args.node, args.nodes) if args.nodes > 1 else None,
+                   concurrency=args.concurrency).run(stop_when_empty=args.until_empty)
+    else:
+        print(json.dumps(queue.stats()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+from typing import Optional, List, Dict, Tuple, Callable, Any, TypedDict, IO
+from bisect import bisect_left
+import json
+import threading
+import time
+
+class Request_Event(TypedDict):
+    timestamp: float
+    model: str
+    cpe_address: str
+    # Path de la URL o, para la fase parse, el metodo del parser
+    endpoint: str
+    # connect, wait, download o parse
+    phase: str
+    seconds: float
+    status: Optional[int]
+    error: Optional[str]
+
+class Metrics_Hook:
+    """ Interfaz de metricas, CPE_HTTP_Controller.METRICS recibe una instancia de esto """
+
+    def observe(self, event: Request_Event) -> None:
+        raise NotImplementedError
+
+class Histogram:
+    # Los CPE van de milisegundos (parseo) a decenas de segundos (CGI lentos o timeouts)
+    BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self, buckets: Optional[Tuple[float, ...]] = None):
+        self.buckets = buckets or self.BUCKETS
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((repr(bound), total))
+        result.append(("+Inf", self.count))
+        return result
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+class Prometheus_Metrics(Metrics_Hook):
+    """ Histogramas de latencia por modelo/endpoint/fase y contadores de peticiones y errores, exportables en formato texto de Prometheus """
+    PREFIX = "cpe_manager"
+
+    def __init__(self, buckets: Optional[Tuple[float, ...]] = None):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.histograms: Dict[Tuple[str, str, str], Histogram] = {}
+        self.requests: Dict[Tuple[str, str, str], int] = {}
+        self.errors: Dict[Tuple[str, str, str], int] = {}
+
+    def observe(self, event: Request_Event) -> None:
+        key = (event["model"], event["endpoint"], event["phase"])
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.buckets)
+            histogram.observe(event["seconds"])
+            if event["phase"] == "wait":
+                # Una peticion se cuenta una vez, en la fase wait (tambien cuando falla)
+                request_key = (event["model"], event["endpoint"], str(event["status"] or ""))
+                self.requests[request_key] = self.requests.get(request_key, 0) + 1
+            if event["error"]:
+                error_key = (event["model"], event["endpoint"], event["error"])
+                self.errors[error_key] = self.errors.get(error_key, 0) + 1
+
+    def export(self) -> str:
+        lines = [
+            f"# HELP {self.PREFIX}_phase_seconds Tiempo por fase de cada peticion al CPE",
+            f"# TYPE {self.PREFIX}_phase_seconds histogram"
+        ]
+        with self._lock:
+            for (model, endpoint, phase), histogram in sorted(self.histograms.items()):
+                for bound, count in histogram.cumulative():
+                    lines.append(f"{self.PREFIX}_phase_seconds_bucket{_labels(model=model, endpoint=endpoint, phase=phase, le=bound)} {count}")
+                lines.append(f"{self.PREFIX}_phase_seconds_sum{_labels(model=model, endpoint=endpoint, phase=phase)} {histogram.sum}")
+                lines.append(f"{self.PREFIX}_phase_seconds_count{_labels(model=model, endpoint=endpoint, phase=phase)} {histogram.count}")
+
+            lines.append(f"# HELP {self.PREFIX}_requests_total Peticiones hechas a los CPE")
+            lines.append(f"# TYPE {self.PREFIX}_requests_total counter")
+            for (model, endpoint, status), count in sorted(self.requests.items()):
+                lines.append(f"{self.PREFIX}_requests_total{_labels(model=model, endpoint=endpoint, status=status)} {count}")
+
+            lines.append(f"# HELP {self.PREFIX}_errors_total Peticiones a los CPE que fallaron")
+            lines.append(f"# TYPE {self.PREFIX}_errors_total counter")
+            for (model, endpoint, error), count in sorted(self.errors.items()):
+                lines.append(f"{self.PREFIX}_errors_total{_labels(model=model, endpoint=endpoint, error=error)} {count}")
+        return "\n".join(lines) + "\n"
+
+class Event_Log(Metrics_Hook):
+    """ Entrega cada evento tal cual, a una funcion o como una linea JSON en un archivo """
+
+    def __init__(self, sink: Optional[Callable[[Request_Event], Any]] = None, stream: Optional[IO[str]] = None):
+        if sink is None and stream is None:
+            raise ValueError("Event_Log necesita un sink o un stream")
+        self.sink = sink
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def observe(self, event: Request_Event) -> None:
+        if self.sink is not None:
+            self.sink(event)
+        if self.stream is not None:
+            line = json.dumps(event) + "\n"
+            with self._lock:
+                self.stream.write(line)
+
+class Multi_Hook(Metrics_Hook):
+    """ Para mandar los mismos eventos a varios destinos (por ejemplo Prometheus y un log) """
+
+    def __init__(self, *hooks: Metrics_Hook):
+        self.hooks = hooks
+
+    def observe(self, event: Request_Event) -> None:
+        for hook in self.hooks:
+            hook.observe(event)
+
+def event(model: str, cpe_address: str, endpoint: str, phase: str, seconds: float,
+          status: Optional[int] = None, error: Optional[str] = None) -> Request_Event:
+    return {"timestamp": time.time(), "model": model, "cpe_address": cpe_address, "endpoint": endpoint,
+            "phase": phase, "seconds": seconds, "status": status, "error": error}
+
+class Timed_Parser:
+    """ Envuelve un Page_Parser y anota cuanto tarda cada metodo como fase parse """
+
+    def __init__(self, parser, hook: Metrics_Hook, model: str, cpe_address: str):
+        self._parser = parser
+        self._hook = hook
+        self._model = model
+        self._cpe_address = cpe_address
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self._parser, name)
+        if not callable(attribute) or name.startswith("_"):
+            return attribute
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            error = None
+            try:
+                return attribute(*args, **kwargs)
+            except Exception as e:
+                error = type(e).__name__
+                raise
+            finally:
+                self._hook.observe(event(self._model, self._cpe_address, name, "parse", time.perf_counter() - start, error=error))
+        return timed
@@ -1,8 +1,13 @@
 from enum import Enum
-from typing import Optional, List, TypedDict
+from typing import Optional, List, Dict, Tuple, TypedDict, TYPE_CHECKING
 from ipaddress import IPv4Address
 from abc import ABC, abstractmethod
-import requests
+from urllib.parse import urlsplit
+import time
+from cpe_manager import transport
+
+if TYPE_CHECKING:
+    import requests
 
 class Return_Codes(Enum):
     SUCCESS = 0
@@ -29,6 +34,17 @@ class DHCP_Client(TypedDict):
     device_mac: str
     lease_time: Optional[int]
 
+class Wifi_Band_Changes(TypedDict, total=False):
+    ssid: str
+    wifi_password: str
+
+class Config_Changes(TypedDict, total=False):
+    # ssid y wifi_password se aplican a todas las bandas, "bands" ("2ghz"/"5ghz") permite cambiar una sola
+    ssid: str
+    wifi_password: str
+    bands: Dict[str, Wifi_Band_Changes]
+    admin_password: str
+
 def logged_in(func):
     """ Decorador para no tener que escribir la validacion de login por cada funcion """
     def decorated(self, *args, **kargs):
@@ -39,17 +55,130 @@ def logged_in(func):
 
 class CPE_HTTP_Controller:
     """ Definicion base de funcionalidad para que sea consistente en todas las implementaciones"""
+    # Nombre con el que se registra el modelo, tambien es la etiqueta model de las metricas
+    MODEL_NAME = None
     CPE_ADDRESS = None
     LOGIN_SESSION = None
     USERNAME = None
     PASSWORD = None
     Loged_In = False
+    # (connect, read) en segundos, por defecto el del transporte compartido
+    TIMEOUT = None
+    # Nombre del backend de cpe_manager.parsers, None usa el por defecto
+    PARSER = None
+    # cpe_manager.sessions.Session_Registry compartido, si esta definido se reutilizan los login entre controladores
+    SESSION_REGISTRY = None
+    # Si una respuesta redirige a alguno de estos o trae el form de login es porque el CPE cerro la sesion
+    LOGGED_OUT_REDIRECT_MARKERS = ("login.asp",)
+    LOGGED_OUT_PAGE_MARKERS = ("/boaform/admin/formLogin",)
+    # cpe_manager.metrics.Metrics_Hook, con None no se mide nada
+    METRICS = None
+    # Operaciones que se pueden separar en descarga y parseo (cpe_manager.pipeline):
+    # operacion -> (metodo fetch_* que devuelve la pagina, metodo de Page_Parser que la interpreta)
+    PARSE_STAGES: Dict[str, Tuple[str, str]] = {}
+    # Operaciones que solo leen, cpe_manager.scheduling las reintenta aunque la peticion haya llegado al CPE.
+    # Las demas (cambios de configuracion) solo se reintentan si fallaron antes de enviar nada
+    READ_OPERATIONS = frozenset(("get_wifi_clients", "get_dhcp_clients", "fetch_wifi_clients", "fetch_dhcp_clients"))
 
     def __init__(self, cpe_address, username, password):
         self.CPE_ADDRESS = cpe_address
-        self.LOGIN_SESSION = requests.session()
+        self.LOGIN_SESSION = transport.new_session()
         self.USERNAME = username
         self.PASSWORD = password
+        if self.TIMEOUT is None:
+            self.TIMEOUT = transport.get_timeout()
+
+    @property
+    def parser(self):
+        from cpe_manager.parsers import get_parser
+        parser = get_parser(self.PARSER)
+        if self.METRICS is None:
+            return parser
+        from cpe_manager.metrics import Timed_Parser
+        return Timed_Parser(parser, self.METRICS, self.MODEL_NAME or type(self).__name__, self.CPE_ADDRESS)
+
+    def _send(self, method: str, url: str, **kwargs) -> "requests.Response":
+        if self.METRICS is None:
+            return self.LOGIN_SESSION.request(method, url, **kwargs)
+
+        from cpe_manager.metrics import event
+        model = self.MODEL_NAME or type(self).__name__
+        endpoint = urlsplit(url).path
+        transport.reset_connect_time()
+        start = time.perf_counter()
+        try:
+            # Con stream la llamada vuelve al tener los headers, asi se separa la espera de la descarga del cuerpo
+            response = self.LOGIN_SESSION.request(method, url, stream=True, **kwargs)
+            headers_at = time.perf_counter()
+            response.content
+        except Exception as e:
+            self.METRICS.observe(event(model, self.CPE_ADDRESS, endpoint, "wait", time.perf_counter() - start, error=type(e).__name__))
+            raise
+        end = time.perf_counter()
+
+        connect = transport.pop_connect_time()
+        error = f"http_{response.status_code}" if response.status_code >= 400 else None
+        if connect:
+            self.METRICS.observe(event(model, self.CPE_ADDRESS, endpoint, "connect", connect, response.status_code))
+        self.METRICS.observe(event(model, self.CPE_ADDRESS, endpoint, "wait", headers_at - start - connect, response.status_code, error))
+        self.METRICS.observe(event(model, self.CPE_ADDRESS, endpoint, "download", end - headers_at, response.status_code))
+        return response
+
+    def _is_logged_out(self, response: "requests.Response") -> bool:
+        if response.is_redirect:
+            location = response.headers.get("Location", "")
+            return any(marker in location for marker in self.LOGGED_OUT_REDIRECT_MARKERS)
+        if response.status_code == 200 and "text/html" in response.headers.get("Content-Type", "text/html"):
+            return any(marker in response.text for marker in self.LOGGED_OUT_PAGE_MARKERS)
+        return False
+
+    def _request(self, method: str, url: str, relogin: bool = True, **kwargs) -> "requests.Response":
+        """ Todas las peticiones al CPE pasan por aqui, usan el pool keep-alive y siempre llevan timeout.
+            Con un registro de sesiones, si el CPE cerro la sesion se vuelve a hacer login y se repite una vez """
+        kwargs.setdefault("timeout", self.TIMEOUT)
+        response = self._send(method, url, **kwargs)
+        registry = self.SESSION_REGISTRY
+        if registry is None or not relogin or not self.Loged_In:
+            return response
+
+        if not self._is_logged_out(response):
+            registry.touch(self.CPE_ADDRESS)
+            return response
+
+        registry.invalidate(self.CPE_ADDRESS)
+        self.Loged_In = False
+        self.ensure_login()
+        if not self.Loged_In:
+            return response
+        # El token del form era de la sesion anterior, el CPE rechazaria el POST repetido tal cual
+        if isinstance(kwargs.get("data"), dict):
+            kwargs["data"] = self._refresh_form(dict(kwargs["data"]))
+        return self._send(method, url, **kwargs)
+
+    def _refresh_form(self, data: dict) -> dict:
+        """ Despues de un re-login vuelve a pedir lo que el form trae de la sesion (token CSRF), cada modelo sabe cual es """
+        return data
+
+    def ensure_login(self):
+        """ Igual que login() pero si el registro de sesiones dice que la sesion sigue viva no hace nada """
+        registry = self.SESSION_REGISTRY
+        if registry is not None and registry.is_valid(self.CPE_ADDRESS):
+            self.Loged_In = True
+            return (Return_Codes.SUCCESS,)
+        result = self.login()
+        if registry is not None and self.Loged_In:
+            registry.mark_logged_in(self.CPE_ADDRESS)
+        return result
+
+    def _forget_session(self) -> None:
+        if self.SESSION_REGISTRY is not None:
+            self.SESSION_REGISTRY.invalidate(self.CPE_ADDRESS)
+
+    def _get(self, url: str, **kwargs) -> "requests.Response":
+        return self._request("GET", url, **kwargs)
+
+    def _post(self, url: str, **kwargs) -> "requests.Response":
+        return self._request("POST", url, **kwargs)
 
     def login(self) -> None:
         raise NotImplementedError
@@ -70,4 +199,29 @@ class CPE_HTTP_Controller:
         raise NotImplementedError
     
     def change_wifi_password(self, new_password: str) -> None:
-        raise NotImplementedError
\ No newline at end of file
+        raise NotImplementedError
+
+    def apply_changes(self, changes: Config_Changes):
+        """ Aplica varios cambios de una vez, por defecto llama a cada metodo por separado """
+        if changes.get("bands"):
+            return (Return_Codes.ERROR, f"cpe: {self.CPE_ADDRESS} - msg: este modelo no permite cambios por banda")
+        steps = []
+        if "ssid" in changes:
+            steps.append(("ssid", lambda: self.change_wifi_ssid(changes["ssid"])))
+        if "wifi_password" in changes:
+            steps.append(("wifi_password", lambda: self.change_wifi_password(changes["wifi_password"])))
+        if "admin_password" in changes:
+            steps.append(("admin_password", lambda: self.change_admin_password(changes["admin_password"])))
+
+        errors = []
+        for name, step in steps:
+            try:
+                result = step()
+            except NotImplementedError:
+                errors.append(f"{name}: este modelo no lo permite")
+                continue
+            if not isinstance(result, tuple) or result[0] != Return_Codes.SUCCESS:
+                errors.append(f"{name}: {result}")
+        if errors:
+            return (Return_Codes.ERROR, " - ".join(errors))
+        return (Return_Codes.SUCCESS,)
\ No newline at end of file
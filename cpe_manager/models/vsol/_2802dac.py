@@ -1,13 +1,9 @@
-from typing import Optional, List, Tuple, TypedDict
-from ipaddress import IPv4Address
-from selenium import webdriver
-import re
-import requests
-from bs4 import BeautifulSoup
-from cpe_manager.models.base import CPE_HTTP_Controller, Wireless_Client, logged_in, DHCP_Client, Return_Codes
+from typing import Optional, List, Tuple
+from cpe_manager.models.base import CPE_HTTP_Controller, Wireless_Client, logged_in, DHCP_Client, Return_Codes, Config_Changes
 
 class Controller(CPE_HTTP_Controller):
     """ Ha sido probado con: XPON+2GE+2WIFI; Hardware: V4.1; Firmware: V2.1.06-230711 """
+    MODEL_NAME = "vsol_v2802dac"
 
     # ------------ URLs ----------------
     LOGIN_PROCESS_INIT_URL = "http://{cpe_address}/admin/login.asp"
@@ -25,36 +21,45 @@ class Controller(CPE_HTTP_Controller):
     #-----------------------------------
 
     # --------- Other
-    VERIFICATION_CODE_REGEX_PATTERN = r"document\.getElementById\('check_code'\)\.value='(.*?)';"
+    # Renderizar la pagina con Chrome queda solo como opcion para firmwares donde lo anterior no funcione
+    DHCP_RENDER_WITH_BROWSER = False
+    PARSE_STAGES = {
+        "get_wifi_clients": ("fetch_wifi_clients", "vsol_2802dac_wifi_clients"),
+        "get_dhcp_clients": ("fetch_dhcp_clients", "vsol_2802dac_dhcp_clients")
+    }
     
+    CHANGE_SUCCESS_MESSAGE = 'Change setting successfully!'
+
     WIFI2GHZ_IDX = 1
     WIFI5GHZ_IDX = 0
+    WIFI_BANDS = {
+        "2ghz": WIFI2GHZ_IDX,
+        "5ghz": WIFI5GHZ_IDX
+    }
 
     def _get_csrf_token(self) -> Optional[str]:
-            token_call = requests.get(f"http://{self.CPE_ADDRESS}/mgm_usr_user.asp")
-            token_soup = BeautifulSoup(token_call.text, "html.parser")
-            csfrtoken = token_soup.find('input', {'name': 'csrftoken'}).get('value') # type: ignore
-            return csfrtoken
+            token_call = self._get(f"http://{self.CPE_ADDRESS}/mgm_usr_user.asp")
+            return self.parser.csrf_token(token_call.text)
+
+    def _refresh_form(self, data: dict) -> dict:
+        if "csrftoken" in data:
+            data["csrftoken"] = self._get_csrf_token()
+        return data
 
     def login(self) -> None:
         # Este requiere de leer el CSRF y el codigo de validacion del documento login.asp previo a iniciar ese proceso
         # El token CSRF esta en un input, pero el codigo esta en una funcion de JS por eso hay que leerlo utilizando regex
         # no parece guardar cookies, al igual que la ACZ la sesion la mantiene por IP
         try: 
-            login_init = requests.get(self.LOGIN_PROCESS_INIT_URL.format(
+            login_init = self._get(self.LOGIN_PROCESS_INIT_URL.format(
                 cpe_address = self.CPE_ADDRESS
-            ))
+            ), relogin=False)
             if login_init.status_code == 200 and login_init.text:
-                login_soup = BeautifulSoup(login_init.text, "html.parser")
-                self.CSRF_TOKEN = login_soup.find('input', {'name': 'csrftoken'}).get('value') # type: ignore
-                match = re.search(self.VERIFICATION_CODE_REGEX_PATTERN, login_init.text)
-                if match:
-                    verification_code = match.group(1)
-                else:
-                    verification_code = ""
+                self.CSRF_TOKEN = self.parser.csrf_token(login_init.text)
+                verification_code = self.parser.verification_code(login_init.text)
 
                 # No se porque pide el usuario y la clave 2 veces en el mismo form
-                login = requests.post(self.LOGIN_URL.format(cpe_address=self.CPE_ADDRESS),
+                login = self._post(self.LOGIN_URL.format(cpe_address=self.CPE_ADDRESS),
                                       data = {
                                           "username1": self.USERNAME,
                                           "psd1": self.PASSWORD,
@@ -65,7 +70,7 @@ class Controller(CPE_HTTP_Controller):
                                           "loginSelinit": "0",
                                           "ismobile": "",
                                           "csrftoken": self.CSRF_TOKEN
-                                      }, allow_redirects=False)
+                                      }, allow_redirects=False, relogin=False)
                 
                 if (login.status_code == self.LOGIN_SUCCESS_CODE):
                     self.Loged_In = True
@@ -80,7 +85,8 @@ class Controller(CPE_HTTP_Controller):
 
     def logout(self) -> Tuple[int, Optional[str]]:
         try:
-            logout = requests.get(self.LOGOUT_URL.format(cpe_address = self.CPE_ADDRESS), allow_redirects=False)
+            logout = self._get(self.LOGOUT_URL.format(cpe_address = self.CPE_ADDRESS), allow_redirects=False, relogin=False)
+            self._forget_session()
             if (logout.status_code == self.LOGOUT_SUCCESS_CODE):
                 self.Loged_In = False
                 return (Return_Codes.SUCCESS,)
@@ -96,7 +102,7 @@ class Controller(CPE_HTTP_Controller):
         # el token csrf hay que pedirlo previo a cada solicitud o esto es lo que parece por los logs, siempre esta cambiando
         try:
             csrftoken = self._get_csrf_token()
-            password_change = requests.post(self.ADMIN_PASSWORD_CHANGE_URL.format(cpe_address = self.CPE_ADDRESS),
+            password_change = self._post(self.ADMIN_PASSWORD_CHANGE_URL.format(cpe_address = self.CPE_ADDRESS),
                                  data = {
                                      "UserIdx": "0",
                                      "oldPasswd": self.PASSWORD,
@@ -113,140 +119,139 @@ class Controller(CPE_HTTP_Controller):
         except Exception as e:
             return (Return_Codes.EXCEPTION, e)
 
+    def _get_dhcp_clients_browser(self) -> Optional[List[DHCP_Client]]:
+        # Esto es lento, se usa un navegador del pool compartido para no pagar el arranque de Chrome cada vez
+        # El pool (psutil, selenium) se importa recien aca, la mayoria de los usos nunca renderiza
+        from cpe_manager.browser_pool import get_browser_pool
+        page = get_browser_pool().render(self.GET_DHCP_CLIENTS_URL.format(cpe_address = self.CPE_ADDRESS))
+        return self.parser.dhcp_table(page)
+
     @logged_in
-    def get_dhcp_clients(self) -> Optional[List[DHCP_Client]]:
-        # Esta es una pagina dinamica y estoy utilizando Selenium para esto, pero para scripts es MUY lento
-        options = webdriver.ChromeOptions()
-        options.add_argument('--headless')
-        clients_list = []
-
-        driver = webdriver.Chrome(options = options)
-        driver.get(self.GET_DHCP_CLIENTS_URL.format(cpe_address = self.CPE_ADDRESS))
-        response_soup = BeautifulSoup(driver.page_source, "html.parser")
-        table = response_soup.find('table', {'id': 'lstdev'})
-        if table:
-            tbody = table.find("tbody")
-            if tbody:
-                rows = tbody.find_all('tr') # type: ignore
-                for row in rows:
-                    cols = row.find_all('td')
-                    cols = [ ele.text.strip() for ele in cols ]
-                    if cols:
-                        clients_list.append({
-                                    "device_name": cols[0],
-                                    "device_ip": cols[2],
-                                    "device_mac": cols[1],
-                                    "lease_time": int(cols[3])
-                                })
-        return clients_list
-    
+    def get_dhcp_clients(self, render_with_browser: Optional[bool] = None) -> Optional[List[DHCP_Client]]:
+        if render_with_browser is None:
+            render_with_browser = self.DHCP_RENDER_WITH_BROWSER
+        if render_with_browser:
+            return self._get_dhcp_clients_browser()
+
+        page = self.fetch_dhcp_clients()
+        if page is None:
+            return
+        return self.parser.vsol_2802dac_dhcp_clients(page)
+
+    @logged_in
+    def fetch_dhcp_clients(self) -> Optional[str]:
+        """ Pagina de clientes DHCP sin parsear """
+        dhcp_clients = self._get(self.GET_DHCP_CLIENTS_URL.format(cpe_address = self.CPE_ADDRESS))
+        if dhcp_clients.status_code != 200:
+            print(f"Hubo un error con la peticion al CPE {self.CPE_ADDRESS}, codigo: {dhcp_clients.status_code}, response: {dhcp_clients.text}")
+            return
+        return dhcp_clients.text
+
     @logged_in
     def get_wifi_clients(self) -> Optional[List[Wireless_Client]]:
-        client_list = []
+        page = self.fetch_wifi_clients()
+        if page is None:
+            return
+        return self.parser.vsol_2802dac_wifi_clients(page)
 
-        wifi_clients = requests.get(f"http://{self.CPE_ADDRESS}/status_wlan_info_11n.asp")
+    @logged_in
+    def fetch_wifi_clients(self) -> Optional[str]:
+        """ Pagina de clientes wifi sin parsear """
+        wifi_clients = self._get(f"http://{self.CPE_ADDRESS}/status_wlan_info_11n.asp")
         if wifi_clients.status_code != 200:
             print(f"Hubo un error con la peticion al CPE {self.CPE_ADDRESS}, codigo: {wifi_clients.status_code}, response: {wifi_clients.text}")
             return
-        clients_soup = BeautifulSoup(wifi_clients.text, 'html.parser')
-
-            # La tabla donde estan los clientes no viene con ningun ID que claramente la identifique, es necesario revisar el <p> y <div> previos para rastrearla...
-        intro_title = clients_soup.find('p', class_='intro_title', text='Associated Clients')
-        table = intro_title.find_next('div', class_='data_common').find('table')
-            
-        if table:
-            rows = table.find_all('tr')[1:]  # type: ignore # Skip the header row
-            for row in rows:
-                cols = row.find_all('td')
-                cols = [ele.get_text(strip=True) for ele in cols]
-                if cols:
-                    client_list.append({
-                            "device_mac": cols[0],
-                            "packets_sent": cols[1],
-                            "packets_received": cols[2],
-                            "send_rate_mbps": cols[3],
-                            "rssi_dbm": cols[4],
-                            "power_saving": cols[5],
-                         #   "Expired Time (sec)": cols[6]
-                        })
-
-        return client_list
-    
-    @logged_in
-    def change_wifi_ssid(self, new_ssid)  -> Tuple[int, Optional[str]]:
-        headers = {
-            "Content-Type": "application/x-www-form-urlencoded"
-        }
-        payload = {
+        return wifi_clients.text
+
+    def _ssid_payload(self, wlan_idx: int, new_ssid: str) -> dict:
+        return {
             "ssid": new_ssid,
-            "wlan_idx": "",
-            "csrftoken": ""
+            "wlan_idx": wlan_idx
         }
-        try:
-            payload["csrftoken"] = self._get_csrf_token()
-            payload["wlan_idx"] = self.WIFI2GHZ_IDX
-            ssid_change_2ghz = requests.post(self.CHANGE_WIFI_SSID_URL.format(cpe_address = self.CPE_ADDRESS),
-                                    data = payload, allow_redirects=False,
-                                    headers = headers)
-            
-            payload["csrftoken"] = self._get_csrf_token()
-            payload["wlan_idx"] = self.WIFI5GHZ_IDX
-            ssid_change_5ghz = requests.post(self.CHANGE_WIFI_SSID_URL.format(cpe_address = self.CPE_ADDRESS),
-                                    data = payload, allow_redirects=False,
-                                    headers = headers)
-            
-            if ssid_change_2ghz.status_code == 200 and ssid_change_5ghz.status_code == 200:
-                ssid_change_2ghz_soup = BeautifulSoup(ssid_change_2ghz.text, 'html.parser')
-                ssid_change_5ghz_soup = BeautifulSoup(ssid_change_5ghz.text, 'html.parser')
-                change_2ghz_result = ssid_change_2ghz_soup.find('h4').text
-                change_5ghz_result = ssid_change_5ghz_soup.find('h4').text
-
-                if change_2ghz_result == change_5ghz_result == 'Change setting successfully!':
-                    return (Return_Codes.SUCCESS,)
-            
-            return (Return_Codes.ERROR, f"2ghz: {ssid_change_2ghz.status_code} - 5ghz: {ssid_change_5ghz.status_code}")
-        except Exception as e:
-            return (Return_Codes.EXCEPTION, e)
+
+    def _wifi_password_payload(self, wlan_idx: int, new_password: str) -> dict:
+        return {
+            "wpaSSID": "0",
+            "security_method": "6",
+            "wpaAuth": "psk",
+            "pskFormat": 0,
+            "pskValue": new_password,
+            "wlan_idx": wlan_idx,
+            "save": "Apply Changes",
+            "dotIEEE80211W": "0"
+        }
+
+    def _plan_changes(self, changes: Config_Changes) -> List[Tuple[str, str, dict]]:
+        """ Arma la lista de POSTs (nombre, url, payload) necesarios, sin repetir nada """
+        bands = { band: {} for band in self.WIFI_BANDS }
+        for band in bands:
+            if "ssid" in changes:
+                bands[band]["ssid"] = changes["ssid"]
+            if "wifi_password" in changes:
+                bands[band]["wifi_password"] = changes["wifi_password"]
+        for band, band_changes in (changes.get("bands") or {}).items():
+            if band not in self.WIFI_BANDS:
+                raise ValueError(f"Banda desconocida: {band}")
+            bands[band].update(band_changes)
+
+        steps = []
+        for band, band_changes in bands.items():
+            wlan_idx = self.WIFI_BANDS[band]
+            if "ssid" in band_changes:
+                steps.append((f"{band} ssid", self.CHANGE_WIFI_SSID_URL, self._ssid_payload(wlan_idx, band_changes["ssid"])))
+            if "wifi_password" in band_changes:
+                steps.append((f"{band} wifi_password", self.CHANGE_WIFI_PASSWORD_URL, self._wifi_password_payload(wlan_idx, band_changes["wifi_password"])))
+        # La clave de admin va al final porque el form pide la clave actual
+        if "admin_password" in changes:
+            steps.append(("admin_password", self.ADMIN_PASSWORD_CHANGE_URL, {
+                "UserIdx": "0",
+                "oldPasswd": self.PASSWORD,
+                "newPasswd": changes["admin_password"],
+                "affirmPasswd": changes["admin_password"],
+                "submit-url": f"http://{self.CPE_ADDRESS}/mgm_usr_user.asp"
+            }))
+        return steps
 
     @logged_in
-    def change_wifi_password(self, new_password)  -> Tuple[int, Optional[str]]:
+    def apply_changes(self, changes: Config_Changes) -> Tuple[int, Optional[str]]:
+        """ Aplica SSID, clave WiFi (por banda) y clave de admin en una sola pasada sobre la misma sesion """
         headers = {
             "Content-Type": "application/x-www-form-urlencoded"
         }
-        payload =  {
-                    "wpaSSID": "0",
-                    "security_method": "6",
-                    "wpaAuth": "psk",
-                    "pskFormat": 0,
-                    "pskValue": new_password,
-                    "wlan_idx": "",
-                    "csrftoken": "",
-                    "save": "Apply Changes",
-                    "dotIEEE80211W": "0"
-                    }
         try:
-            payload["csrftoken"] = self._get_csrf_token()
-            payload["wlan_idx"] = self.WIFI2GHZ_IDX
-            password_change_2ghz = requests.post(self.CHANGE_WIFI_PASSWORD_URL.format(cpe_address = self.CPE_ADDRESS),
-                                    data = payload, allow_redirects=False,
-                                    headers = headers)
-            
-            payload["csrftoken"] = self._get_csrf_token()
-            payload["wlan_idx"] = self.WIFI5GHZ_IDX
-            password_change_5ghz = requests.post(self.CHANGE_WIFI_PASSWORD_URL.format(cpe_address = self.CPE_ADDRESS),
-                                    data = payload, allow_redirects=False,
-                                    headers = headers)
-            
-            if password_change_2ghz.status_code == 200 and password_change_5ghz.status_code == 200:
-                password_change_2ghz_soup = BeautifulSoup(password_change_2ghz.text, 'html.parser')
-                password_change_5ghz_soup = BeautifulSoup(password_change_5ghz.text, 'html.parser')
-                change_2ghz_result = password_change_2ghz_soup.find('h4').text
-                change_5ghz_result = password_change_5ghz_soup.find('h4').text
-
-                if change_2ghz_result == change_5ghz_result == 'Change setting successfully!':
-                    return (Return_Codes.SUCCESS,)
-            
-            return (Return_Codes.ERROR, f"2ghz: {password_change_2ghz.status_code} - 5ghz: {password_change_5ghz.status_code}")
-        
+            steps = self._plan_changes(changes)
+            errors = []
+            # El token cambia con cada POST, pero la pagina de resultado normalmente trae el siguiente,
+            # solo se vuelve a pedir mgm_usr_user.asp cuando no viene
+            csrftoken = None
+            for name, url, payload in steps:
+                if csrftoken is None:
+                    csrftoken = self._get_csrf_token()
+                payload["csrftoken"] = csrftoken
+                response = self._post(url.format(cpe_address = self.CPE_ADDRESS),
+                                      data = payload, allow_redirects=False,
+                                      headers = headers)
+                csrftoken = self.parser.csrf_token(response.text) if response.text else None
+
+                if name == "admin_password":
+                    if response.status_code != 302:
+                        errors.append(f"{name}: {response.status_code}")
+                    continue
+
+                result = self.parser.result_message(response.text) if response.status_code == 200 else None
+                if result != self.CHANGE_SUCCESS_MESSAGE:
+                    errors.append(f"{name}: {response.status_code}")
+
+            if errors:
+                return (Return_Codes.ERROR, " - ".join(errors))
+            return (Return_Codes.SUCCESS,)
         except Exception as e:
             return (Return_Codes.EXCEPTION, e)
+
+    @logged_in
+    def change_wifi_ssid(self, new_ssid)  -> Tuple[int, Optional[str]]:
+        return self.apply_changes({"ssid": new_ssid})
+
+    @logged_in
+    def change_wifi_password(self, new_password)  -> Tuple[int, Optional[str]]:
+        return self.apply_changes({"wifi_password": new_password})
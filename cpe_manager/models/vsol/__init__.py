@@ -1,3 +1,9 @@
-from . import _2802dac
+from importlib import import_module
 
-__all__ = ('_2802dac',)
+__all__ = ('_2802dac', '_acz')
+
+# Los submodulos se importan recien cuando se usan (vsol._2802dac), ver cpe_manager.cpe_manager.CONTROLLERS
+def __getattr__(name):
+    if name in __all__:
+        return import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,13 +1,9 @@
-from typing import Optional, List, TypedDict
-from ipaddress import IPv4Address
-from selenium import webdriver
-import re
-import requests
-from bs4 import BeautifulSoup
-from cpe_manager.models.base import CPE_HTTP_Controller, Wireless_Client, logged_in, DHCP_Client
+from typing import Optional, List, Tuple
+from cpe_manager.models.base import CPE_HTTP_Controller, Wireless_Client, logged_in, DHCP_Client, Return_Codes
 
 class VSOL_ACZ(CPE_HTTP_Controller):
     """ Ha sido probado con V624, hardare V1.0, firmware VSOL-V2.1.0B04-220608"""
+    MODEL_NAME = "vsol_acz"
     # ------------ URLs ----------------
     LOGIN_URL = "http://{cpe_address}/boaform/admin/formLogin"
     LOGOUT_URL = "http://{cpe_address}/boaform/admin/formLogout"
@@ -16,114 +12,93 @@ class VSOL_ACZ(CPE_HTTP_Controller):
     CSRF_REQUEST_URL = "http://{cpe_address}/boaform/getASPdata/FMask"
     PASSWORD_CHANGE_URL = "http://{cpe_address}/boaform/getASPdata/new_formPasswordSetup"
     GET_DHCP_CLIENTS_URL = 'http://{cpe_address}/boaform/getASPdata/E8BDhcpClientList' 
+    PARSE_STAGES = {
+        "get_wifi_clients": ("fetch_wifi_clients", "vsol_acz_wifi_clients"),
+        "get_dhcp_clients": ("fetch_dhcp_clients", "acz_dhcp_list")
+    }
 
-    def login(self) -> None:
+    def _refresh_form(self, data: dict) -> dict:
+        if "csrfMask" in data:
+            data["csrfMask"] = self._get(self.CSRF_REQUEST_URL.format(cpe_address = self.CPE_ADDRESS)).text.strip()
+        return data
+
+    def login(self) -> Tuple[Return_Codes, Optional[str]]:
         # En la version que se probo no se mantiene la sesion mediante cookies, sino mediante una IP... no es necesario generar una sesion con requests
         try:
-            login = requests.post(self.LOGIN_URL.format(cpe_address = self.CPE_ADDRESS), 
+            login = self._post(self.LOGIN_URL.format(cpe_address = self.CPE_ADDRESS), 
                                   data = {"username": self.USERNAME,
                                            "psd": self.PASSWORD}, 
-                                           allow_redirects=False)
+                                           allow_redirects=False, relogin=False)
             if (login.status_code == self.LOGIN_SUCCESS_CODE):
-                print(f"Conectado exitosamente a {self.CPE_ADDRESS}")
                 self.Loged_In = True
-            else:
-                print(f"No se logro conectar a {self.CPE_ADDRESS}, respuesta = {login.text}")
+                return (Return_Codes.SUCCESS,)
+            return (Return_Codes.ERROR, f"cpe: {self.CPE_ADDRESS} - msg: login fallido, respuesta = {login.text}")
         except Exception as e:
-            print(f"Hubo un problema con la conexion ha {self.CPE_ADDRESS}")
-            print(f"stack trace: {e}")
+            return (Return_Codes.EXCEPTION, f"cpe: {self.CPE_ADDRESS} - msg: {e}")
 
     @logged_in
-    def logout(self) -> None:
+    def logout(self) -> Tuple[Return_Codes, Optional[str]]:
         try:
-            logout = requests.get(self.LOGOUT_URL.format(cpe_address = self.CPE_ADDRESS), allow_redirects=False)
+            logout = self._get(self.LOGOUT_URL.format(cpe_address = self.CPE_ADDRESS), allow_redirects=False, relogin=False)
+            self._forget_session()
             if (logout.status_code == self.LOGOUT_SUCCESS_CODE):
-                print(f"Desconexion exitosa del CPE: {self.CPE_ADDRESS}")
                 self.Loged_In = False
-            else: 
-                print(f"Hubo un problema tratando de realizar la desconexion del CPE {self.CPE_ADDRESS}, respuesta = {logout.text}")
+                return (Return_Codes.SUCCESS,)
+            return (Return_Codes.ERROR, f"logout error - cpe: {self.CPE_ADDRESS} - msg: {logout.status_code}")
         except Exception as e:
-                print(f"Hubo un problema con logout del CPE: {self.CPE_ADDRESS}")
-                print(f"stack trace: {e}") 
+            return (Return_Codes.EXCEPTION, f"cpe: {self.CPE_ADDRESS} - msg: {e}")
 
     @logged_in
-    def change_admin_password(self, new_password: str) -> None:
+    def change_admin_password(self, new_password: str) -> Tuple[Return_Codes, Optional[str]]:
         """ Cambia la clave de admin del equipo """
         
         # el token csrf hay que pedirlo previo a cada solicitud o esto es lo que parece por los logs, siempre esta cambiando
         try:
-            csrfMask = requests.get(self.CSRF_REQUEST_URL.format(cpe_address = self.CPE_ADDRESS))
-            password_change = requests.post(self.PASSWORD_CHANGE_URL.format(cpe_address = self.CPE_ADDRESS),
+            csrfMask = self._get(self.CSRF_REQUEST_URL.format(cpe_address = self.CPE_ADDRESS))
+            password_change = self._post(self.PASSWORD_CHANGE_URL.format(cpe_address = self.CPE_ADDRESS),
                                  data = {
                                      "UserName": self.USERNAME,
                                      "oldPasswd": self.PASSWORD,
                                      "newPasswd": new_password, 
                                      "affirmPasswd": new_password, 
-                                     "csrfMask": csrfMask
-                                 })
+                                     "csrfMask": csrfMask.text.strip()
+                                 }, allow_redirects=False)
             if (password_change.status_code == 200 and "success" in password_change.text):
-                print(f"Contraseña cambiada correctamente para el CPE {self.CPE_ADDRESS}")
-            else:
-                print(f"No se logro cambiar la contraseña del CPE: {self.CPE_ADDRESS}, codigo http: {password_change.status_code}, respuesta: {password_change.text}")
+                return (Return_Codes.SUCCESS,)
+            return (Return_Codes.ERROR, f"No se logro cambiar la contraseña del CPE: {self.CPE_ADDRESS}, codigo http: {password_change.status_code}, respuesta: {password_change.text}")
         except Exception as e:
-            print(f"Hubo un problema intentando cambiar la clave del CPE: {self.CPE_ADDRESS}")
-            print(f"stack trace: {e}")
+            return (Return_Codes.EXCEPTION, f"cpe: {self.CPE_ADDRESS} - msg: {e}")
 
     @logged_in
     def get_dhcp_clients(self) -> Optional[List[DHCP_Client]]:
         """ Devuelve la lista de clientes DHCP activos, este CPE tiene una llamada que entrega esa lista"""
+        text = self.fetch_dhcp_clients()
+        if text is None:
+            return
+        return self.parser.acz_dhcp_list(text)
+
+    @logged_in
+    def fetch_dhcp_clients(self) -> Optional[str]:
+        """ Respuesta de E8BDhcpClientList sin parsear """
         try: 
-            client_list = requests.get(self.GET_DHCP_CLIENTS_URL.format(cpe_address = self.CPE_ADDRESS))
-            client_list = client_list.text.split('\n')
-            if not client_list:
-                return []
-            parsed_client_list = []
+            client_list = self._get(self.GET_DHCP_CLIENTS_URL.format(cpe_address = self.CPE_ADDRESS))
         except Exception as e:
             print(f"Hubo un problema tratando de obtener la lista DHCP del cpe: {self.CPE_ADDRESS}")
             return
-        
-        # El ultimo aqui siempre esta vacio
-        for client in client_list[:-1]:
-            start_index = client.find('(') + 1
-            end_index = client.find(')')
-            client = client[start_index:end_index]
-            # Remove the leading and trailing slashes
-            client = client.strip('/')
-            pairs = client.split('/')
-            parsed_client = {}
-
-            for pair in pairs:
-                key, value = pair.split('=')
-                parsed_client[key] = value
-            
-            parsed_client_list.append(parsed_client)
-
-        return parsed_client_list
+        return client_list.text
 
     @logged_in
     def get_wifi_clients(self) -> Optional[List[Wireless_Client]]:
-        client_list = []
-        
-        wifi_clients = requests.get(f"https://{self.CPE_ADDRESS}/Status_Connected_User.html")
+        page = self.fetch_wifi_clients()
+        if page is None:
+            return
+        return self.parser.vsol_acz_wifi_clients(page)
+
+    @logged_in
+    def fetch_wifi_clients(self) -> Optional[str]:
+        """ Status_Connected_User.html sin parsear """
+        wifi_clients = self._get(f"https://{self.CPE_ADDRESS}/Status_Connected_User.html")
         if wifi_clients.status_code != 200:
             print(f"Hubo un error con la peticion al CPE {self.CPE_ADDRESS}, codigo: {wifi_clients.status_code}, response: {wifi_clients.text}")
             return
-        clients_soup = BeautifulSoup(wifi_clients.text, 'html.parser')  
-
-        #se busca en la tabla de los clientes activos en DHCP
-        intro_title = clients_soup.find('h6', class_='m-0 font-weight-bold text-primary lang', text='Active DHCP Clients')
-        table = intro_title.find_next('div', class_='table-responsive').find('table')
-
-        if table:
-            rows = table.find_all('tr')[1:]
-            for rows in rows:
-                cols = rows.find_all('td')
-                cols = [items.get_text(strip = True) for items in cols]
-                if cols:
-                    client_list.append({
-                            "devname": cols[0],
-                            "macAddr": cols[1],
-                            "ipAddr": cols[2],
-                            "liveTime": cols[3],
-                        })
-        return client_list
\ No newline at end of file
+        return wifi_clients.text
@@ -0,0 +1,369 @@
+from typing import Optional, List, Dict, Tuple, Type
+from html import unescape
+import re
+from cpe_manager.models.base import Wireless_Client, DHCP_Client
+
+class Page_Parser:
+    """ Extrae los datos de las paginas de los CPE, cada backend devuelve exactamente los mismos registros """
+    NAME = None
+
+    VERIFICATION_CODE_REGEX_PATTERN = r"document\.getElementById\('check_code'\)\.value='(.*?)';"
+    # status_ethernet_info.asp trae los clientes embebidos en el JS (push(new it_nr("", new it("devname", "..."), ...)))
+    # y el navegador solo arma la tabla con eso, asi que se puede leer directo sin renderizar
+    DHCP_JS_ROW_REGEX_PATTERN = r"new\s+it_nr\s*\("
+    # Los argumentos se leen token por token, los nombres de los equipos pueden traer parentesis, comas y comillas escapadas
+    JS_TOKEN = re.compile(r"""\s*(?:"((?:[^"\\]|\\.)*)"|'((?:[^'\\]|\\.)*)'|([\w$.+\-]+)|([(),]))""", re.DOTALL)
+    JS_CALL = re.compile(r"\s*([\w$.]+)\s*\(")
+    JS_ESCAPE_REGEX_PATTERN = r"\\(u[0-9a-fA-F]{4}|x[0-9a-fA-F]{2}|\r\n|.)"
+    JS_ESCAPES = {"n": "\n", "r": "\r", "t": "\t", "b": "\b", "f": "\f", "v": "\v", "0": "\0", "\n": "", "\r\n": ""}
+    DHCP_JS_FIELDS = {
+        "devname": "device_name",
+        "ipAddr": "device_ip",
+        "macAddr": "device_mac",
+        "liveTime": "lease_time"
+    }
+
+    def verification_code(self, page: str) -> str:
+        # Viene dentro de una funcion JS, ningun parser de HTML ayuda aqui
+        match = re.search(self.VERIFICATION_CODE_REGEX_PATTERN, page)
+        return match.group(1) if match else ""
+
+    def _js_unescape(self, value: str) -> str:
+        def replace(match) -> str:
+            escape = match.group(1)
+            if escape[0] in "ux" and len(escape) > 1:
+                return chr(int(escape[1:], 16))
+            return self.JS_ESCAPES.get(escape, escape)
+        return re.sub(self.JS_ESCAPE_REGEX_PATTERN, replace, value, flags=re.DOTALL)
+
+    def _js_arguments(self, page: str, position: int) -> Tuple[list, int]:
+        """ Argumentos de una llamada JS desde despues del parentesis que abre hasta el que cierra, devuelve (argumentos, posicion final).
+            Los new x(...) anidados vuelven como (x, argumentos) """
+        arguments: list = []
+        while True:
+            token = self.JS_TOKEN.match(page, position)
+            if not token:
+                raise ValueError(f"no se esperaba {page[position:position + 20]!r}")
+            position = token.end()
+            double_quoted, single_quoted, word, sign = token.groups()
+            if sign == ")":
+                return arguments, position
+            if sign == ",":
+                continue
+            if sign == "(":
+                raise ValueError("parentesis fuera de una llamada")
+            if word is None:
+                arguments.append(self._js_unescape(double_quoted if double_quoted is not None else single_quoted))
+            elif word == "new":
+                call = self.JS_CALL.match(page, position)
+                if not call:
+                    raise ValueError("new sin llamada")
+                nested, position = self._js_arguments(page, call.end())
+                arguments.append((call.group(1), nested))
+            else:
+                arguments.append(word)
+
+    def dhcp_js(self, page: str) -> List[DHCP_Client]:
+        """ Clientes DHCP desde los arreglos JS de status_ethernet_info.asp. ValueError si el script esta pero no se entiende """
+        clients_list = []
+        rows = 0
+        for row in re.finditer(self.DHCP_JS_ROW_REGEX_PATTERN, page):
+            rows += 1
+            try:
+                arguments, _ = self._js_arguments(page, row.end())
+            except ValueError as e:
+                raise ValueError(f"fila de clientes DHCP ilegible en la posicion {row.start()}: {e}") from None
+            fields = {}
+            # El primero es el indice de la fila, los demas new it(clave, valor)
+            for item in arguments[1:]:
+                if not (isinstance(item, tuple) and item[0] == "it" and len(item[1]) == 2 and all(isinstance(value, str) for value in item[1])):
+                    raise ValueError(f"fila de clientes DHCP con un argumento inesperado en la posicion {row.start()}: {item!r}")
+                fields[item[1][0]] = item[1][1]
+            client = { name: fields.get(js_name, "") for js_name, name in self.DHCP_JS_FIELDS.items() }
+            if client["device_mac"]:
+                client["lease_time"] = self._lease_time(client["lease_time"])
+                clients_list.append(client)
+        if rows and not clients_list:
+            # Que haya filas pero ninguna con MAC es un cambio de formato, no una lista vacia
+            raise ValueError(f"formato desconocido en las {rows} filas de clientes DHCP")
+        return clients_list # type: ignore
+
+    def vsol_2802dac_dhcp_clients(self, page: str) -> List[DHCP_Client]:
+        """ status_ethernet_info.asp, desde el JS o si no viene de la tabla ya armada """
+        # Algunos firmwares mandan la tabla ya armada desde el servidor. Si el script esta se usa solo el script,
+        # asi un cambio de formato da error en vez de una tabla vacia
+        if re.search(self.DHCP_JS_ROW_REGEX_PATTERN, page) or "function it_nr" in page:
+            return self.dhcp_js(page)
+        return self.dhcp_table(page)
+
+    def acz_dhcp_list(self, text: str) -> List[Dict[str, str]]:
+        """ Respuesta de getASPdata/E8BDhcpClientList, una linea (/clave=valor/clave=valor/) por cliente """
+        parsed_client_list = []
+        # El ultimo aqui siempre esta vacio
+        for client in text.split('\n')[:-1]:
+            start_index = client.find('(') + 1
+            end_index = client.find(')')
+            client = client[start_index:end_index]
+            # Remove the leading and trailing slashes
+            client = client.strip('/')
+            parsed_client = {}
+            for pair in client.split('/'):
+                key, value = pair.split('=')
+                parsed_client[key] = value
+            parsed_client_list.append(parsed_client)
+        return parsed_client_list
+
+    def csrf_token(self, page: str) -> Optional[str]:
+        """ value del input hidden csrftoken """
+        raise NotImplementedError
+
+    def result_message(self, page: str) -> Optional[str]:
+        """ Texto del <h4> de las paginas de resultado de los form """
+        raise NotImplementedError
+
+    def dhcp_table(self, page: str) -> List[DHCP_Client]:
+        """ Tabla lstdev de status_ethernet_info.asp ya renderizada """
+        raise NotImplementedError
+
+    def vsol_2802dac_wifi_clients(self, page: str) -> List[Wireless_Client]:
+        """ Tabla "Associated Clients" de status_wlan_info_11n.asp """
+        raise NotImplementedError
+
+    def vsol_acz_wifi_clients(self, page: str) -> List[Wireless_Client]:
+        """ Tabla "Active DHCP Clients" de Status_Connected_User.html """
+        raise NotImplementedError
+
+    @staticmethod
+    def _lease_time(value: str) -> Optional[int]:
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+    def _dhcp_row(self, cols: List[str]) -> DHCP_Client:
+        return {
+            "device_name": cols[0],
+            "device_ip": cols[2],
+            "device_mac": cols[1],
+            "lease_time": self._lease_time(cols[3])
+        }
+
+    def _2802dac_wifi_row(self, cols: List[str]) -> Wireless_Client:
+        return {
+            "device_mac": cols[0],
+            "packets_sent": cols[1],
+            "packets_received": cols[2],
+            "send_rate_mbps": cols[3],
+            "rssi_dbm": cols[4],
+            "power_saving": cols[5],
+         #   "Expired Time (sec)": cols[6]
+        } # type: ignore
+
+    def _acz_wifi_row(self, cols: List[str]) -> Wireless_Client:
+        return {
+            "devname": cols[0],
+            "macAddr": cols[1],
+            "ipAddr": cols[2],
+            "liveTime": cols[3],
+        } # type: ignore
+
+class BS4_Parser(Page_Parser):
+    """ Lo que se usaba originalmente, arbol completo con html.parser. Es la referencia para los demas """
+    NAME = "bs4"
+
+    def _soup(self, page: str):
+        from bs4 import BeautifulSoup
+        return BeautifulSoup(page, "html.parser")
+
+    def csrf_token(self, page: str) -> Optional[str]:
+        token_input = self._soup(page).find('input', {'name': 'csrftoken'})
+        return token_input.get('value') if token_input else None # type: ignore
+
+    def result_message(self, page: str) -> Optional[str]:
+        h4 = self._soup(page).find('h4')
+        return h4.text.strip() if h4 else None
+
+    def dhcp_table(self, page: str) -> List[DHCP_Client]:
+        clients_list = []
+        table = self._soup(page).find('table', {'id': 'lstdev'})
+        tbody = table.find("tbody") if table else None
+        if tbody:
+            for row in tbody.find_all('tr'): # type: ignore
+                cols = [ ele.text.strip() for ele in row.find_all('td') ]
+                if cols:
+                    clients_list.append(self._dhcp_row(cols))
+        return clients_list
+
+    def vsol_2802dac_wifi_clients(self, page: str) -> List[Wireless_Client]:
+        client_list = []
+        # La tabla donde estan los clientes no viene con ningun ID que claramente la identifique, es necesario revisar el <p> y <div> previos para rastrearla...
+        intro_title = self._soup(page).find('p', class_='intro_title', string='Associated Clients')
+        container = intro_title.find_next('div', class_='data_common') if intro_title else None
+        table = container.find('table') if container else None
+        if table:
+            for row in table.find_all('tr')[1:]:  # type: ignore # Skip the header row
+                cols = [ele.get_text(strip=True) for ele in row.find_all('td')]
+                if cols:
+                    client_list.append(self._2802dac_wifi_row(cols))
+        return client_list
+
+    def vsol_acz_wifi_clients(self, page: str) -> List[Wireless_Client]:
+        client_list = []
+        #se busca en la tabla de los clientes activos en DHCP
+        intro_title = self._soup(page).find('h6', class_='m-0 font-weight-bold text-primary lang', string='Active DHCP Clients')
+        container = intro_title.find_next('div', class_='table-responsive') if intro_title else None
+        table = container.find('table') if container else None
+        if table:
+            for row in table.find_all('tr')[1:]:
+                cols = [items.get_text(strip = True) for items in row.find_all('td')]
+                if cols:
+                    client_list.append(self._acz_wifi_row(cols))
+        return client_list
+
+class Regex_Parser(Page_Parser):
+    """ Extraccion puntual con expresiones regulares, no arma ningun arbol y solo recorre el trozo de pagina que importa """
+    NAME = "regex"
+
+    # Comentarios y scripts no son parte del arbol para los otros parsers, se quitan antes de buscar tags
+    HIDDEN = re.compile(r"<!--.*?(?:-->|$)|<script\b[^>]*>.*?(?:</script\s*>|$)", re.IGNORECASE | re.DOTALL)
+    # Los atributos no pueden ser la cola de otro (data-name, data-value)
+    CSRF_INPUT = re.compile(r"<input\b[^>]*(?<![\w-])name\s*=\s*[\"']?csrftoken\b[^>]*>", re.IGNORECASE)
+    VALUE_ATTR = re.compile(r"(?<![\w-])value\s*=\s*(?:\"([^\"]*)\"|'([^']*)'|([^\s>]+))", re.IGNORECASE)
+    H4 = re.compile(r"<h4\b[^>]*>(.*?)</h4\s*>", re.IGNORECASE | re.DOTALL)
+    TABLE = re.compile(r"<table\b[^>]*>(.*?)</table\s*>", re.IGNORECASE | re.DOTALL)
+    LSTDEV_TABLE = re.compile(r"<table\b[^>]*\bid\s*=\s*[\"']?lstdev\b[^>]*>(.*?)</table\s*>", re.IGNORECASE | re.DOTALL)
+    TBODY = re.compile(r"<tbody\b[^>]*>(.*?)(?:</tbody\s*>|$)", re.IGNORECASE | re.DOTALL)
+    ROW = re.compile(r"<tr\b[^>]*>(.*?)(?=<tr\b|</table\s*>|</tbody\s*>|$)", re.IGNORECASE | re.DOTALL)
+    CELL = re.compile(r"<td\b[^>]*>(.*?)(?=<td\b|<th\b|</tr\s*>|$)", re.IGNORECASE | re.DOTALL)
+    TAG = re.compile(r"<[^>]*>")
+    WIFI_2802DAC_TITLE = re.compile(r"<p\b[^>]*class\s*=\s*[\"']intro_title[\"'][^>]*>\s*Associated Clients\s*</p>", re.IGNORECASE)
+    DATA_COMMON_DIV = re.compile(r"<div\b[^>]*class\s*=\s*[\"']data_common[\"'][^>]*>", re.IGNORECASE)
+    WIFI_ACZ_TITLE = re.compile(r"<h6\b[^>]*class\s*=\s*[\"']m-0 font-weight-bold text-primary lang[\"'][^>]*>\s*Active DHCP Clients\s*</h6>", re.IGNORECASE)
+    TABLE_RESPONSIVE_DIV = re.compile(r"<div\b[^>]*class\s*=\s*[\"']table-responsive[\"'][^>]*>", re.IGNORECASE)
+
+    def _markup(self, page: str) -> str:
+        return self.HIDDEN.sub("", page)
+
+    def _text(self, cell: str) -> str:
+        """ Equivalente a .text.strip() """
+        return unescape(self.TAG.sub("", cell)).strip()
+
+    def _stripped_text(self, cell: str) -> str:
+        """ Equivalente a get_text(strip=True), cada trozo de texto se limpia por separado """
+        return "".join(unescape(part).strip() for part in self.TAG.split(cell))
+
+    def _rows(self, table: str, text) -> List[List[str]]:
+        return [ [ text(cell) for cell in self.CELL.findall(row) ] for row in self.ROW.findall(table) ]
+
+    def _table_after(self, page: str, title, container) -> Optional[str]:
+        title_match = title.search(page)
+        if not title_match:
+            return None
+        container_match = container.search(page, title_match.end())
+        if not container_match:
+            return None
+        table_match = self.TABLE.search(page, container_match.end())
+        return table_match.group(1) if table_match else None
+
+    def csrf_token(self, page: str) -> Optional[str]:
+        tag = self.CSRF_INPUT.search(self._markup(page))
+        if not tag:
+            return None
+        value = self.VALUE_ATTR.search(tag.group(0))
+        if not value:
+            return None
+        return unescape(next(group for group in value.groups() if group is not None))
+
+    def result_message(self, page: str) -> Optional[str]:
+        h4 = self.H4.search(self._markup(page))
+        return self._text(h4.group(1)) if h4 else None
+
+    def dhcp_table(self, page: str) -> List[DHCP_Client]:
+        table = self.LSTDEV_TABLE.search(self._markup(page))
+        tbody = self.TBODY.search(table.group(1)) if table else None
+        if not tbody:
+            return []
+        return [ self._dhcp_row(cols) for cols in self._rows(tbody.group(1), self._text) if cols ]
+
+    def vsol_2802dac_wifi_clients(self, page: str) -> List[Wireless_Client]:
+        table = self._table_after(self._markup(page), self.WIFI_2802DAC_TITLE, self.DATA_COMMON_DIV)
+        if table is None:
+            return []
+        return [ self._2802dac_wifi_row(cols) for cols in self._rows(table, self._stripped_text)[1:] if cols ]
+
+    def vsol_acz_wifi_clients(self, page: str) -> List[Wireless_Client]:
+        table = self._table_after(self._markup(page), self.WIFI_ACZ_TITLE, self.TABLE_RESPONSIVE_DIV)
+        if table is None:
+            return []
+        return [ self._acz_wifi_row(cols) for cols in self._rows(table, self._stripped_text)[1:] if cols ]
+
+class LXML_Parser(Page_Parser):
+    """ Arbol completo pero en C, necesita lxml instalado """
+    NAME = "lxml"
+
+    def __init__(self):
+        # Se importa al crear el parser y no al importar el modulo, lxml es opcional y pesado
+        try:
+            import lxml.html
+        except ImportError:
+            raise ImportError("El parser lxml necesita el paquete lxml") from None
+        self._html = lxml.html
+
+    def _tree(self, page: str):
+        return self._html.fromstring(page)
+
+    @staticmethod
+    def _stripped_text(element) -> str:
+        return "".join(part.strip() for part in element.itertext())
+
+    def csrf_token(self, page: str) -> Optional[str]:
+        values = self._tree(page).xpath("//input[@name='csrftoken']/@value")
+        return values[0] if values else None
+
+    def result_message(self, page: str) -> Optional[str]:
+        h4 = self._tree(page).xpath("//h4")
+        return h4[0].text_content().strip() if h4 else None
+
+    def dhcp_table(self, page: str) -> List[DHCP_Client]:
+        rows = self._tree(page).xpath("//table[@id='lstdev']/tbody[1]//tr")
+        return [ self._dhcp_row(cols) for cols in ([ td.text_content().strip() for td in row.xpath("./td") ] for row in rows) if cols ]
+
+    def _rows_after(self, page: str, title_xpath: str, container_class: str) -> List[List[str]]:
+        titles = self._tree(page).xpath(title_xpath)
+        if not titles:
+            return []
+        tables = titles[0].xpath(f"following::div[contains(concat(' ', normalize-space(@class), ' '), ' {container_class} ')][1]//table[1]")
+        if not tables:
+            return []
+        return [ [ self._stripped_text(td) for td in row.xpath("./td") ] for row in tables[0].xpath(".//tr")[1:] ]
+
+    def vsol_2802dac_wifi_clients(self, page: str) -> List[Wireless_Client]:
+        rows = self._rows_after(page, "//p[contains(concat(' ', normalize-space(@class), ' '), ' intro_title ')][normalize-space(.)='Associated Clients']", "data_common")
+        return [ self._2802dac_wifi_row(cols) for cols in rows if cols ]
+
+    def vsol_acz_wifi_clients(self, page: str) -> List[Wireless_Client]:
+        rows = self._rows_after(page, "//h6[@class='m-0 font-weight-bold text-primary lang'][normalize-space(.)='Active DHCP Clients']", "table-responsive")
+        return [ self._acz_wifi_row(cols) for cols in rows if cols ]
+
+PARSERS: Dict[str, Type[Page_Parser]] = {
+    BS4_Parser.NAME: BS4_Parser,
+    Regex_Parser.NAME: Regex_Parser,
+    LXML_Parser.NAME: LXML_Parser
+}
+
+DEFAULT_PARSER = Regex_Parser.NAME
+_instances: Dict[str, Page_Parser] = {}
+
+def set_default_parser(name: str) -> None:
+    global DEFAULT_PARSER
+    get_parser(name)
+    DEFAULT_PARSER = name
+
+def get_parser(name: Optional[str] = None) -> Page_Parser:
+    """ Devuelve el parser pedido (o el por defecto), se reutiliza la misma instancia """
+    name = name or DEFAULT_PARSER
+    if name not in _instances:
+        if name not in PARSERS:
+            raise ValueError(f"Parser desconocido: {name}")
+        _instances[name] = PARSERS[name]()
+    return _instances[name]
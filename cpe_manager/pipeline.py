@@ -0,0 +1,199 @@
+from typing import Optional, List, Any, Iterable, Iterator, Tuple
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, Future
+from multiprocessing import get_all_start_methods, get_context
+import os
+import queue
+import threading
+import time
+from cpe_manager import parsers
+from cpe_manager.cpe_manager import get_controller
+from cpe_manager.fleet import Fleet_Device, Fleet_Executor, Fleet_Result, Operation
+from cpe_manager.models.base import Return_Codes
+
+# Descarga y parseo en etapas separadas. Los hilos de Fleet_Executor solo hacen las peticiones (fetch_* de cada
+# controlador) y las paginas se parsean por lotes en un pool de procesos, asi el parseo no compite por el GIL
+# con la red de los demas equipos y escala con los nucleos de la maquina.
+
+# (parser, metodo de Page_Parser, pagina)
+Parse_Job = Tuple[str, str, str]
+
+def parse_batch(jobs: List[Parse_Job]) -> List[Any]:
+    """ Corre en los procesos del pool, tiene que ser una funcion de modulo para poder mandarla por pickle """
+    results = []
+    for parser_name, method, page in jobs:
+        try:
+            results.append(getattr(parsers.get_parser(parser_name), method)(page))
+        except Exception as e:
+            results.append((Return_Codes.EXCEPTION, f"msg: error parseando con {parser_name}.{method}: {e}"))
+    return results
+
+def _start_method() -> str:
+    # Los procesos se crean cuando ya corren los hilos de descarga, y hacer fork de un proceso con hilos puede dejar
+    # un lock tomado para siempre en el hijo. forkserver (o spawn donde no existe) arranca los procesos limpios
+    return "forkserver" if "forkserver" in get_all_start_methods() else "spawn"
+
+class Parse_Pool:
+    """ Pool de procesos para parsear, por defecto uno por nucleo. Con workers=0 parsea en el mismo proceso.
+        Los procesos no se crean con fork, el script que lo use necesita el if __name__ == "__main__" """
+
+    def __init__(self, workers: Optional[int] = None, start_method: Optional[str] = None):
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self._pool = None
+        if self.workers:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=get_context(start_method or _start_method()))
+
+    def submit(self, jobs: List[Parse_Job]) -> Future:
+        if self._pool is not None:
+            return self._pool.submit(parse_batch, jobs)
+        future: Future = Future()
+        future.set_result(parse_batch(jobs))
+        return future
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+
+    def __enter__(self) -> "Parse_Pool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+class Fetch_Parse_Pipeline:
+    """ Fleet_Executor para la descarga + Parse_Pool para el parseo. Las operaciones sin PARSE_STAGES en el
+        controlador (o las funciones) se corren enteras en la etapa de descarga como siempre """
+    # Paginas por lote, con lotes chicos el costo de mandar cada pagina al otro proceso pesa mas que el parseo
+    BATCH_SIZE = 32
+    # Un lote incompleto se manda igual si su primera pagina lleva este tiempo esperando
+    MAX_BATCH_DELAY = 0.5
+    # Lotes en parseo por proceso antes de frenar la descarga
+    MAX_PENDING_PER_WORKER = 2
+
+    def __init__(self, executor: Optional[Fleet_Executor] = None, parse_pool: Optional[Parse_Pool] = None,
+                 batch_size: Optional[int] = None, max_batch_delay: Optional[float] = None):
+        self.executor = executor or Fleet_Executor()
+        self._owns_pool = parse_pool is None
+        self.parse_pool = parse_pool or Parse_Pool()
+        self.BATCH_SIZE = batch_size or self.BATCH_SIZE
+        self.MAX_BATCH_DELAY = max_batch_delay if max_batch_delay is not None else self.MAX_BATCH_DELAY
+
+    def _fetch(self, device: Fleet_Device, operation: Operation, *args, **kwargs) -> Tuple[Fleet_Result, Optional[Parse_Job]]:
+        """ Devuelve el resultado del equipo y, si hay que parsear, el trabajo para el pool """
+        # Se detecta el modelo como lo hace el executor (con su cache), el resto ya no ve "auto"
+        try:
+            device = self.executor.resolve_model(device)
+            controller_class = get_controller(device["model"]) # type: ignore
+        except Exception:
+            controller_class = None
+        stages = None
+        if controller_class is not None and isinstance(operation, str) and not args and not kwargs:
+            stages = controller_class.PARSE_STAGES.get(operation)
+        if stages is None:
+            return self.executor.run_device(device, operation, *args, **kwargs), None
+        fetch_method, parse_method = stages
+        # Pasa por el executor para respetar su Scheduler si tiene uno
+        result = self.executor.run_device(device, fetch_method)
+        if not isinstance(result["result"], str):
+            # Error de la descarga, ya viene en el formato del controlador
+            return result, None
+        return result, (controller_class.PARSER or parsers.DEFAULT_PARSER, parse_method, result["result"])
+
+    def _results(self, devices: Iterable[Fleet_Device], operation: Operation, *args, **kwargs) -> Iterator[Tuple[int, Fleet_Result]]:
+        # La descarga corre en su propio hilo y deja todo en events, asi un lote incompleto se manda a parsear cuando
+        # vence MAX_BATCH_DELAY aunque no llegue ninguna pagina nueva
+        batch: List[Tuple[int, Fleet_Result, Parse_Job]] = []
+        batch_started = 0.0
+        pending: deque = deque()
+        max_pending = max(1, self.parse_pool.workers) * self.MAX_PENDING_PER_WORKER
+        events: queue.Queue = queue.Queue()
+        # Descargas sin consumir, al llegar al tope los pollers esperan igual que con Fleet_Executor.stream
+        buffered = threading.Semaphore(self.executor.MAX_WORKERS)
+        stop = threading.Event()
+
+        def produce() -> None:
+            task = lambda device: self._fetch(device, operation, *args, **kwargs)
+            try:
+                for item in self.executor.dispatch(devices, task):
+                    while not buffered.acquire(timeout=0.1):
+                        if stop.is_set():
+                            return
+                    events.put(("fetched", item))
+            except BaseException as e:
+                events.put(("done", e))
+                return
+            events.put(("done", None))
+
+        def flush() -> None:
+            nonlocal batch
+            future = self.parse_pool.submit([job for _, _, job in batch])
+            pending.append((batch, future))
+            future.add_done_callback(lambda _: events.put(("parsed", None)))
+            batch = []
+
+        def collect(block: bool) -> Iterator[Tuple[int, Fleet_Result]]:
+            while pending and (block or pending[0][1].done()):
+                items, future = pending.popleft()
+                for (index, result, _), parsed in zip(items, future.result()):
+                    if isinstance(parsed, tuple):
+                        parsed = (parsed[0], f"cpe: {result['cpe_address']} - {parsed[1]}")
+                    result["result"] = parsed
+                    yield index, result
+
+        producer = threading.Thread(target=produce, name="pipeline-fetch", daemon=True)
+        producer.start()
+        try:
+            while True:
+                timeout = max(0.0, batch_started + self.MAX_BATCH_DELAY - time.monotonic()) if batch else None
+                try:
+                    kind, value = events.get(timeout=timeout)
+                except queue.Empty:
+                    kind, value = "timer", None
+                if kind == "done":
+                    if value is not None:
+                        raise value
+                    break
+                if kind == "fetched":
+                    buffered.release()
+                    index, (result, job) = value
+                    if job is None:
+                        yield index, result
+                    else:
+                        if not batch:
+                            batch_started = time.monotonic()
+                        batch.append((index, result, job))
+                if batch and (len(batch) >= self.BATCH_SIZE or time.monotonic() - batch_started >= self.MAX_BATCH_DELAY):
+                    flush()
+                yield from collect(block=False)
+                # Si el pool no da abasto se espera el lote mas viejo, y con eso se frena la descarga
+                while len(pending) > max_pending:
+                    pending[0][1].result()
+                    yield from collect(block=False)
+            if batch:
+                flush()
+            yield from collect(block=True)
+        finally:
+            stop.set()
+
+    def stream(self, devices: Iterable[Fleet_Device], operation: Operation, *args, **kwargs) -> Iterator[Fleet_Result]:
+        """ Como Fleet_Executor.stream, los lotes vuelven en el orden en que se mandaron a parsear """
+        for _, result in self._results(devices, operation, *args, **kwargs):
+            yield result
+
+    def run(self, devices: Iterable[Fleet_Device], operation: Operation, *args, **kwargs) -> List[Fleet_Result]:
+        """ Como Fleet_Executor.run, resultados en el orden del inventario """
+        devices = list(devices)
+        results: List[Any] = [None] * len(devices)
+        for index, result in self._results(devices, operation, *args, **kwargs):
+            results[index] = result
+        return results
+
+    def close(self) -> None:
+        if self._owns_pool:
+            self.parse_pool.close()
+
+    def __enter__(self) -> "Fetch_Parse_Pipeline":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,236 @@
+from typing import Optional, Dict, Any, Tuple, TypedDict
+import random
+import socket
+import threading
+import time
+from cpe_manager import transport
+from cpe_manager.fleet import Fleet_Device, Fleet_Result, Operation, build_controller, run_operation, _call
+from cpe_manager.models.base import CPE_HTTP_Controller, Return_Codes
+
+# Capa de planificacion para barridos de flota: timeouts por fase, reintentos con backoff, un circuit breaker por CPE
+# para no pagar timeouts completos en los equipos apagados y un limite de concurrencia que se ajusta solo (AIMD).
+# Se usa pasandole un Scheduler a Fleet_Executor.
+
+class Phase_Timeouts(TypedDict):
+    # Abrir la conexion TCP con el CPE
+    connect: float
+    # Esperar cada respuesta, los CGI de estos equipos pueden tardar varios segundos
+    read: float
+    # Sonda TCP del circuit breaker
+    probe: float
+    # Tiempo total por equipo contando reintentos, ningun intento nuevo arranca despues de esto
+    deadline: float
+
+DEFAULT_TIMEOUTS: Phase_Timeouts = {
+    "connect": 3.0,
+    "read": 15.0,
+    "probe": 1.0,
+    "deadline": 60.0
+}
+
+# Sin puerto en la direccion se prueban los dos, algunas paginas de la ACZ solo se sirven por https
+PROBE_PORTS = (80, 443)
+
+def tcp_probe(cpe_address: str, timeout: float = 1.0, ports: Tuple[int, ...] = PROBE_PORTS) -> bool:
+    """ Solo abre y cierra una conexion TCP, cuesta un RTT por puerto y no crea ninguna sesion en el CPE """
+    host, _, explicit_port = cpe_address.partition(":")
+    for port in ([int(explicit_port)] if explicit_port else ports):
+        try:
+            with socket.create_connection((host, port), timeout=timeout):
+                return True
+        except OSError:
+            continue
+    return False
+
+class Retry_Policy:
+    """ Reintentos con backoff exponencial y jitter completo, para que los equipos de una misma OLT no reintenten juntos """
+    ATTEMPTS = 3
+    BASE_DELAY = 0.5
+    MAX_DELAY = 10.0
+
+    def __init__(self, attempts: Optional[int] = None, base_delay: Optional[float] = None, max_delay: Optional[float] = None):
+        self.ATTEMPTS = attempts or self.ATTEMPTS
+        self.BASE_DELAY = base_delay if base_delay is not None else self.BASE_DELAY
+        self.MAX_DELAY = max_delay or self.MAX_DELAY
+
+    def delay(self, attempt: int) -> float:
+        """ Espera antes del reintento numero attempt (1 es el primer reintento) """
+        return random.uniform(0, min(self.MAX_DELAY, self.BASE_DELAY * 2 ** (attempt - 1)))
+
+class _Breaker_State(TypedDict):
+    failures: int
+    # 0 si el circuito esta cerrado
+    opened_at: float
+    reset_timeout: float
+
+class Circuit_Breaker:
+    """ Por CPE: luego de FAILURE_THRESHOLD fallas de red seguidas el equipo se omite. Pasado RESET_TIMEOUT se le hace
+        una sonda TCP, si contesta se vuelve a intentar y si no el tiempo de espera se duplica hasta MAX_RESET_TIMEOUT """
+    FAILURE_THRESHOLD = 3
+    RESET_TIMEOUT = 60.0
+    MAX_RESET_TIMEOUT = 3600.0
+
+    def __init__(self, failure_threshold: Optional[int] = None, reset_timeout: Optional[float] = None,
+                 max_reset_timeout: Optional[float] = None, probe_timeout: float = 1.0):
+        self.FAILURE_THRESHOLD = failure_threshold or self.FAILURE_THRESHOLD
+        self.RESET_TIMEOUT = reset_timeout or self.RESET_TIMEOUT
+        self.MAX_RESET_TIMEOUT = max_reset_timeout or self.MAX_RESET_TIMEOUT
+        self.probe_timeout = probe_timeout
+        self._lock = threading.Lock()
+        self._states: Dict[str, _Breaker_State] = {}
+
+    def is_open(self, cpe_address: str) -> bool:
+        with self._lock:
+            state = self._states.get(cpe_address)
+            return state is not None and state["opened_at"] > 0
+
+    def allow(self, cpe_address: str) -> bool:
+        """ Si se puede intentar con el equipo ahora. Con el circuito abierto y el tiempo cumplido hace la sonda """
+        with self._lock:
+            state = self._states.get(cpe_address)
+            if state is None or not state["opened_at"]:
+                return True
+            if time.time() - state["opened_at"] < state["reset_timeout"]:
+                return False
+        if tcp_probe(cpe_address, self.probe_timeout):
+            # Semiabierto: se permite un intento, si falla se vuelve a abrir enseguida
+            with self._lock:
+                state["failures"] = self.FAILURE_THRESHOLD - 1
+                state["opened_at"] = 0
+            return True
+        with self._lock:
+            state["opened_at"] = time.time()
+            state["reset_timeout"] = min(state["reset_timeout"] * 2, self.MAX_RESET_TIMEOUT)
+        return False
+
+    def record_success(self, cpe_address: str) -> None:
+        with self._lock:
+            self._states.pop(cpe_address, None)
+
+    def record_failure(self, cpe_address: str) -> None:
+        with self._lock:
+            state = self._states.setdefault(cpe_address, {"failures": 0, "opened_at": 0, "reset_timeout": self.RESET_TIMEOUT})
+            state["failures"] += 1
+            if state["failures"] >= self.FAILURE_THRESHOLD and not state["opened_at"]:
+                state["opened_at"] = time.time()
+
+    def open_count(self) -> int:
+        with self._lock:
+            return sum(1 for state in self._states.values() if state["opened_at"])
+
+class Adaptive_Concurrency:
+    """ Limite de equipos en paralelo con AIMD: +1 por cada ventana de respuestas buenas, se multiplica por DECREASE
+        si hay errores de red o la latencia pasa LATENCY_TARGET (como mucho una vez por ventana) """
+    INITIAL = 16
+    MINIMUM = 4
+    MAXIMUM = 256
+    DECREASE = 0.7
+    LATENCY_TARGET = 5.0
+
+    def __init__(self, initial: Optional[int] = None, minimum: Optional[int] = None, maximum: Optional[int] = None,
+                 latency_target: Optional[float] = None):
+        self.MINIMUM = minimum or self.MINIMUM
+        self.MAXIMUM = maximum or self.MAXIMUM
+        self.LATENCY_TARGET = latency_target or self.LATENCY_TARGET
+        self._limit = float(min(max(initial or self.INITIAL, self.MINIMUM), self.MAXIMUM))
+        self._lock = threading.Lock()
+        # Respuestas que faltan para que se permita otra reduccion
+        self._cooldown = 0
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def observe(self, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self._cooldown = max(0, self._cooldown - 1)
+            if not ok or seconds > self.LATENCY_TARGET:
+                if not self._cooldown:
+                    self._limit = max(self.MINIMUM, self._limit * self.DECREASE)
+                    self._cooldown = self.limit
+            else:
+                self._limit = min(self.MAXIMUM, self._limit + 1 / self._limit)
+
+def is_read_operation(controller: CPE_HTTP_Controller, operation: Operation) -> bool:
+    """ Las funciones se toman como cambios, no se sabe que hacen """
+    while isinstance(operation, Sent_Tracker):
+        operation = operation.operation
+    return isinstance(operation, str) and operation in controller.READ_OPERATIONS
+
+class Sent_Tracker:
+    """ Envuelve una operacion y anota si llego a mandarle algo al CPE, el login no cuenta. read dice si era una
+        operacion de solo lectura, asi quien la use sabe si un fallo despues de enviar se puede repetir """
+
+    def __init__(self, operation: Operation):
+        self.operation = operation
+        self.sent = False
+        self.read = False
+
+    def __call__(self, controller: CPE_HTTP_Controller, *args, **kwargs) -> Any:
+        self.read = is_read_operation(controller, self.operation)
+        before = transport.requests_sent()
+        try:
+            return _call(controller, self.operation, *args, **kwargs)
+        finally:
+            self.sent = self.sent or transport.requests_sent() > before
+
+def is_success(result: Any) -> bool:
+    return isinstance(result, list) or (isinstance(result, tuple) and bool(result) and result[0] == Return_Codes.SUCCESS)
+
+class Scheduler:
+    """ Corre la operacion de un equipo con timeouts, reintentos, circuit breaker y concurrencia adaptativa """
+
+    def __init__(self, timeouts: Optional[Dict[str, float]] = None, retry: Optional[Retry_Policy] = None,
+                 breaker: Optional[Circuit_Breaker] = None, concurrency: Optional[Adaptive_Concurrency] = None):
+        self.timeouts: Phase_Timeouts = dict(DEFAULT_TIMEOUTS, **(timeouts or {})) # type: ignore
+        self.retry = retry or Retry_Policy()
+        self.breaker = breaker or Circuit_Breaker(probe_timeout=self.timeouts["probe"])
+        self.concurrency = concurrency or Adaptive_Concurrency()
+
+    def _attempt(self, device: Fleet_Device, operation: Operation, read_timeout: float, *args, **kwargs) -> Tuple[Any, bool, bool]:
+        """ Devuelve (resultado, si hubo errores de red, si se puede reintentar) """
+        try:
+            controller = build_controller(device)
+        except Exception as e:
+            return (Return_Codes.EXCEPTION, f"cpe: {device.get('cpe_address')} - msg: {e}"), False, False
+        if controller is None:
+            return (Return_Codes.ERROR, f"cpe: {device['cpe_address']} - msg: modelo desconocido {device['model']}"), False, False
+        controller.TIMEOUT = (self.timeouts["connect"], read_timeout)
+        transport.reset_network_errors()
+        tracker = Sent_Tracker(operation)
+        result = run_operation(controller, tracker, *args, **kwargs)
+        network_errors = transport.pop_network_errors()
+        # Un cambio que llego al CPE pudo haberse aplicado aunque no haya respuesta, repetirlo lo aplicaria dos veces
+        retryable = is_read_operation(controller, operation) or not tracker.sent
+        return result, bool(network_errors) and not is_success(result), retryable
+
+    def run_device(self, device: Fleet_Device, operation: Operation, *args, **kwargs) -> Fleet_Result:
+        cpe_address = device["cpe_address"] # type: ignore
+        if not self.breaker.allow(cpe_address):
+            result = (Return_Codes.ERROR, f"cpe: {cpe_address} - msg: no responde, se omite hasta que conteste la sonda")
+            return {"cpe_address": cpe_address, "model": device["model"], "result": result} # type: ignore
+
+        deadline = time.monotonic() + self.timeouts["deadline"]
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            start = time.perf_counter()
+            result, unreachable, retryable = self._attempt(device, operation, max(0.1, min(self.timeouts["read"], remaining)), *args, **kwargs)
+            self.concurrency.observe(time.perf_counter() - start, not unreachable)
+            if not unreachable:
+                # El equipo contesto, aunque sea con un error de la operacion no tiene sentido reintentar
+                self.breaker.record_success(cpe_address)
+                break
+            self.breaker.record_failure(cpe_address)
+            attempt += 1
+            if not retryable or attempt >= self.retry.ATTEMPTS or self.breaker.is_open(cpe_address):
+                break
+            delay = self.retry.delay(attempt)
+            if time.monotonic() + delay >= deadline:
+                break
+            time.sleep(delay)
+        return {"cpe_address": cpe_address, "model": device["model"], "result": result} # type: ignore
+
+    def capacity(self, max_workers: int) -> int:
+        """ Cuantos equipos pueden estar en curso ahora """
+        return max(1, min(max_workers, self.concurrency.limit))
@@ -0,0 +1,87 @@
+from typing import Optional, Dict
+import sqlite3
+import threading
+import time
+
+class Session_Registry:
+    """ Recuerda en que CPE hay una sesion abierta. Los VSOL guardan la sesion por IP de origen y no por cookie,
+        asi que mientras no expire cualquier controlador de este host puede usarla sin volver a hacer login """
+    # Segundos sin uso luego de los cuales se asume que el CPE cerro la sesion
+    TTL = 240
+
+    def __init__(self, ttl: Optional[float] = None):
+        self.TTL = ttl or self.TTL
+        self._lock = threading.Lock()
+        self._last_seen: Dict[str, float] = {}
+
+    def is_valid(self, cpe_address: str) -> bool:
+        last_seen = self._get(cpe_address)
+        return last_seen is not None and time.time() - last_seen < self.TTL
+
+    def mark_logged_in(self, cpe_address: str) -> None:
+        self._set(cpe_address, time.time())
+
+    def touch(self, cpe_address: str) -> None:
+        """ Se llama en cada respuesta valida del CPE, extiende la sesion """
+        self._set(cpe_address, time.time())
+
+    def invalidate(self, cpe_address: str) -> None:
+        self._delete(cpe_address)
+
+    def _get(self, cpe_address: str) -> Optional[float]:
+        with self._lock:
+            return self._last_seen.get(cpe_address)
+
+    def _set(self, cpe_address: str, last_seen: float) -> None:
+        with self._lock:
+            self._last_seen[cpe_address] = last_seen
+
+    def _delete(self, cpe_address: str) -> None:
+        with self._lock:
+            self._last_seen.pop(cpe_address, None)
+
+class SQLite_Session_Registry(Session_Registry):
+    """ Igual que Session_Registry pero en un archivo SQLite, para compartirlo entre procesos del mismo host """
+    # Para no escribir en disco en cada peticion, touch solo escribe si paso este porcentaje del TTL
+    TOUCH_INTERVAL = 0.1
+
+    def __init__(self, path: str, ttl: Optional[float] = None):
+        super().__init__(ttl)
+        self.path = path
+        self._local = threading.local()
+        self._last_touch: Dict[str, float] = {}
+        with self._connection() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS sessions (cpe_address TEXT PRIMARY KEY, last_seen REAL NOT NULL)")
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def touch(self, cpe_address: str) -> None:
+        now = time.time()
+        with self._lock:
+            if now - self._last_touch.get(cpe_address, 0) < self.TTL * self.TOUCH_INTERVAL:
+                return
+        self._set(cpe_address, now)
+
+    def _get(self, cpe_address: str) -> Optional[float]:
+        row = self._connection().execute("SELECT last_seen FROM sessions WHERE cpe_address = ?", (cpe_address,)).fetchone()
+        return row[0] if row else None
+
+    def _set(self, cpe_address: str, last_seen: float) -> None:
+        with self._connection() as connection:
+            connection.execute("INSERT INTO sessions (cpe_address, last_seen) VALUES (?, ?) "
+                               "ON CONFLICT(cpe_address) DO UPDATE SET last_seen = excluded.last_seen", (cpe_address, last_seen))
+        with self._lock:
+            self._last_touch[cpe_address] = last_seen
+
+    def _delete(self, cpe_address: str) -> None:
+        with self._connection() as connection:
+            connection.execute("DELETE FROM sessions WHERE cpe_address = ?", (cpe_address,))
+        with self._lock:
+            self._last_touch.pop(cpe_address, None)
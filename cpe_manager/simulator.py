@@ -0,0 +1,449 @@
+from typing import Optional, List, Dict, Tuple, Any, TypedDict
+from urllib.parse import parse_qs, urlsplit
+import argparse
+import asyncio
+import multiprocessing
+import random
+import re
+import secrets
+import threading
+import time
+from cpe_manager.corpus import load_page
+
+# Simula el servidor web boa de los VSOL para poder medir y probar sin equipos reales.
+# Cada ONU virtual escucha en su propio puerto (o en su propia IP 127.x.y.z) y mantiene la sesion por IP de origen, como los equipos de verdad.
+
+class Simulator_Config(TypedDict, total=False):
+    # "vsol_v2802dac" o "vsol_acz"
+    model: str
+    username: str
+    password: str
+    # Latencia agregada a cada respuesta, en milisegundos, mas un jitter uniforme de +- jitter_ms
+    latency_ms: float
+    jitter_ms: float
+    # Probabilidad de que una peticion devuelva 500 o se corte la conexion sin respuesta
+    error_rate: float
+    drop_rate: float
+    # Probabilidad de que una ONU este "apagada": acepta la conexion pero nunca responde
+    offline_rate: float
+    # Si es True el token CSRF cambia con cada pagina servida y los POST deben traer el ultimo
+    csrf_rotation: bool
+    # Segundos sin uso luego de los cuales la ONU cierra la sesion de una IP
+    session_ttl: float
+    wifi_clients: int
+    dhcp_clients: int
+
+DEFAULT_CONFIG: Simulator_Config = {
+    "model": "vsol_v2802dac",
+    "username": "admin",
+    "password": "admin",
+    "latency_ms": 0.0,
+    "jitter_ms": 0.0,
+    "error_rate": 0.0,
+    "drop_rate": 0.0,
+    "offline_rate": 0.0,
+    "csrf_rotation": True,
+    "session_ttl": 300.0,
+    "wifi_clients": 8,
+    "dhcp_clients": 12
+}
+
+STATUS_TEXT = {200: "OK", 301: "Moved Permanently", 302: "Found", 400: "Bad Request", 403: "Forbidden", 404: "Not Found", 500: "Internal Server Error"}
+
+Response = Tuple[int, Dict[str, str], str]
+
+def _split_template(page: str, start_marker: str, end_marker: str, anchor: str = "") -> Tuple[str, str]:
+    """ Corta una pagina del corpus en (antes, despues) de la zona de filas para volver a llenarla """
+    start = page.index(start_marker, page.index(anchor)) + len(start_marker)
+    end = page.index(end_marker, start)
+    return page[:start], page[end:]
+
+class _Templates:
+    """ Las paginas del corpus sirven de plantilla, asi lo que se sirve tiene la misma forma que lo que parsean los controladores """
+    _loaded = False
+
+    @classmethod
+    def load(cls) -> None:
+        if cls._loaded:
+            return
+        cls.login = load_page("vsol_v2802dac", "login.asp")
+        cls.mgm_usr_user = load_page("vsol_v2802dac", "mgm_usr_user.asp")
+        cls.form_result = load_page("vsol_v2802dac", "formWlanSetup.html")
+        wlan = load_page("vsol_v2802dac", "status_wlan_info_11n.asp")
+        cls.wlan = _split_template(wlan, "Expired Time (s)</th>\n\t\t</tr>\n", "\t</table>")
+        ethernet = load_page("vsol_v2802dac", "status_ethernet_info.asp")
+        cls.ethernet = _split_template(ethernet, "var clts = new Array();\n", "function showDevices()")
+        cls.acz_login = load_page("vsol_acz", "login.asp")
+        acz = load_page("vsol_acz", "Status_Connected_User.html")
+        cls.acz_users = _split_template(acz, "<tbody>\n", "                                    </tbody>", anchor="Active DHCP Clients")
+        cls._loaded = True
+
+class Virtual_ONU:
+    """ Estado de una ONU simulada: sesiones por IP, token CSRF, configuracion WiFi y clientes conectados """
+
+    def __init__(self, index: int, config: Simulator_Config):
+        self.index = index
+        self.config = config
+        self.password = config["password"]
+        self.random = random.Random(index)
+        self.sessions: Dict[str, float] = {}
+        self.csrftoken = secrets.token_hex(16)
+        self.check_code = secrets.token_hex(3)
+        self.ssid = {0: f"ONU_{index}_5G", 1: f"ONU_{index}"}
+        self.psk = {0: "12345678", 1: "12345678"}
+        self.offline = self.random.random() < config["offline_rate"]
+        self.requests = 0
+        self.logins = 0
+        self.wifi_clients = [self._client() for _ in range(config["wifi_clients"])]
+        self.dhcp_clients = [self._client() for _ in range(config["dhcp_clients"])]
+
+    def _client(self) -> Dict[str, Any]:
+        rnd = self.random
+        return {
+            "mac": ":".join(f"{rnd.randrange(256):02x}" for _ in range(6)),
+            "name": rnd.choice(["android", "iPhone", "DESKTOP", "SmartTV", "ESP", "iPad", ""]) + (f"-{rnd.randrange(4096):03x}"),
+            "ip": f"192.168.1.{rnd.randrange(2, 254)}",
+            "lease": rnd.randrange(60, 86400),
+            "tx": rnd.randrange(1000, 9000000),
+            "rx": rnd.randrange(1000, 9000000),
+            "rate": rnd.choice(["72.2", "144.4", "65", "300", "866.7"]),
+            "rssi": -rnd.randrange(30, 90),
+            "ps": rnd.choice(["yes", "no"])
+        }
+
+    # ------------ sesion / csrf ----------------
+    def _logged_in(self, client_ip: str) -> bool:
+        last_seen = self.sessions.get(client_ip)
+        if last_seen is None or time.time() - last_seen > self.config["session_ttl"]:
+            self.sessions.pop(client_ip, None)
+            return False
+        self.sessions[client_ip] = time.time()
+        return True
+
+    def _issue_token(self) -> str:
+        if self.config["csrf_rotation"]:
+            self.csrftoken = secrets.token_hex(16)
+        return self.csrftoken
+
+    def _check_token(self, form: Dict[str, str]) -> bool:
+        return form.get("csrftoken") == self.csrftoken
+
+    @staticmethod
+    def _with_token(page: str, token: str) -> str:
+        return re.sub(r'(name="csrftoken" value=")[^"]*', lambda match: match.group(1) + token, page)
+
+    # ------------ paginas ----------------
+    def _login_page(self) -> str:
+        self.check_code = secrets.token_hex(3)
+        page = self._with_token(_Templates.login, self._issue_token())
+        return page.replace("value='h5Kq8'", f"value='{self.check_code}'")
+
+    def _form_result(self, ok: bool) -> str:
+        page = self._with_token(_Templates.form_result, self._issue_token())
+        return page if ok else page.replace("Change setting successfully!", "ERROR: Invalid token!")
+
+    def _wlan_page(self) -> str:
+        rows = "".join(
+            f"\t\t<tr>\n\t\t\t<td align=\"center\">{c['mac']}</td>\n\t\t\t<td align=\"center\">{c['tx']}</td>\n"
+            f"\t\t\t<td align=\"center\">{c['rx']}</td>\n\t\t\t<td align=\"center\">{c['rate']}</td>\n"
+            f"\t\t\t<td align=\"center\">{c['rssi']}</td>\n\t\t\t<td align=\"center\">{c['ps']}</td>\n"
+            f"\t\t\t<td align=\"center\">300</td>\n\t\t</tr>\n" for c in self.wifi_clients)
+        return _Templates.wlan[0] + rows + _Templates.wlan[1]
+
+    def _ethernet_page(self) -> str:
+        rows = "".join(
+            f"clts.push(new it_nr(\"{i}\", new it(\"devname\", \"{c['name']}\"), new it(\"ipAddr\", \"{c['ip']}\"), "
+            f"new it(\"macAddr\", \"{c['mac']}\"), new it(\"liveTime\", \"{c['lease']}\")));\n" for i, c in enumerate(self.dhcp_clients))
+        return _Templates.ethernet[0] + rows + _Templates.ethernet[1]
+
+    def _acz_users_page(self) -> str:
+        rows = "".join(
+            f"                                        <tr>\n                                            <td>{c['name']}</td>\n"
+            f"                                            <td>{c['mac']}</td>\n                                            <td>{c['ip']}</td>\n"
+            f"                                            <td>{c['lease']}</td>\n                                        </tr>\n" for c in self.dhcp_clients)
+        return _Templates.acz_users[0] + rows + _Templates.acz_users[1]
+
+    def _acz_dhcp_list(self) -> str:
+        return "".join(f"(/devname={c['name']}/macAddr={c['mac']}/ipAddr={c['ip']}/liveTime={c['lease']}/)\n" for c in self.dhcp_clients)
+
+    # ------------ rutas ----------------
+    def handle(self, method: str, path: str, form: Dict[str, str], client_ip: str) -> Response:
+        self.requests += 1
+        if self.config["model"] == "vsol_acz":
+            return self._handle_acz(method, path, form, client_ip)
+        return self._handle_2802dac(method, path, form, client_ip)
+
+    def _login(self, form: Dict[str, str], client_ip: str, check_code: bool) -> Response:
+        valid = form.get("username") == self.config["username"] and form.get("psd") == self.password
+        if check_code:
+            valid = valid and self._check_token(form) and form.get("verification_code") == self.check_code
+        if not valid:
+            return (200, {}, "<html><body><h4>ERROR: bad password!</h4></body></html>")
+        self.logins += 1
+        self.sessions[client_ip] = time.time()
+        return (302, {"Location": "/index.asp"}, "")
+
+    def _logout(self, client_ip: str) -> Response:
+        self.sessions.pop(client_ip, None)
+        return (301, {"Location": "/admin/login.asp"}, "")
+
+    def _handle_2802dac(self, method: str, path: str, form: Dict[str, str], client_ip: str) -> Response:
+        if path == "/admin/login.asp":
+            return (200, {}, self._login_page())
+        if path == "/boaform/admin/formLogin" and method == "POST":
+            return self._login(form, client_ip, check_code=True)
+        if path == "/boaform/admin/formLogout":
+            return self._logout(client_ip)
+        if not self._logged_in(client_ip):
+            return (302, {"Location": "/admin/login.asp"}, "")
+
+        if path == "/mgm_usr_user.asp":
+            return (200, {}, self._with_token(_Templates.mgm_usr_user, self._issue_token()))
+        if path == "/status_wlan_info_11n.asp":
+            return (200, {}, self._wlan_page())
+        if path == "/status_ethernet_info.asp":
+            return (200, {}, self._ethernet_page())
+        if method == "POST" and path == "/boaform/admin/formPasswordSetup":
+            if not self._check_token(form) or form.get("oldPasswd") != self.password or form.get("newPasswd") != form.get("affirmPasswd"):
+                return (200, {}, self._form_result(False))
+            self.password = form["newPasswd"]
+            self._issue_token()
+            return (302, {"Location": form.get("submit-url", "/mgm_usr_user.asp")}, "")
+        if method == "POST" and path in ("/boaform/admin/formWlanSetup", "/boaform/admin/formWlEncrypt"):
+            ok = self._check_token(form) and form.get("wlan_idx") in ("0", "1")
+            if ok and path.endswith("formWlanSetup"):
+                self.ssid[int(form["wlan_idx"])] = form.get("ssid", "")
+            elif ok:
+                self.psk[int(form["wlan_idx"])] = form.get("pskValue", "")
+            return (200, {}, self._form_result(ok))
+        return (404, {}, "<html><body>404 Not Found</body></html>")
+
+    def _handle_acz(self, method: str, path: str, form: Dict[str, str], client_ip: str) -> Response:
+        if path == "/boaform/admin/formLogin" and method == "POST":
+            return self._login(form, client_ip, check_code=False)
+        if path == "/boaform/admin/formLogout":
+            return self._logout(client_ip)
+        if path == "/admin/login.asp":
+            return (200, {}, _Templates.acz_login)
+        if not self._logged_in(client_ip):
+            return (302, {"Location": "/admin/login.asp"}, "")
+
+        if path == "/boaform/getASPdata/FMask":
+            return (200, {"Content-Type": "text/plain"}, self._issue_token())
+        if path == "/boaform/getASPdata/E8BDhcpClientList":
+            return (200, {"Content-Type": "text/plain"}, self._acz_dhcp_list())
+        if path == "/Status_Connected_User.html":
+            return (200, {}, self._acz_users_page())
+        if method == "POST" and path == "/boaform/getASPdata/new_formPasswordSetup":
+            if form.get("csrfMask") != self.csrftoken or form.get("oldPasswd") != self.password:
+                return (200, {"Content-Type": "text/plain"}, "failed")
+            self.password = form["newPasswd"]
+            return (200, {"Content-Type": "text/plain"}, "success")
+        return (404, {}, "<html><body>404 Not Found</body></html>")
+
+class ONU_Simulator:
+    """ Levanta muchas ONUs virtuales en localhost, todas en un solo event loop en un hilo aparte """
+
+    def __init__(self, count: int, host: str = "127.0.0.1", base_port: int = 0,
+                 bind_addresses: Optional[List[str]] = None, seed: Optional[int] = None, **config):
+        unknown = set(config) - set(DEFAULT_CONFIG)
+        if unknown:
+            raise ValueError(f"Parametros desconocidos: {', '.join(sorted(unknown))}")
+        self.config: Simulator_Config = dict(DEFAULT_CONFIG, **config) # type: ignore
+        self.count = count
+        self.host = host
+        # Con base_port = 0 cada ONU toma un puerto libre; con bind_addresses cada ONU usa su propia IP y el mismo puerto
+        self.base_port = base_port
+        self.bind_addresses = bind_addresses
+        self.random = random.Random(seed)
+        self.onus = [Virtual_ONU(index, self.config) for index in range(count)]
+        self.addresses: List[str] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._servers: List[asyncio.AbstractServer] = []
+        self._started = threading.Event()
+        self._error: Optional[BaseException] = None
+
+    def inventory(self) -> List[Dict[str, str]]:
+        """ Lista de equipos en el formato de cpe_manager.fleet.Fleet_Device """
+        return [{"cpe_address": address, "model": self.config["model"],
+                 "username": self.config["username"], "password": self.config["password"]} for address in self.addresses]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "requests": sum(onu.requests for onu in self.onus),
+            "logins": sum(onu.logins for onu in self.onus),
+            "open_sessions": sum(len(onu.sessions) for onu in self.onus),
+            "offline": sum(onu.offline for onu in self.onus)
+        }
+
+    async def _delay(self) -> None:
+        latency = self.config["latency_ms"] + self.random.uniform(-self.config["jitter_ms"], self.config["jitter_ms"])
+        if latency > 0:
+            await asyncio.sleep(latency / 1000)
+
+    async def _serve(self, onu: Virtual_ONU, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        client_ip = writer.get_extra_info("peername")[0]
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                lines = head.decode("latin-1").split("\r\n")
+                method, target, version = lines[0].split(" ", 2)
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                if onu.offline:
+                    # Como un equipo colgado: la conexion queda abierta y nunca contesta
+                    await asyncio.Event().wait()
+
+                await self._delay()
+                if self.random.random() < self.config["drop_rate"]:
+                    return
+                if self.random.random() < self.config["error_rate"]:
+                    status, extra_headers, text = 500, {}, "<html><body>500 Internal Server Error</body></html>"
+                else:
+                    form = { key: values[-1] for key, values in parse_qs(body.decode("utf-8", "replace"), keep_blank_values=True).items() }
+                    status, extra_headers, text = onu.handle(method, urlsplit(target).path, form, client_ip)
+
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                payload = text.encode("utf-8")
+                response_headers = {"Server": "Boa/0.94.14rc21", "Content-Type": "text/html",
+                                    "Content-Length": str(len(payload)), "Connection": "keep-alive" if keep_alive else "close"}
+                response_headers.update(extra_headers)
+                writer.write(f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n".encode("latin-1")
+                             + "".join(f"{name}: {value}\r\n" for name, value in response_headers.items()).encode("latin-1")
+                             + b"\r\n" + payload)
+                await writer.drain()
+                if not keep_alive:
+                    return
+        except (ConnectionError, ValueError, asyncio.CancelledError):
+            return
+        finally:
+            writer.close()
+
+    async def _start_servers(self) -> None:
+        _Templates.load()
+        for index, onu in enumerate(self.onus):
+            if self.bind_addresses:
+                host, port = self.bind_addresses[index], self.base_port or 80
+            else:
+                host, port = self.host, (self.base_port + index if self.base_port else 0)
+            server = await asyncio.start_server(lambda r, w, onu=onu: self._serve(onu, r, w), host, port,
+                                                reuse_address=True, backlog=256)
+            self._servers.append(server)
+            bound_port = server.sockets[0].getsockname()[1]
+            self.addresses.append(host if bound_port == 80 else f"{host}:{bound_port}")
+
+    def _run(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._start_servers())
+        except BaseException as e:
+            self._error = e
+            self._started.set()
+            return
+        self._started.set()
+        self._loop.run_forever()
+        for server in self._servers:
+            server.close()
+        tasks = asyncio.all_tasks(self._loop)
+        for task in tasks:
+            task.cancel()
+        self._loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        self._loop.close()
+
+    def start(self) -> "ONU_Simulator":
+        self._thread = threading.Thread(target=self._run, name="onu-simulator", daemon=True)
+        self._thread.start()
+        self._started.wait()
+        if self._error is not None:
+            raise self._error
+        return self
+
+    def stop(self) -> None:
+        if self._loop is not None and self._thread is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop = None
+
+    def __enter__(self) -> "ONU_Simulator":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+def _run_in_process(connection, count: int, kwargs: Dict[str, Any]) -> None:
+    simulator = ONU_Simulator(count, **kwargs).start()
+    connection.send(simulator.addresses)
+    # Se queda esperando hasta que el proceso padre pida terminar
+    connection.recv()
+    connection.send(simulator.stats())
+    simulator.stop()
+
+class ONU_Simulator_Process:
+    """ Igual que ONU_Simulator pero en otro proceso, para que el simulador no compita por el GIL con los controladores al medir """
+
+    def __init__(self, count: int, **kwargs):
+        self.count = count
+        self.kwargs = kwargs
+        self.config: Simulator_Config = dict(DEFAULT_CONFIG, **{ key: value for key, value in kwargs.items() if key in DEFAULT_CONFIG }) # type: ignore
+        self.addresses: List[str] = []
+        self.final_stats: Optional[Dict[str, int]] = None
+        self._connection = None
+        self._process = None
+
+    inventory = ONU_Simulator.inventory
+
+    def start(self) -> "ONU_Simulator_Process":
+        self._connection, child = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(target=_run_in_process, args=(child, self.count, self.kwargs), daemon=True)
+        self._process.start()
+        self.addresses = self._connection.recv()
+        return self
+
+    def stop(self) -> None:
+        if self._process is not None:
+            self._connection.send("stop")
+            self.final_stats = self._connection.recv()
+            self._process.join()
+            self._process = None
+
+    def __enter__(self) -> "ONU_Simulator_Process":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Simulador de ONUs VSOL para pruebas de carga")
+    parser.add_argument("--count", type=int, default=10)
+    parser.add_argument("--model", default=DEFAULT_CONFIG["model"], choices=["vsol_v2802dac", "vsol_acz"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--base-port", type=int, default=0)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--offline-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    simulator = ONU_Simulator(args.count, host=args.host, base_port=args.base_port, model=args.model,
+                              latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                              error_rate=args.error_rate, offline_rate=args.offline_rate).start()
+    for address in simulator.addresses:
+        print(address)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        simulator.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+from typing import Optional, List, Dict, Any, Iterable, AsyncIterable, IO, Union
+from enum import Enum
+import json
+from cpe_manager.fleet import Fleet_Result
+from cpe_manager.models.base import Return_Codes
+
+# Destinos para los resultados de Fleet_Executor.stream()/astream(). Escriben a medida que llegan,
+# asi la memoria queda acotada al buffer de cada sink sin importar el tamaño de la flota.
+
+def _plain(value: Any) -> Any:
+    """ Convierte Return_Codes, tuplas y excepciones en algo que json pueda escribir """
+    if isinstance(value, Enum):
+        return value.name
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    if isinstance(value, dict):
+        return { key: _plain(item) for key, item in value.items() }
+    if isinstance(value, BaseException):
+        return f"{type(value).__name__}: {value}"
+    return value
+
+def result_status(result: Any) -> str:
+    """ SUCCESS para listas de clientes o tuplas SUCCESS, si no el codigo que devolvio el controlador """
+    if isinstance(result, list):
+        return Return_Codes.SUCCESS.name
+    if isinstance(result, tuple) and result and isinstance(result[0], Return_Codes):
+        return result[0].name
+    return Return_Codes.ERROR.name
+
+class Result_Sink:
+    """ Interfaz comun de los sinks """
+
+    def write(self, result: Fleet_Result) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> "Result_Sink":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+class NDJSON_Sink(Result_Sink):
+    """ Una linea JSON por CPE: cpe_address, model, status y result """
+    # Cada cuantos resultados se hace flush al archivo
+    FLUSH_EVERY = 100
+
+    def __init__(self, target: Union[str, IO[str]], flush_every: Optional[int] = None):
+        self._owns_file = isinstance(target, str)
+        self.file: IO[str] = open(target, "a", encoding="utf-8") if isinstance(target, str) else target
+        self.FLUSH_EVERY = flush_every or self.FLUSH_EVERY
+        self.written = 0
+
+    def write(self, result: Fleet_Result) -> None:
+        line = {
+            "cpe_address": result["cpe_address"],
+            "model": result["model"],
+            "status": result_status(result["result"]),
+            "result": _plain(result["result"])
+        }
+        self.file.write(json.dumps(line, ensure_ascii=False) + "\n")
+        self.written += 1
+        if self.written % self.FLUSH_EVERY == 0:
+            self.file.flush()
+
+    def close(self) -> None:
+        self.file.flush()
+        if self._owns_file:
+            self.file.close()
+
+class Parquet_Sink(Result_Sink):
+    """ Archivo columnar (Parquet) con una fila por cliente, se escribe un row group cada ROW_GROUP_SIZE filas.
+        Necesita pyarrow """
+    ROW_GROUP_SIZE = 50000
+    COLUMNS = ("cpe_address", "model", "status", "message", "device_mac", "device_name", "device_ip",
+               "lease_time", "rssi_dbm", "packets_sent", "packets_received", "send_rate_mbps", "power_saving")
+
+    def __init__(self, path: str, row_group_size: Optional[int] = None):
+        # Se importa al crear el sink y no al importar el modulo, pyarrow es opcional y pesado
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("Parquet_Sink necesita el paquete pyarrow") from None
+        self._pyarrow = pyarrow
+        self.ROW_GROUP_SIZE = row_group_size or self.ROW_GROUP_SIZE
+        self.schema = pyarrow.schema([(column, pyarrow.string()) for column in self.COLUMNS])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+        self._columns: Dict[str, List[Optional[str]]] = { column: [] for column in self.COLUMNS }
+        self._rows = 0
+
+    @staticmethod
+    def _client_fields(client: Dict[str, Any]) -> Dict[str, Any]:
+        # Cada modelo nombra distinto los campos, se normalizan a los nombres de DHCP_Client/Wireless_Client.
+        # lease_time se compara con None, un lease de 0 segundos es un valor y no un campo faltante
+        lease_time = client.get("lease_time")
+        return {
+            "device_mac": client.get("device_mac") or client.get("macAddr"),
+            "device_name": client.get("device_name") or client.get("devname"),
+            "device_ip": client.get("device_ip") or client.get("ipAddr"),
+            "lease_time": client.get("liveTime") if lease_time is None else lease_time,
+            "rssi_dbm": client.get("rssi_dbm"),
+            "packets_sent": client.get("packets_sent") or client.get("packets_send"),
+            "packets_received": client.get("packets_received"),
+            "send_rate_mbps": client.get("send_rate_mbps"),
+            "power_saving": client.get("power_saving")
+        }
+
+    def _append(self, row: Dict[str, Any]) -> None:
+        for column in self.COLUMNS:
+            value = row.get(column)
+            self._columns[column].append(None if value is None else str(value))
+        self._rows += 1
+        if self._rows >= self.ROW_GROUP_SIZE:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._rows:
+            return
+        self.writer.write_table(self._pyarrow.table(self._columns, schema=self.schema))
+        self._columns = { column: [] for column in self.COLUMNS }
+        self._rows = 0
+
+    def write(self, result: Fleet_Result) -> None:
+        base = {"cpe_address": result["cpe_address"], "model": result["model"], "status": result_status(result["result"])}
+        clients = result["result"]
+        if isinstance(clients, list):
+            for client in clients:
+                self._append(dict(base, **self._client_fields(client)))
+            if not clients:
+                self._append(base)
+        else:
+            message = _plain(clients[1:]) if isinstance(clients, tuple) else _plain(clients)
+            self._append(dict(base, message=json.dumps(message, ensure_ascii=False)))
+
+    def close(self) -> None:
+        self._flush()
+        self.writer.close()
+
+def write_stream(results: Iterable[Fleet_Result], sink: Result_Sink) -> int:
+    """ Vacia un Fleet_Executor.stream() en el sink, devuelve cuantos CPE se escribieron """
+    count = 0
+    with sink:
+        for result in results:
+            sink.write(result)
+            count += 1
+    return count
+
+async def awrite_stream(results: AsyncIterable[Fleet_Result], sink: Result_Sink) -> int:
+    """ Lo mismo para Fleet_Executor.astream() """
+    count = 0
+    with sink:
+        async for result in results:
+            sink.write(result)
+            count += 1
+    return count
@@ -0,0 +1,342 @@
+from typing import Optional, List, Dict, Any, Iterable, Iterator, Tuple, Callable
+from array import array
+from collections import Counter
+from ipaddress import IPv4Address
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Representacion compacta de los clientes de muchos CPE. Los controladores devuelven dicts de strings (Wireless_Client,
+# DHCP_Client), aqui cada campo va en su propia columna tipada: MAC como entero de 48 bits, IPv4 como entero de 32 bits,
+# contadores y RSSI como numeros y los textos repetidos (nombre, CPE) guardados una sola vez.
+# La conversion de vuelta a dict es exacta: lo que no se puede reconstruir desde la columna tipada se guarda aparte.
+
+# Sentinelas para "no vino" en las columnas numericas
+MISSING_INT = -(2 ** 63)
+MISSING_RSSI = -(2 ** 15)
+# Las MAC tienen 48 bits, el sentinela queda fuera de ese rango y 00:00:00:00:00:00 se guarda como cualquier otra
+MISSING_MAC = 2 ** 64 - 1
+MISSING_IP = 0
+MISSING_FLAG = -1
+MISSING_RATE = -(2 ** 31)
+MISSING_NAME = -1
+_ABSENT = object()
+
+# Columnas que pueden faltar: (typecode del array, sentinela). Los tamaños son los del formato compacto:
+# IPv4 e indice de nombre en 4 bytes, RSSI en 2, contadores en 8
+COLUMNS: Dict[str, Tuple[str, int]] = {
+    "mac": ("Q", MISSING_MAC),
+    "ip": ("I", MISSING_IP),
+    "name": ("i", MISSING_NAME),
+    "lease_time": ("q", MISSING_INT),
+    "rssi": ("h", MISSING_RSSI),
+    "packets_sent": ("q", MISSING_INT),
+    "packets_received": ("q", MISSING_INT),
+    "send_rate": ("i", MISSING_RATE),
+    "power_saving": ("b", MISSING_FLAG)
+}
+
+def _typecode_range(typecode: str) -> Tuple[int, int]:
+    bits = array(typecode).itemsize * 8
+    if typecode.isupper():
+        return 0, 2 ** bits - 1
+    return -(2 ** (bits - 1)), 2 ** (bits - 1) - 1
+
+_RANGES = { column: _typecode_range(typecode) for column, (typecode, _) in COLUMNS.items() }
+_RANGES["mac"] = (0, 2 ** 48 - 1)
+
+def mac_to_int(mac: str) -> int:
+    return int(mac.replace(":", "").replace("-", "").replace(".", ""), 16)
+
+def int_to_mac(value: int) -> str:
+    raw = f"{value:012x}"
+    return ":".join(raw[i:i + 2] for i in range(0, 12, 2))
+
+def ip_to_int(ip: str) -> int:
+    return int(IPv4Address(ip))
+
+def int_to_ip(value: int) -> str:
+    return str(IPv4Address(value))
+
+def _parse_int(value: Any) -> int:
+    return int(value)
+
+def _parse_rate(value: Any) -> int:
+    # Decimas de Mbps, los VSOL informan 72.2, 144.4, 866.7...
+    return int(round(float(value) * 10))
+
+def _format_rate(value: int) -> str:
+    return str(value // 10) if value % 10 == 0 else f"{value // 10}.{value % 10}"
+
+def _parse_flag(value: Any) -> int:
+    return {"yes": 1, "no": 0}[value]
+
+def _format_flag(value: int) -> str:
+    return "yes" if value else "no"
+
+# Formas de los dicts que devuelven los controladores: (clave del dict, columna, tipo del valor en el dict)
+SCHEMAS: Dict[str, Tuple[Tuple[str, str, type], ...]] = {
+    # _2802dac.get_wifi_clients
+    "wifi": (("device_mac", "mac", str), ("packets_sent", "packets_sent", str), ("packets_received", "packets_received", str),
+             ("send_rate_mbps", "send_rate", str), ("rssi_dbm", "rssi", str), ("power_saving", "power_saving", str)),
+    # get_dhcp_clients de la V2802DAC
+    "dhcp": (("device_name", "name", str), ("device_ip", "ip", str), ("device_mac", "mac", str), ("lease_time", "lease_time", int)),
+    # get_wifi_clients y get_dhcp_clients de la ACZ
+    "acz": (("devname", "name", str), ("macAddr", "mac", str), ("ipAddr", "ip", str), ("liveTime", "lease_time", str))
+}
+KINDS = tuple(SCHEMAS)
+
+def detect_kind(client: Dict[str, Any]) -> str:
+    if "packets_sent" in client or "rssi_dbm" in client:
+        return "wifi"
+    if "device_ip" in client or "device_name" in client:
+        return "dhcp"
+    return "acz"
+
+class Client_Record:
+    """ Un cliente con los campos ya tipados, sin dict por instancia """
+    __slots__ = ("cpe_address", "kind", "mac", "ip", "name", "lease_time", "rssi", "packets_sent",
+                 "packets_received", "send_rate", "power_saving")
+
+    def __init__(self, cpe_address: str, kind: str, mac: Optional[int] = None, ip: Optional[int] = None,
+                 name: Optional[str] = None, lease_time: Optional[int] = None, rssi: Optional[int] = None,
+                 packets_sent: Optional[int] = None, packets_received: Optional[int] = None,
+                 send_rate: Optional[int] = None, power_saving: Optional[bool] = None):
+        self.cpe_address = cpe_address
+        self.kind = kind
+        self.mac = mac
+        self.ip = ip
+        self.name = name
+        self.lease_time = lease_time
+        self.rssi = rssi
+        self.packets_sent = packets_sent
+        self.packets_received = packets_received
+        # Decimas de Mbps
+        self.send_rate = send_rate
+        self.power_saving = power_saving
+
+    @property
+    def mac_str(self) -> Optional[str]:
+        return None if self.mac is None else int_to_mac(self.mac)
+
+    @property
+    def ip_str(self) -> Optional[str]:
+        return None if self.ip is None else int_to_ip(self.ip)
+
+    def __repr__(self) -> str:
+        return f"Client_Record({self.cpe_address!r}, {self.kind!r}, mac={self.mac_str!r}, ip={self.ip_str!r}, rssi={self.rssi!r})"
+
+class Client_Snapshot:
+    """ Snapshot columnar de los clientes de muchos CPE, una fila por cliente """
+
+    def __init__(self):
+        self._cpes: List[str] = []
+        self._cpe_ids: Dict[str, int] = {}
+        self._names: List[str] = []
+        self._name_ids: Dict[str, int] = {}
+        self.cpe = array("I")
+        self.kind = array("B")
+        for column, (typecode, _) in COLUMNS.items():
+            setattr(self, column, array(typecode))
+        # fila -> {clave del dict: valor original} para lo que no se puede reconstruir desde las columnas
+        self._overrides: Dict[int, Dict[str, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self.cpe)
+
+    # ------------ carga ----------------
+    def _intern(self, value: str, values: List[str], ids: Dict[str, int]) -> int:
+        index = ids.get(value)
+        if index is None:
+            index = ids[value] = len(values)
+            values.append(value)
+        return index
+
+    def _typed(self, column: str, value: Any) -> Tuple[Any, bool]:
+        """ Devuelve (valor para la columna, si al volver a texto queda igual que el original) """
+        if value is None:
+            return None, True
+        if column == "mac":
+            typed = mac_to_int(value)
+            return typed, int_to_mac(typed) == value
+        if column == "ip":
+            typed = ip_to_int(value)
+            return typed, int_to_ip(typed) == value
+        if column == "send_rate":
+            typed = _parse_rate(value)
+            return typed, _format_rate(typed) == str(value)
+        if column == "power_saving":
+            return _parse_flag(value), True
+        if column == "name":
+            return value, True
+        typed = _parse_int(value)
+        return typed, str(typed) == str(value)
+
+    def append(self, cpe_address: str, client: Dict[str, Any], kind: Optional[str] = None) -> int:
+        """ Agrega un cliente en el formato de los controladores, devuelve el numero de fila """
+        kind = kind or detect_kind(client)
+        row = len(self)
+        values: Dict[str, Any] = {}
+        overrides: Dict[str, Any] = {}
+
+        # Todo se convierte y se valida antes de tocar las columnas, si no una excepcion a mitad de fila las desalinea
+        for key, column, _ in SCHEMAS[kind]:
+            if key not in client:
+                overrides[key] = _ABSENT
+                continue
+            try:
+                typed, exact = self._typed(column, client[key])
+            except (ValueError, KeyError, TypeError, OverflowError):
+                typed, exact = None, False
+            if typed is not None and column != "name":
+                low, high = _RANGES[column]
+                # Fuera de rango o igual al sentinela no se puede guardar en la columna, queda como override
+                if not low <= typed <= high or typed == COLUMNS[column][1]:
+                    typed, exact = None, False
+            values[column] = typed
+            if not exact:
+                overrides[key] = client[key]
+        schema_keys = { key for key, _, _ in SCHEMAS[kind] }
+        for key, value in client.items():
+            if key not in schema_keys:
+                overrides[key] = value
+
+        name = values.pop("name", None)
+        row_values = { column: missing for column, (_, missing) in COLUMNS.items() }
+        row_values.update((column, value) for column, value in values.items() if value is not None)
+        row_values["name"] = MISSING_NAME if name is None else self._intern(name, self._names, self._name_ids)
+        self.cpe.append(self._intern(cpe_address, self._cpes, self._cpe_ids))
+        self.kind.append(KINDS.index(kind))
+        for column, value in row_values.items():
+            getattr(self, column).append(value)
+        if overrides:
+            self._overrides[row] = overrides
+        return row
+
+    def extend(self, cpe_address: str, clients: Iterable[Dict[str, Any]], kind: Optional[str] = None) -> None:
+        for client in clients:
+            self.append(cpe_address, client, kind)
+
+    @classmethod
+    def from_results(cls, results: Iterable[Dict[str, Any]], kind: Optional[str] = None) -> "Client_Snapshot":
+        """ Arma el snapshot desde resultados de Fleet_Executor (los que no son listas de clientes se ignoran) """
+        snapshot = cls()
+        for result in results:
+            if isinstance(result["result"], list):
+                snapshot.extend(result["cpe_address"], result["result"], kind)
+        return snapshot
+
+    # ------------ lectura ----------------
+    def cpe_address(self, row: int) -> str:
+        return self._cpes[self.cpe[row]]
+
+    def _value(self, column: str, row: int) -> Any:
+        if column == "name":
+            index = self.name[row]
+            return None if index == MISSING_NAME else self._names[index]
+        raw = getattr(self, column)[row]
+        if column == "mac":
+            return None if raw == MISSING_MAC else raw
+        if column == "ip":
+            return None if raw == MISSING_IP else raw
+        if column == "rssi":
+            return None if raw == MISSING_RSSI else raw
+        if column == "power_saving":
+            return None if raw == MISSING_FLAG else bool(raw)
+        if column == "send_rate":
+            return None if raw == MISSING_RATE else raw
+        return None if raw == MISSING_INT else raw
+
+    def record(self, row: int) -> Client_Record:
+        return Client_Record(self.cpe_address(row), KINDS[self.kind[row]],
+                             **{ column: self._value(column, row) for column in
+                                 ("mac", "ip", "name", "lease_time", "rssi", "packets_sent", "packets_received", "send_rate", "power_saving") })
+
+    def __getitem__(self, row: int) -> Client_Record:
+        return self.record(row)
+
+    def __iter__(self) -> Iterator[Client_Record]:
+        for row in range(len(self)):
+            yield self.record(row)
+
+    def _format(self, column: str, value: Any, value_type: type) -> Any:
+        if value is None:
+            return None
+        if column == "mac":
+            return int_to_mac(value)
+        if column == "ip":
+            return int_to_ip(value)
+        if column == "send_rate":
+            return _format_rate(value)
+        if column == "power_saving":
+            return _format_flag(value)
+        if column == "name":
+            return value
+        return value if value_type is int else str(value)
+
+    def to_dict(self, row: int) -> Dict[str, Any]:
+        """ El cliente exactamente como lo devolvio el controlador """
+        overrides = self._overrides.get(row, {})
+        client: Dict[str, Any] = {}
+        for key, column, value_type in SCHEMAS[KINDS[self.kind[row]]]:
+            if key in overrides:
+                if overrides[key] is not _ABSENT:
+                    client[key] = overrides[key]
+                continue
+            client[key] = self._format(column, self._value(column, row), value_type)
+        for key, value in overrides.items():
+            if key not in client and value is not _ABSENT:
+                client[key] = value
+        return client
+
+    def to_results(self) -> Dict[str, List[Dict[str, Any]]]:
+        """ {cpe_address: [clientes]} en el formato original """
+        results: Dict[str, List[Dict[str, Any]]] = {}
+        for row in range(len(self)):
+            results.setdefault(self.cpe_address(row), []).append(self.to_dict(row))
+        return results
+
+    # ------------ filtros y agregaciones ----------------
+    def column(self, name: str):
+        """ La columna como arreglo de numpy (sin copiar) si numpy esta instalado, si no el array tal cual """
+        data = getattr(self, name)
+        if numpy is not None:
+            return numpy.frombuffer(data, dtype=data.typecode) if len(data) else numpy.array([], dtype=data.typecode)
+        return data
+
+    def where(self, column: str, predicate: Callable[[Any], Any]) -> List[int]:
+        """ Filas donde predicate(columna) es verdadero. Con numpy predicate recibe la columna entera """
+        data = self.column(column)
+        if numpy is not None:
+            return numpy.flatnonzero(predicate(data)).tolist()
+        return [row for row, value in enumerate(data) if predicate(value)]
+
+    def rssi_below(self, threshold_dbm: int) -> List[int]:
+        return self.where("rssi", lambda rssi: (rssi < threshold_dbm) & (rssi != MISSING_RSSI))
+
+    def by_mac(self, mac: str) -> List[int]:
+        value = mac_to_int(mac)
+        # Las filas sin MAC nunca coinciden, aunque se busque el valor del sentinela
+        return self.where("mac", lambda macs: (macs == value) & (macs != MISSING_MAC))
+
+    def clients_per_cpe(self) -> Dict[str, int]:
+        if numpy is not None:
+            counts = numpy.bincount(self.column("cpe"), minlength=len(self._cpes)) if len(self) else []
+            return { cpe: int(count) for cpe, count in zip(self._cpes, counts) if count }
+        counts = Counter(self.cpe)
+        return { self._cpes[index]: count for index, count in counts.items() }
+
+    def select(self, rows: Iterable[int]) -> "Client_Snapshot":
+        """ Nuevo snapshot solo con esas filas """
+        snapshot = Client_Snapshot()
+        for row in rows:
+            snapshot.append(self.cpe_address(row), self.to_dict(row), KINDS[self.kind[row]])
+        return snapshot
+
+    def nbytes(self) -> int:
+        """ Bytes aproximados de las columnas (sin contar textos internados ni overrides) """
+        columns = (self.cpe, self.kind, self.mac, self.ip, self.name, self.lease_time, self.rssi,
+                   self.packets_sent, self.packets_received, self.send_rate, self.power_saving)
+        return sum(len(column) * column.itemsize for column in columns)
@@ -0,0 +1,451 @@
+from typing import Optional, List, Dict, Any, Iterable, Iterator, Tuple, TypedDict
+from array import array
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from cpe_manager.snapshot import Client_Snapshot, KINDS, MISSING_MAC, MISSING_RSSI, MISSING_IP, mac_to_int, int_to_mac, int_to_ip
+
+# Historial de clientes en disco, para responder "en que ONU esta esta MAC y desde cuando" sin consultar la flota.
+# Es append-only y esta dividido en segmentos de registros de tamaño fijo. El segmento activo se indexa en memoria;
+# al cerrarse se escriben sus indices por MAC y por CPE (pares ordenados) y desde ahi se lee con mmap sin copiar.
+# Dentro de un segmento los registros estan ordenados por tiempo, asi el indice de tiempo es una busqueda binaria.
+#
+#   <dir>/cpes.txt, names.txt          textos internados, una linea JSON por valor (el id es el numero de linea)
+#   <dir>/<seq>.seg                    registros
+#   <dir>/<seq>.mac, <seq>.cpe         indices (clave, fila) uint64 ordenados, solo en segmentos cerrados
+#   <dir>/<seq>.json                   metadatos del segmento cerrado (filas, primer y ultimo timestamp)
+#   <dir>/manifest.json                segmentos cerrados en orden y el activo. Es lo unico que decide que segmentos
+#                                      valen: se reemplaza con un rename atomico y lo que no figura se borra al abrir
+
+class Store_Record(TypedDict):
+    timestamp: float
+    cpe_address: str
+    mac: str
+    ip: Optional[str]
+    name: Optional[str]
+    rssi_dbm: Optional[int]
+    # wifi, dhcp o acz (ver cpe_manager.snapshot.SCHEMAS)
+    kind: str
+
+# timestamp, mac, id de cpe, ip, id de nombre, rssi, kind
+RECORD = struct.Struct("<dQIIIhBx")
+NO_NAME = 0xFFFFFFFF
+
+class _Strings:
+    """ Textos internados en un archivo append-only """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.values: List[str] = []
+        self.ids: Dict[str, int] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as strings_file:
+                for line in strings_file:
+                    value = json.loads(line)
+                    self.ids[value] = len(self.values)
+                    self.values.append(value)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def intern(self, value: str) -> int:
+        index = self.ids.get(value)
+        if index is None:
+            index = self.ids[value] = len(self.values)
+            self.values.append(value)
+            self._file.write(json.dumps(value, ensure_ascii=False) + "\n")
+        return index
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+def _lower_bound(index: memoryview, key: int) -> int:
+    """ Primer par con clave >= key en un indice de pares (clave, fila) """
+    low, high = 0, len(index) // 2
+    while low < high:
+        middle = (low + high) // 2
+        if index[2 * middle] < key:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+def _index_rows(index: memoryview, key: int) -> List[int]:
+    rows = []
+    position = _lower_bound(index, key)
+    while position < len(index) // 2 and index[2 * position] == key:
+        rows.append(index[2 * position + 1])
+        position += 1
+    return rows
+
+def _build_index(keys: Iterable[int]) -> array:
+    pairs = sorted((key, row) for row, key in enumerate(keys))
+    index = array("Q")
+    for key, row in pairs:
+        index.append(key)
+        index.append(row)
+    return index
+
+class _Sealed_Segment:
+    """ Segmento cerrado, datos e indices leidos por mmap """
+
+    def __init__(self, directory: str, seq: int):
+        self.seq = seq
+        self.paths = { suffix: os.path.join(directory, f"{seq:08d}.{suffix}") for suffix in ("seg", "mac", "cpe", "json") }
+        with open(self.paths["json"], encoding="utf-8") as meta_file:
+            meta = json.load(meta_file)
+        self.rows: int = meta["rows"]
+        self.first: float = meta["first"]
+        self.last: float = meta["last"]
+        self._maps: Dict[str, mmap.mmap] = {}
+
+    def _map(self, suffix: str) -> memoryview:
+        if suffix not in self._maps:
+            with open(self.paths[suffix], "rb") as segment_file:
+                self._maps[suffix] = mmap.mmap(segment_file.fileno(), 0, access=mmap.ACCESS_READ)
+        data = memoryview(self._maps[suffix])
+        return data if suffix == "seg" else data.cast("Q")
+
+    @property
+    def data(self) -> memoryview:
+        return self._map("seg") if self.rows else memoryview(b"")
+
+    def mac_rows(self, mac: int) -> List[int]:
+        return _index_rows(self._map("mac"), mac) if self.rows else []
+
+    def cpe_rows(self, cpe_id: int) -> List[int]:
+        return _index_rows(self._map("cpe"), cpe_id) if self.rows else []
+
+    def reader(self) -> Optional[mmap.mmap]:
+        """ mmap propio de los registros, sigue valido aunque el segmento se compacte o se borre mientras se lee """
+        if not self.rows:
+            return None
+        with open(self.paths["seg"], "rb") as segment_file:
+            return mmap.mmap(segment_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self) -> None:
+        for mapped in self._maps.values():
+            mapped.close()
+        self._maps = {}
+
+    def delete(self) -> None:
+        self.close()
+        for path in self.paths.values():
+            if os.path.exists(path):
+                os.remove(path)
+
+def _write_segment(directory: str, seq: int, data: bytes) -> None:
+    """ Escribe un segmento cerrado completo, primero con nombres temporales para no dejar uno a medias """
+    rows = len(data) // RECORD.size
+    records = [RECORD.unpack_from(data, row * RECORD.size) for row in range(rows)]
+    files = {
+        "seg": data,
+        "mac": _build_index(record[1] for record in records).tobytes(),
+        "cpe": _build_index(record[2] for record in records).tobytes(),
+        "json": json.dumps({"rows": rows, "first": records[0][0] if rows else 0.0, "last": records[-1][0] if rows else 0.0}).encode()
+    }
+    for suffix, content in files.items():
+        with open(os.path.join(directory, f"{seq:08d}.{suffix}.tmp"), "wb") as segment_file:
+            segment_file.write(content)
+            segment_file.flush()
+            os.fsync(segment_file.fileno())
+    for suffix in files:
+        os.replace(os.path.join(directory, f"{seq:08d}.{suffix}.tmp"), os.path.join(directory, f"{seq:08d}.{suffix}"))
+
+def _fsync_directory(directory: str) -> None:
+    """ Los rename solo sobreviven a un corte de luz despues del fsync del directorio """
+    descriptor = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+class Snapshot_Store:
+    """ Historial append-only de clientes por CPE con indices por MAC, por CPE y por tiempo """
+    # Registros por segmento (32 bytes cada uno)
+    SEGMENT_RECORDS = 1_000_000
+    MANIFEST = "manifest.json"
+
+    def __init__(self, directory: str, segment_records: Optional[int] = None):
+        self.directory = directory
+        self.SEGMENT_RECORDS = segment_records or self.SEGMENT_RECORDS
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.RLock()
+        self.cpes = _Strings(os.path.join(directory, "cpes.txt"))
+        self.names = _Strings(os.path.join(directory, "names.txt"))
+        self.segments: List[_Sealed_Segment] = []
+
+        manifest_path = os.path.join(directory, self.MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, encoding="utf-8") as manifest_file:
+                manifest = json.load(manifest_file)
+            sealed, active_seq = manifest["segments"], manifest["active"]
+        else:
+            # Directorio de antes del manifest: los segmentos con .json estan cerrados
+            sequences = sorted(int(name.split(".")[0]) for name in os.listdir(directory) if name.endswith(".seg"))
+            sealed = [seq for seq in sequences if os.path.exists(os.path.join(directory, f"{seq:08d}.json"))]
+            unsealed = [seq for seq in sequences if seq not in sealed]
+            active_seq = unsealed[-1] if unsealed else (sequences[-1] + 1 if sequences else 0)
+        self._remove_leftovers(sealed, active_seq)
+        self._next_seq = max(sealed + [active_seq]) + 1
+        self.segments = [_Sealed_Segment(directory, seq) for seq in sealed]
+        self._open_active(active_seq)
+        self._write_manifest()
+
+    def _remove_leftovers(self, sealed: List[int], active_seq: int) -> None:
+        """ Borra lo que no figura en el manifest: temporales, segmentos de una compactacion cortada a medias o ya
+            reemplazados, y los indices de un activo que se estaba cerrando """
+        sealed_set = set(sealed)
+        for name in os.listdir(self.directory):
+            parts = name.split(".")
+            if not parts[0].isdigit() or len(parts) < 2:
+                continue
+            seq = int(parts[0])
+            if name.endswith(".tmp") or (seq not in sealed_set and not (seq == active_seq and name.endswith(".seg"))):
+                os.remove(os.path.join(self.directory, name))
+
+    def _write_manifest(self, segments: Optional[List[int]] = None, active_seq: Optional[int] = None) -> None:
+        """ Reemplaza el manifest de una sola vez, los archivos que nombra ya tienen que estar en disco """
+        manifest = {
+            "segments": [segment.seq for segment in self.segments] if segments is None else segments,
+            "active": self._active_seq if active_seq is None else active_seq
+        }
+        path = os.path.join(self.directory, self.MANIFEST)
+        _fsync_directory(self.directory)
+        with open(path + ".tmp", "w", encoding="utf-8") as manifest_file:
+            json.dump(manifest, manifest_file)
+            manifest_file.flush()
+            os.fsync(manifest_file.fileno())
+        os.replace(path + ".tmp", path)
+        _fsync_directory(self.directory)
+
+    # ------------ escritura ----------------
+    def _open_active(self, seq: int) -> None:
+        self._active_seq = seq
+        path = os.path.join(self.directory, f"{seq:08d}.seg")
+        data = b""
+        if os.path.exists(path):
+            with open(path, "rb") as segment_file:
+                data = segment_file.read()
+        # Un registro a medias (corte de luz en medio de una escritura) se descarta
+        usable = len(data) - len(data) % RECORD.size
+        self._active = bytearray(data[:usable])
+        self._active_file = open(path, "r+b" if os.path.exists(path) else "wb")
+        self._active_file.truncate(usable)
+        self._active_file.seek(usable)
+        self._active_mac: Dict[int, List[int]] = {}
+        self._active_cpe: Dict[int, List[int]] = {}
+        self._last_timestamp = self.segments[-1].last if self.segments else 0.0
+        for row in range(usable // RECORD.size):
+            self._index_active(row, RECORD.unpack_from(self._active, row * RECORD.size))
+
+    def _index_active(self, row: int, record: Tuple) -> None:
+        self._active_mac.setdefault(record[1], []).append(row)
+        self._active_cpe.setdefault(record[2], []).append(row)
+        self._last_timestamp = record[0]
+
+    def _seal(self) -> None:
+        self._active_file.close()
+        # Hasta que el manifest lo nombre como cerrado sigue siendo el activo, con su .seg completo
+        _write_segment(self.directory, self._active_seq, bytes(self._active))
+        self.segments.append(_Sealed_Segment(self.directory, self._active_seq))
+        seq = self._next_seq
+        self._next_seq += 1
+        self._write_manifest(active_seq=seq)
+        self._open_active(seq)
+
+    def append_snapshot(self, snapshot: Client_Snapshot, timestamp: Optional[float] = None) -> int:
+        """ Guarda todas las filas del snapshot con el mismo timestamp, devuelve cuantas se escribieron """
+        with self._lock:
+            # El orden por tiempo de los segmentos es lo que hace de indice de tiempo, no se aceptan timestamps hacia atras
+            timestamp = max(time.time() if timestamp is None else timestamp, self._last_timestamp)
+            buffer = bytearray()
+            written = 0
+            for row in range(len(snapshot)):
+                if snapshot.mac[row] == MISSING_MAC:
+                    continue
+                name = snapshot._value("name", row)
+                record = (timestamp, snapshot.mac[row], self.cpes.intern(snapshot.cpe_address(row)), snapshot.ip[row],
+                          NO_NAME if name is None else self.names.intern(name), snapshot.rssi[row], snapshot.kind[row])
+                buffer += RECORD.pack(*record)
+                self._index_active(len(self._active) // RECORD.size + written, record)
+                written += 1
+            self.cpes.flush()
+            self.names.flush()
+            self._active_file.write(buffer)
+            self._active_file.flush()
+            self._active += buffer
+            if len(self._active) // RECORD.size >= self.SEGMENT_RECORDS:
+                self._seal()
+            return written
+
+    def append_results(self, results: Iterable[Dict[str, Any]], timestamp: Optional[float] = None) -> int:
+        """ Resultados de Fleet_Executor (run, stream o Fetch_Parse_Pipeline), los que no son listas de clientes se ignoran """
+        return self.append_snapshot(Client_Snapshot.from_results(results), timestamp)
+
+    # ------------ lectura ----------------
+    def _record(self, data: memoryview, row: int) -> Store_Record:
+        timestamp, mac, cpe_id, ip, name_id, rssi, kind = RECORD.unpack_from(data, row * RECORD.size)
+        return {
+            "timestamp": timestamp,
+            "cpe_address": self.cpes.values[cpe_id],
+            "mac": int_to_mac(mac),
+            "ip": None if ip == MISSING_IP else int_to_ip(ip),
+            "name": None if name_id == NO_NAME else self.names.values[name_id],
+            "rssi_dbm": None if rssi == MISSING_RSSI else rssi,
+            "kind": KINDS[kind]
+        }
+
+    def _timestamp(self, data: memoryview, row: int) -> float:
+        return struct.unpack_from("<d", data, row * RECORD.size)[0]
+
+    def _first_row_at(self, data: memoryview, rows: int, timestamp: float) -> int:
+        low, high = 0, rows
+        while low < high:
+            middle = (low + high) // 2
+            if self._timestamp(data, middle) < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _lookup(self, sealed_rows, active_rows: List[int], start: Optional[float], end: Optional[float]) -> List[Store_Record]:
+        records = []
+        with self._lock:
+            for segment in self.segments:
+                if (start is not None and segment.last < start) or (end is not None and segment.first >= end):
+                    continue
+                data = segment.data
+                records.extend(self._record(data, row) for row in sealed_rows(segment))
+            with memoryview(self._active) as data:
+                records.extend(self._record(data, row) for row in active_rows)
+        return [record for record in records
+                if (start is None or record["timestamp"] >= start) and (end is None or record["timestamp"] < end)]
+
+    def by_mac(self, mac: str, start: Optional[float] = None, end: Optional[float] = None) -> List[Store_Record]:
+        """ Todas las veces que se vio la MAC, en orden de tiempo """
+        key = mac_to_int(mac)
+        with self._lock:
+            return self._lookup(lambda segment: segment.mac_rows(key), list(self._active_mac.get(key, [])), start, end)
+
+    def by_cpe(self, cpe_address: str, start: Optional[float] = None, end: Optional[float] = None) -> List[Store_Record]:
+        cpe_id = self.cpes.ids.get(cpe_address)
+        if cpe_id is None:
+            return []
+        with self._lock:
+            return self._lookup(lambda segment: segment.cpe_rows(cpe_id), list(self._active_cpe.get(cpe_id, [])), start, end)
+
+    def time_range(self, start: float, end: float) -> Iterator[Store_Record]:
+        """ Registros con start <= timestamp < end, en orden. Los segmentos cerrados se leen a medida que se itera
+            con un mmap propio del iterador, asi compactar o aplicar retencion mientras tanto no lo corta """
+        with self._lock:
+            segments = [segment for segment in self.segments if segment.last >= start and segment.first < end]
+            readers = [(segment.reader(), segment.rows) for segment in segments]
+            with memoryview(self._active) as data:
+                first = self._first_row_at(data, len(self._active) // RECORD.size, start)
+            # Del segmento activo se copia solo lo que queda desde start, puede seguir creciendo mientras se itera
+            active = bytes(self._active[first * RECORD.size:])
+        try:
+            for mapped, rows in readers + [(active, len(active) // RECORD.size)]:
+                if mapped is None:
+                    continue
+                with memoryview(mapped) as data:
+                    for row in range(self._first_row_at(data, rows, start), rows):
+                        record = self._record(data, row)
+                        if record["timestamp"] >= end:
+                            return
+                        yield record
+        finally:
+            for mapped, _ in readers:
+                if mapped is not None:
+                    mapped.close()
+
+    def where_is(self, mac: str) -> Optional[Tuple[str, float, float]]:
+        """ (cpe, desde, ultima vez visto) para la ultima ONU donde se vio la MAC """
+        records = self.by_mac(mac)
+        if not records:
+            return None
+        cpe_address = records[-1]["cpe_address"]
+        since = records[-1]["timestamp"]
+        for record in reversed(records):
+            if record["cpe_address"] != cpe_address:
+                break
+            since = record["timestamp"]
+        return (cpe_address, since, records[-1]["timestamp"])
+
+    def __len__(self) -> int:
+        return sum(segment.rows for segment in self.segments) + len(self._active) // RECORD.size
+
+    # ------------ mantenimiento ----------------
+    def flush(self) -> None:
+        """ Cierra el segmento activo aunque no este lleno, asi queda indexado en disco """
+        with self._lock:
+            if self._active:
+                self._seal()
+
+    def apply_retention(self, max_age: float, now: Optional[float] = None) -> int:
+        """ Borra los segmentos cerrados cuyo ultimo registro es mas viejo que max_age segundos, devuelve cuantos """
+        cutoff = (time.time() if now is None else now) - max_age
+        with self._lock:
+            expired = [segment for segment in self.segments if segment.last < cutoff]
+            if not expired:
+                return 0
+            self.segments = [segment for segment in self.segments if segment.last >= cutoff]
+            self._write_manifest()
+            for segment in expired:
+                segment.delete()
+            return len(expired)
+
+    def compact(self) -> int:
+        """ Une los segmentos cerrados y de cada estadia (misma MAC en el mismo CPE con la misma IP y nombre en
+            consultas seguidas) deja solo la primera y la ultima observacion. Devuelve cuantos registros se quitaron """
+        with self._lock:
+            if not self.segments:
+                return 0
+            records = []
+            for segment in self.segments:
+                records.extend(RECORD.iter_unpack(segment.data))
+            by_mac: Dict[int, List[int]] = {}
+            for position, record in enumerate(records):
+                by_mac.setdefault(record[1], []).append(position)
+            keep = bytearray(len(records))
+            for positions in by_mac.values():
+                for order, position in enumerate(positions):
+                    stay = records[position][2:5]
+                    previous = records[positions[order - 1]][2:5] if order else None
+                    following = records[positions[order + 1]][2:5] if order + 1 < len(positions) else None
+                    keep[position] = stay != previous or stay != following
+            kept = [record for position, record in enumerate(records) if keep[position]]
+
+            # Los segmentos nuevos se escriben completos con numeros sin usar y recien ahi el manifest pasa de los viejos
+            # a los nuevos. Si se corta antes, al abrir siguen valiendo los viejos y los nuevos se borran
+            new_segments = []
+            for start in range(0, len(kept), self.SEGMENT_RECORDS):
+                chunk = b"".join(RECORD.pack(*record) for record in kept[start:start + self.SEGMENT_RECORDS])
+                _write_segment(self.directory, self._next_seq, chunk)
+                new_segments.append(self._next_seq)
+                self._next_seq += 1
+            self._write_manifest(new_segments)
+            old_segments = self.segments
+            self.segments = [_Sealed_Segment(self.directory, new_seq) for new_seq in new_segments]
+            for segment in old_segments:
+                segment.delete()
+            return len(records) - len(kept)
+
+    def close(self) -> None:
+        with self._lock:
+            self._active_file.close()
+            for segment in self.segments:
+                segment.close()
+            self.cpes.close()
+            self.names.close()
+
+    def __enter__(self) -> "Snapshot_Store":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
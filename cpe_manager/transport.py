@@ -0,0 +1,161 @@
+from typing import Optional, Tuple, TypedDict, TYPE_CHECKING
+import threading
+import time
+
+# requests/urllib3 se importan recien al crear la primera sesion, es lo que mas tarda en cargar
+if TYPE_CHECKING:
+    import requests
+    from requests.adapters import HTTPAdapter
+
+class Transport_Config(TypedDict):
+    # Cantidad de hosts (CPEs) cuyo pool de conexiones se mantiene abierto
+    pool_connections: int
+    # Conexiones keep-alive por CPE, estos equipos no aguantan muchas en paralelo
+    pool_maxsize: int
+    # Si se llega a pool_maxsize se espera una conexion libre en vez de abrir otra
+    pool_block: bool
+    connect_timeout: float
+    read_timeout: float
+
+DEFAULT_CONFIG: Transport_Config = {
+    "pool_connections": 1024,
+    "pool_maxsize": 2,
+    "pool_block": True,
+    "connect_timeout": 5.0,
+    "read_timeout": 30.0
+}
+
+_config: Transport_Config = dict(DEFAULT_CONFIG) # type: ignore
+_adapter: Optional["HTTPAdapter"] = None
+_Timed_Adapter: Optional[type] = None
+_lock = threading.Lock()
+
+# Tiempo gastado abriendo conexiones TCP en el hilo actual, lo usan las metricas para separar la fase connect
+_connect_time = threading.local()
+
+def reset_connect_time() -> None:
+    _connect_time.seconds = 0.0
+
+def pop_connect_time() -> float:
+    seconds = getattr(_connect_time, "seconds", 0.0)
+    _connect_time.seconds = 0.0
+    return seconds
+
+# Conexiones o lecturas que fallaron (rechazo, timeout, reset) en el hilo actual, asi cpe_manager.scheduling distingue
+# un CPE que no responde de uno que responde con error aunque el controlador devuelva lo mismo en ambos casos
+_network_errors = threading.local()
+
+def _record_network_error() -> None:
+    _network_errors.count = getattr(_network_errors, "count", 0) + 1
+
+def reset_network_errors() -> None:
+    _network_errors.count = 0
+
+def pop_network_errors() -> int:
+    count = getattr(_network_errors, "count", 0)
+    _network_errors.count = 0
+    return count
+
+# Envios hechos por el hilo actual (solo crece), asi cpe_manager.scheduling sabe si una operacion llego a mandarle algo
+# al CPE: un cambio de configuracion que fallo antes de enviarse se puede repetir, uno que se envio no
+_requests_sent = threading.local()
+
+def _record_request_sent() -> None:
+    _requests_sent.count = getattr(_requests_sent, "count", 0) + 1
+
+def requests_sent() -> int:
+    return getattr(_requests_sent, "count", 0)
+
+def _timed_adapter_class() -> type:
+    """ HTTPAdapter normal, pero las conexiones anotan cuanto tardan en conectar y si fallaron """
+    global _Timed_Adapter
+    if _Timed_Adapter is not None:
+        return _Timed_Adapter
+
+    from requests.adapters import HTTPAdapter
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+    class _Timed_Connection:
+        def connect(self) -> None:
+            start = time.perf_counter()
+            try:
+                super().connect() # type: ignore
+            except Exception:
+                _record_network_error()
+                raise
+            finally:
+                _connect_time.seconds = getattr(_connect_time, "seconds", 0.0) + time.perf_counter() - start
+
+        def send(self, data) -> None:
+            try:
+                super().send(data) # type: ignore
+            finally:
+                # Con el socket abierto parte de la peticion pudo llegar aunque el envio falle
+                if getattr(self, "sock", None) is not None:
+                    _record_request_sent()
+
+        def getresponse(self, *args, **kwargs):
+            try:
+                return super().getresponse(*args, **kwargs) # type: ignore
+            except Exception:
+                _record_network_error()
+                raise
+
+    class _Timed_HTTPConnection(_Timed_Connection, HTTPConnection):
+        pass
+
+    class _Timed_HTTPSConnection(_Timed_Connection, HTTPSConnection):
+        pass
+
+    class _Timed_HTTPConnectionPool(HTTPConnectionPool):
+        ConnectionCls = _Timed_HTTPConnection
+
+    class _Timed_HTTPSConnectionPool(HTTPSConnectionPool):
+        ConnectionCls = _Timed_HTTPSConnection
+
+    class Timed_Adapter(HTTPAdapter):
+        def init_poolmanager(self, *args, **kwargs) -> None:
+            super().init_poolmanager(*args, **kwargs)
+            self.poolmanager.pool_classes_by_scheme = {"http": _Timed_HTTPConnectionPool, "https": _Timed_HTTPSConnectionPool}
+
+    _Timed_Adapter = Timed_Adapter
+    return _Timed_Adapter
+
+def configure_transport(**kwargs) -> Transport_Config:
+    """ Cambia la configuracion del transporte compartido, las sesiones nuevas usan el pool nuevo """
+    global _adapter
+    unknown = set(kwargs) - set(DEFAULT_CONFIG)
+    if unknown:
+        raise ValueError(f"Parametros de transporte desconocidos: {', '.join(sorted(unknown))}")
+    with _lock:
+        _config.update(kwargs) # type: ignore
+        old_adapter, _adapter = _adapter, None
+    if old_adapter is not None:
+        old_adapter.close()
+    return get_config()
+
+def get_config() -> Transport_Config:
+    return dict(_config) # type: ignore
+
+def get_timeout() -> Tuple[float, float]:
+    return (_config["connect_timeout"], _config["read_timeout"])
+
+def get_adapter() -> "HTTPAdapter":
+    """ Adaptador (y pool de conexiones) compartido por todos los controladores """
+    global _adapter
+    with _lock:
+        if _adapter is None:
+            _adapter = _timed_adapter_class()(pool_connections=_config["pool_connections"],
+                                              pool_maxsize=_config["pool_maxsize"],
+                                              pool_block=_config["pool_block"])
+        return _adapter
+
+def new_session() -> "requests.Session":
+    """ Sesion propia (cookies) por controlador, pero las conexiones salen del pool compartido """
+    import requests
+    session = requests.Session()
+    adapter = get_adapter()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
@@ -6,7 +6,8 @@ setup(name='cpe_manager',
       author='Rafael Carvallo',
       author_email='rafael.carvalloh@gmail.com',
       url='',
-      packages=['cpe_manager', 'cpe_manager.models', 'cpe_manager.models.vsol'],
+      packages=['cpe_manager', 'cpe_manager.models', 'cpe_manager.models.vsol', 'cpe_manager.corpus'],
+      package_data={'cpe_manager.corpus': ['vsol_v2802dac/*', 'vsol_acz/*']},
       install_requires=[
        'requests',
        'beautifulsoup4',
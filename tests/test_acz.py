@@ -0,0 +1,40 @@
+import unittest
+from cpe_manager.models.base import Return_Codes
+from cpe_manager.models.vsol._acz import VSOL_ACZ
+from cpe_manager.simulator import ONU_Simulator
+
+class ACZ_Config_Test(unittest.TestCase):
+    """ Cambios de configuracion de la ACZ contra el simulador """
+
+    def setUp(self):
+        self.simulator = ONU_Simulator(1, model="vsol_acz").start()
+        self.onu = self.simulator.onus[0]
+        self.controller = VSOL_ACZ(self.simulator.addresses[0], "admin", "admin")
+        self.assertEqual(self.controller.login(), (Return_Codes.SUCCESS,))
+
+    def tearDown(self):
+        self.controller.logout()
+        self.simulator.stop()
+
+    def test_change_admin_password_returns_success(self):
+        self.assertEqual(self.controller.change_admin_password("nueva"), (Return_Codes.SUCCESS,))
+        self.assertEqual(self.onu.password, "nueva")
+
+    def test_apply_changes_admin_password(self):
+        self.assertEqual(self.controller.apply_changes({"admin_password": "nueva"}), (Return_Codes.SUCCESS,))
+        self.assertEqual(self.onu.password, "nueva")
+
+    def test_apply_changes_unsupported_step_is_reported_per_key(self):
+        result = self.controller.apply_changes({"ssid": "casa", "admin_password": "nueva"})
+        self.assertEqual(result[0], Return_Codes.ERROR)
+        self.assertIn("ssid", result[1])
+        self.assertNotIn("admin_password", result[1])
+        self.assertEqual(self.onu.password, "nueva")
+
+    def test_wrong_old_password_is_an_error(self):
+        self.controller.PASSWORD = "otra"
+        self.assertEqual(self.controller.change_admin_password("nueva")[0], Return_Codes.ERROR)
+        self.assertEqual(self.onu.password, "admin")
+
+if __name__ == "__main__":
+    unittest.main()
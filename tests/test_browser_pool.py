@@ -0,0 +1,49 @@
+import itertools
+from types import SimpleNamespace
+from cpe_manager import browser_pool
+from cpe_manager.browser_pool import Browser_Pool
+
+MB = 1024 * 1024
+
+class Fake_Driver:
+    pids = itertools.count(1000)
+
+    def __init__(self):
+        self.service = SimpleNamespace(process=SimpleNamespace(pid=next(self.pids)))
+        self.closed = False
+
+    def execute_script(self, script):
+        return 1
+
+    def delete_all_cookies(self):
+        pass
+
+    def get(self, url):
+        pass
+
+    def quit(self):
+        self.closed = True
+
+def test_browser_over_memory_is_replaced_on_borrow(monkeypatch):
+    rss = {}
+    monkeypatch.setattr(browser_pool, "_process_tree_rss", lambda pid: rss.get(pid, 100 * MB))
+    pool = Browser_Pool(size=2, max_memory_mb=1024, driver_factory=Fake_Driver)
+    with pool.borrow() as first:
+        pass
+    # Crecio mientras estaba libre, por encima de su parte del techo (512 MB)
+    rss[first.service.process.pid] = 600 * MB
+    with pool.borrow() as second:
+        assert second is not first
+    assert first.closed
+    with pool.borrow() as third:
+        assert third is second
+    pool.close()
+    assert second.closed
+
+def test_browser_over_memory_is_not_returned_to_pool(monkeypatch):
+    monkeypatch.setattr(browser_pool, "_process_tree_rss", lambda pid: 600 * MB)
+    pool = Browser_Pool(size=2, max_memory_mb=1024, driver_factory=Fake_Driver)
+    with pool.borrow() as first:
+        pass
+    assert first.closed
+    assert pool.memory_usage() == 0
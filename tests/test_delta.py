@@ -0,0 +1,86 @@
+from cpe_manager.delta import Delta_Engine
+
+CPE = "10.0.0.1"
+
+def wifi(mac, rssi="-61", sent="1200"):
+    return {"device_mac": mac, "packets_sent": sent, "packets_received": "3400",
+            "send_rate_mbps": "72.2", "rssi_dbm": rssi, "power_saving": "no"}
+
+def dhcp(name, ip, lease_time=3600):
+    # Sin MAC: algunos firmware la dejan vacia
+    return {"device_name": name, "device_ip": ip, "device_mac": "", "lease_time": lease_time}
+
+def kinds(events):
+    return sorted((event["event"], event["mac"]) for event in events)
+
+def test_first_poll_is_a_checkpoint():
+    engine = Delta_Engine(checkpoint_every=3)
+    clients = [wifi("aa:00:00:00:00:01")]
+    events = engine.update(CPE, clients, now=0)
+    assert kinds(events) == [("checkpoint", None)]
+    assert events[0]["client"] == clients
+
+def test_join_leave_change():
+    engine = Delta_Engine()
+    engine.update(CPE, [wifi("aa:00:00:00:00:01"), wifi("aa:00:00:00:00:02")], now=0)
+    events = engine.update(CPE, [wifi("aa:00:00:00:00:01", rssi="-75"), wifi("aa:00:00:00:00:03")], now=1)
+    assert kinds(events) == [("change", "aa:00:00:00:00:01"), ("join", "aa:00:00:00:00:03"), ("leave", "aa:00:00:00:00:02")]
+    change = [event for event in events if event["event"] == "change"][0]
+    assert change["changes"] == {"rssi_dbm": ["-61", "-75"]}
+
+def test_rssi_threshold_and_volatile_fields():
+    engine = Delta_Engine()
+    engine.update(CPE, [wifi("aa:00:00:00:00:01")], now=0)
+    # Bajo el umbral y contadores distintos: nada
+    assert engine.update(CPE, [wifi("aa:00:00:00:00:01", rssi="-64", sent="999999")], now=1) == []
+    # La deriva se compara contra el ultimo valor que genero evento, no contra la consulta anterior
+    assert engine.update(CPE, [wifi("aa:00:00:00:00:01", rssi="-66")], now=2) == []
+    events = engine.update(CPE, [wifi("aa:00:00:00:00:01", rssi="-67")], now=3)
+    assert kinds(events) == [("change", "aa:00:00:00:00:01")]
+
+def test_reordered_clients_without_mac_are_not_join_leave():
+    engine = Delta_Engine()
+    clients = [dhcp("android", "192.168.1.43"), dhcp("laptop", "192.168.1.27"), dhcp("", "192.168.1.50"), dhcp("", "192.168.1.50")]
+    engine.update(CPE, clients, now=0)
+    assert engine.update(CPE, list(reversed(clients)), now=1) == []
+    # Cambia el nombre de uno: es otro cliente
+    renamed = [dhcp("android-2", "192.168.1.43")] + clients[1:]
+    events = engine.update(CPE, renamed, now=2)
+    assert kinds(events) == [("join", None), ("leave", None)]
+    assert [event["client"]["device_name"] for event in sorted(events, key=lambda event: event["event"])] == ["android-2", "android"]
+    # Se va uno de los dos repetidos
+    events = engine.update(CPE, renamed[:-1], now=3)
+    assert kinds(events) == [("leave", None)]
+
+def test_checkpoint_every():
+    engine = Delta_Engine(checkpoint_every=3)
+    clients = [wifi("aa:00:00:00:00:01")]
+    checkpoints = [now for now in range(10) if any(event["event"] == "checkpoint" for event in engine.update(CPE, clients, now=now))]
+    assert checkpoints == [0, 3, 6, 9]
+
+def test_adaptive_interval():
+    engine = Delta_Engine(min_interval=10, max_interval=50)
+    assert engine.interval(CPE) == 10
+    clients = [wifi("aa:00:00:00:00:01")]
+    intervals = []
+    for now in range(5):
+        engine.update(CPE, clients, now=now)
+        intervals.append(engine.interval(CPE))
+    assert intervals == [20, 40, 50, 50, 50]
+    assert not engine.is_due(CPE, now=4 + 49)
+    assert engine.is_due(CPE, now=4 + 50)
+    engine.update(CPE, clients + [wifi("aa:00:00:00:00:02")], now=60)
+    assert engine.interval(CPE) == 10
+    devices = [{"cpe_address": CPE}, {"cpe_address": "10.0.0.2"}]
+    assert [device["cpe_address"] for device in engine.due_devices(devices, now=65)] == ["10.0.0.2"]
+
+def test_feed_ignores_errors_and_state_survives_save(tmp_path):
+    path = str(tmp_path / "delta.json")
+    with Delta_Engine(path) as engine:
+        list(engine.feed([{"cpe_address": CPE, "result": [dhcp("android", "192.168.1.43")]}]))
+        assert list(engine.feed([{"cpe_address": CPE, "result": "TIMEOUT"}])) == []
+    engine = Delta_Engine(path)
+    assert len(engine) == 1
+    assert engine.update(CPE, [dhcp("android", "192.168.1.43", lease_time=10)], now=1) == []
+    engine.forget(CPE)
+    assert kinds(engine.update(CPE, [], now=2)) == [("checkpoint", None)]
@@ -0,0 +1,34 @@
+import re
+import pytest
+from cpe_manager.corpus import available_parsers, load_page
+from cpe_manager.models.vsol._2802dac import Controller
+
+PAGE = load_page("vsol_v2802dac", "status_ethernet_info.asp")
+ROW = re.compile(r"clts\.push\(new it_nr\(.*\)\);\n")
+
+def controller_with_page(page, parser_name):
+    controller = Controller("127.0.0.1:1", "admin", "admin")
+    controller.Loged_In = True
+    controller.PARSER = parser_name
+    controller.fetch_dhcp_clients = lambda: page
+    return controller
+
+@pytest.mark.parametrize("parser_name", available_parsers())
+def test_dhcp_clients_from_recorded_page(parser_name):
+    clients = controller_with_page(PAGE, parser_name).get_dhcp_clients(render_with_browser=False)
+    assert len(clients) == len(ROW.findall(PAGE))
+    assert clients[0] == {"device_name": "android-3f9a1c2b", "device_ip": "192.168.1.43", "device_mac": "a5:4d:ca:18:25:30", "lease_time": 14468}
+    assert clients[5]["device_name"] == ""
+
+@pytest.mark.parametrize("parser_name", available_parsers())
+def test_dhcp_clients_without_rows(parser_name):
+    page = ROW.sub("", PAGE)
+    assert "function it_nr" in page
+    assert controller_with_page(page, parser_name).get_dhcp_clients(render_with_browser=False) == []
+
+@pytest.mark.parametrize("parser_name", available_parsers())
+def test_dhcp_clients_malformed_script_raises(parser_name):
+    # Una fila sin el parentesis que cierra el it(...) del nombre
+    page = PAGE.replace('new it("devname", "android-3f9a1c2b")', 'new it("devname", "android-3f9a1c2b"', 1)
+    with pytest.raises(ValueError):
+        controller_with_page(page, parser_name).get_dhcp_clients(render_with_browser=False)
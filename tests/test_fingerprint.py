@@ -0,0 +1,66 @@
+import pytest
+from cpe_manager import fingerprint
+from cpe_manager.fingerprint import Fingerprint_Cache, detect
+from cpe_manager.simulator import ONU_Simulator
+
+ARP_HEADER = "IP address       HW type     Flags       HW address            Mask     Device\n"
+
+@pytest.fixture
+def arp_file(tmp_path, monkeypatch):
+    """ Tabla ARP falsa, y se cuentan las veces que se lee """
+    path = tmp_path / "arp"
+    path.write_text(ARP_HEADER)
+    reads = []
+    arp_table = fingerprint.arp_table
+    monkeypatch.setattr(fingerprint, "ARP_TABLE_PATH", str(path))
+    monkeypatch.setattr(fingerprint, "_arp_read_at", float("-inf"))
+    monkeypatch.setattr(fingerprint, "arp_table", lambda max_age=fingerprint.ARP_TABLE_TTL: reads.append(max_age) or arp_table(max_age))
+    return path, reads
+
+def counting_probe(monkeypatch):
+    probes = []
+    probe_model = fingerprint.probe_model
+    monkeypatch.setattr(fingerprint, "probe_model", lambda cpe_address: probes.append(cpe_address) or probe_model(cpe_address))
+    return probes
+
+@pytest.mark.parametrize("model", ["vsol_v2802dac", "vsol_acz"])
+def test_detects_model_and_uses_cache(model, arp_file, monkeypatch):
+    probes = counting_probe(monkeypatch)
+    _, reads = arp_file
+    cache = Fingerprint_Cache()
+    with ONU_Simulator(1, model=model) as simulator:
+        [address] = simulator.addresses
+        detected = detect(address, cache)
+        assert detected is not None and detected["model"] == model and detected["mac"] is None
+        assert probes == [address]
+        reads.clear()
+        assert detect(address, cache) == detected
+    # Sin MAC en la huella el acierto de cache no pregunta al equipo ni lee la tabla ARP
+    assert probes == [address]
+    assert reads == []
+
+def test_cached_mac_is_checked_against_one_arp_read(arp_file, monkeypatch):
+    path, reads = arp_file
+    probes = counting_probe(monkeypatch)
+    cache = Fingerprint_Cache()
+    with ONU_Simulator(3) as simulator:
+        # Los equipos del simulador comparten la IP, tienen la misma MAC
+        path.write_text(ARP_HEADER + "127.0.0.1        0x1         0x2         aa:bb:cc:00:00:00     *        eth0\n")
+        for address in simulator.addresses:
+            assert detect(address, cache)["mac"] == "aa:bb:cc:00:00:00"
+        reads.clear()
+        # Pasada con todo en cache: una sola lectura real de la tabla
+        monkeypatch.setattr(fingerprint, "_arp_read_at", float("-inf"))
+        opens = []
+        real_open = open
+        monkeypatch.setattr("builtins.open", lambda file, *args, **kwargs: opens.append(file) or real_open(file, *args, **kwargs))
+        for address in simulator.addresses:
+            assert detect(address, cache)["model"] == "vsol_v2802dac"
+        monkeypatch.setattr("builtins.open", real_open)
+        assert opens == [str(path)]
+        assert len(probes) == 3
+        # Se reemplazo la ONU: la huella no vale y se vuelve a detectar
+        path.write_text(ARP_HEADER + "127.0.0.1        0x1         0x2         aa:bb:cc:00:00:99     *        eth0\n")
+        monkeypatch.setattr(fingerprint, "_arp_read_at", float("-inf"))
+        assert detect(simulator.addresses[0], cache)["mac"] == "aa:bb:cc:00:00:99"
+        assert len(probes) == 4
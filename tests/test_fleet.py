@@ -0,0 +1,65 @@
+import asyncio
+import threading
+import time
+import pytest
+from cpe_manager.fleet import Fleet_Executor
+from cpe_manager.models.base import Return_Codes
+from cpe_manager.simulator import ONU_Simulator
+
+@pytest.fixture(scope="module")
+def simulator():
+    with ONU_Simulator(6) as simulator:
+        yield simulator
+
+def test_run_returns_every_device_in_inventory_order(simulator):
+    devices = simulator.inventory()
+    results = Fleet_Executor(max_workers=4).run(devices, "get_wifi_clients")
+    assert [result["cpe_address"] for result in results] == simulator.addresses
+    assert all(isinstance(result["result"], list) and len(result["result"]) == 8 for result in results)
+
+def test_stream_returns_every_device(simulator):
+    results = list(Fleet_Executor(max_workers=4).stream(simulator.inventory(), "get_wifi_clients"))
+    assert sorted(result["cpe_address"] for result in results) == sorted(simulator.addresses)
+
+def test_run_async_returns_every_device(simulator):
+    results = asyncio.run(Fleet_Executor(max_workers=4).run_async(simulator.inventory(), "get_wifi_clients"))
+    assert [result["cpe_address"] for result in results] == simulator.addresses
+    assert all(isinstance(result["result"], list) for result in results)
+
+def test_group_never_exceeds_per_group_limit(simulator):
+    devices = [dict(device, group=f"olt{index % 2}") for index, device in enumerate(simulator.inventory())]
+    group_of = { device["cpe_address"]: device["group"] for device in devices }
+    lock = threading.Lock()
+    running = {"olt0": 0, "olt1": 0}
+    peak = {"olt0": 0, "olt1": 0}
+
+    def operation(controller):
+        group = group_of[controller.CPE_ADDRESS]
+        with lock:
+            running[group] += 1
+            peak[group] = max(peak[group], running[group])
+        time.sleep(0.05)
+        with lock:
+            running[group] -= 1
+        return (Return_Codes.SUCCESS,)
+
+    results = Fleet_Executor(max_workers=6, per_group_limit=2).run(devices, operation)
+    assert all(result["result"] == (Return_Codes.SUCCESS,) for result in results)
+    assert peak == {"olt0": 2, "olt1": 2}
+
+def test_controller_exception_becomes_exception_result(simulator):
+    def operation(controller):
+        raise RuntimeError("se rompio")
+
+    [result] = Fleet_Executor().run(simulator.inventory()[:1], operation)
+    assert result["result"][0] == Return_Codes.EXCEPTION
+    assert "se rompio" in result["result"][1]
+
+def test_bad_inventory_entries_do_not_stop_the_sweep(simulator):
+    devices = [{"cpe_address": "127.0.0.1:1", "model": "no_existe", "username": "a", "password": "b"},
+               {"cpe_address": simulator.addresses[0], "model": "vsol_v2802dac"},
+               simulator.inventory()[1]]
+    unknown, missing_credentials, good = Fleet_Executor().run(devices, "get_wifi_clients")
+    assert unknown["result"][0] == Return_Codes.ERROR
+    assert missing_credentials["result"][0] == Return_Codes.EXCEPTION
+    assert isinstance(good["result"], list)
@@ -0,0 +1,101 @@
+import json
+import sys
+import time
+import pytest
+from cpe_manager import jobs
+from cpe_manager.jobs import Job_Queue, Job_Worker, inventory_credentials
+from cpe_manager.simulator import ONU_Simulator
+
+def device(cpe_address):
+    return {"cpe_address": cpe_address, "model": "vsol_v2802dac", "username": "admin", "password": "secreto"}
+
+@pytest.fixture
+def queue(tmp_path):
+    return Job_Queue(str(tmp_path / "jobs.db"))
+
+def test_lease_takes_oldest_job_per_cpe_in_order(queue):
+    first, second = queue.enqueue_many([device("10.0.0.1")] * 2, "get_wifi_clients")
+    other = queue.enqueue(device("10.0.0.2"), "get_dhcp_clients")
+    leased = queue.lease("worker-1", limit=10)
+    assert [job["id"] for job in leased] == [first, other]
+    # La contraseña no se guarda en la cola
+    assert "password" not in leased[0]["device"]
+    # El CPE ya tiene un lease vigente, el segundo trabajo espera
+    assert queue.lease("worker-2", limit=10) == []
+    assert queue.ack(first, "worker-1", [])
+    assert [job["id"] for job in queue.lease("worker-2", limit=10)] == [second]
+    # Solo el dueño del lease puede cerrarlo
+    assert not queue.ack(other, "worker-2", [])
+
+def test_lease_uses_cpe_order_index(queue):
+    plan = queue._connection().execute("EXPLAIN QUERY PLAN SELECT 1 FROM jobs o WHERE o.cpe_address = ? AND o.status IN ('queued', 'leased') "
+                                       "AND o.id < ?", ("10.0.0.1", 1)).fetchall()
+    assert any("jobs_cpe_order" in row[-1] for row in plan)
+
+def test_expired_lease_returns_and_last_attempt_fails(tmp_path):
+    queue = Job_Queue(str(tmp_path / "jobs.db"), lease_seconds=0.05)
+    job_id = queue.enqueue(device("10.0.0.1"), "get_wifi_clients", max_attempts=2)
+    assert [job["attempts"] for job in queue.lease("worker-1")] == [1]
+    time.sleep(0.06)
+    # El worker 1 murio, el lease vencio y lo toma otro
+    assert [(job["id"], job["attempts"]) for job in queue.lease("worker-2")] == [(job_id, 2)]
+    assert not queue.heartbeat(job_id, "worker-1")
+    time.sleep(0.06)
+    assert queue.lease("worker-3") == []
+    assert queue.stats() == {"failed": 1}
+
+def test_heartbeat_extends_lease(tmp_path):
+    queue = Job_Queue(str(tmp_path / "jobs.db"), lease_seconds=0.2)
+    job_id = queue.enqueue(device("10.0.0.1"), "get_wifi_clients")
+    queue.lease("worker-1")
+    time.sleep(0.12)
+    assert queue.heartbeat(job_id, "worker-1")
+    time.sleep(0.12)
+    assert queue.lease("worker-2") == []
+    assert queue.ack(job_id, "worker-1", [])
+
+def test_nack_retries_with_backoff_until_attempts_run_out(queue):
+    queue.RETRY_DELAY = 0.0
+    job_id = queue.enqueue(device("10.0.0.1"), "get_wifi_clients", max_attempts=2)
+    queue.lease("worker-1")
+    assert queue.nack(job_id, "worker-1", "timeout")
+    assert queue.stats() == {"queued": 1}
+    queue.lease("worker-1")
+    assert queue.nack(job_id, "worker-1", "timeout")
+    assert queue.stats() == {"failed": 1}
+
+def test_worker_requires_credentials(queue):
+    with pytest.raises(ValueError):
+        Job_Worker(queue, None)
+
+def test_worker_runs_jobs_and_leaves_sent_changes_in_check(queue):
+    with ONU_Simulator(3) as simulator:
+        inventory = simulator.inventory()
+        # La ONU corta la conexion al recibir el cambio: llego al CPE, no se sabe si se aplico
+        onu = simulator.onus[0]
+        handle = onu.handle
+        def dropping_handle(method, path, form, client_ip):
+            if (method, path) == ("POST", "/boaform/admin/formPasswordSetup"):
+                raise ValueError("conexion cortada")
+            return handle(method, path, form, client_ip)
+        onu.handle = dropping_handle
+        queue.enqueue_many(inventory, "get_wifi_clients")
+        change = queue.enqueue(inventory[0], "change_admin_password", "nueva")
+        Job_Worker(queue, inventory_credentials(inventory), concurrency=4).run(stop_when_empty=True)
+    assert queue.stats() == {"done": 3, "check": 1}
+    assert sorted(result["cpe_address"] for result in queue.results()) == sorted(simulator.addresses)
+    assert all(len(result["result"]) == 8 for result in queue.results())
+    [checked] = queue.results("check")
+    assert checked["cpe_address"] == inventory[0]["cpe_address"]
+    row = queue._connection().execute("SELECT attempts FROM jobs WHERE id = ?", (change,)).fetchone()
+    assert row == (1,)
+
+def test_cli_enqueue_passes_operation_arguments(tmp_path, monkeypatch, capsys):
+    inventory = tmp_path / "inventory.json"
+    inventory.write_text(json.dumps([device("10.0.0.1"), device("10.0.0.2")]))
+    db = str(tmp_path / "jobs.db")
+    monkeypatch.setattr(sys, "argv", ["jobs", "--db", db, "enqueue", str(inventory), "change_wifi_ssid", "\"1234\"", "--max-attempts", "1"])
+    jobs.main()
+    assert capsys.readouterr().out.strip() == "2"
+    leased = Job_Queue(db).lease("worker-1", limit=10)
+    assert [(job["operation"], job["args"], job["max_attempts"]) for job in leased] == [("change_wifi_ssid", ["1234"], 1)] * 2
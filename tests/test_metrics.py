@@ -0,0 +1,75 @@
+import re
+import pytest
+from cpe_manager import metrics
+from cpe_manager.cpe_manager import get_controller
+from cpe_manager.fleet import Fleet_Executor
+from cpe_manager.metrics import Event_Log, Multi_Hook, Prometheus_Metrics
+from cpe_manager.simulator import ONU_Simulator
+
+MODEL = "vsol_v2802dac"
+SAMPLE = re.compile(r'^(\w+)\{(.*)\} (\S+)$')
+
+def samples(exported, name):
+    """ {labels: valor} de la metrica name en el texto exportado """
+    result = {}
+    for line in exported.splitlines():
+        match = SAMPLE.match(line)
+        if match and match.group(1) == name:
+            result[match.group(2)] = float(match.group(3))
+    return result
+
+@pytest.fixture(scope="module")
+def simulator():
+    with ONU_Simulator(1) as simulator:
+        yield simulator
+
+def test_enabled_metrics_export_counters(simulator, monkeypatch):
+    prometheus = Prometheus_Metrics()
+    events = []
+    monkeypatch.setattr(get_controller(MODEL), "METRICS", Multi_Hook(prometheus, Event_Log(events.append)))
+    [result] = Fleet_Executor().run(simulator.inventory(), "get_wifi_clients")
+    assert len(result["result"]) == 8
+
+    exported = prometheus.export()
+    requests = samples(exported, "cpe_manager_requests_total")
+    assert requests == {
+        f'model="{MODEL}",endpoint="/admin/login.asp",status="200"': 1,
+        f'model="{MODEL}",endpoint="/boaform/admin/formLogin",status="302"': 1,
+        f'model="{MODEL}",endpoint="/status_wlan_info_11n.asp",status="200"': 1,
+        f'model="{MODEL}",endpoint="/boaform/admin/formLogout",status="301"': 1,
+    }
+    assert samples(exported, "cpe_manager_errors_total") == {}
+    counts = samples(exported, "cpe_manager_phase_seconds_count")
+    assert counts[f'model="{MODEL}",endpoint="/status_wlan_info_11n.asp",phase="wait"'] == 1
+    assert counts[f'model="{MODEL}",endpoint="vsol_2802dac_wifi_clients",phase="parse"'] == 1
+    # Cada histograma termina en +Inf con el total de observaciones
+    buckets = samples(exported, "cpe_manager_phase_seconds_bucket")
+    assert buckets[f'model="{MODEL}",endpoint="/status_wlan_info_11n.asp",phase="wait",le="+Inf"'] == 1
+    assert {event["cpe_address"] for event in events} == set(simulator.addresses)
+    assert len([event for event in events if event["phase"] == "wait"]) == 4
+
+def test_failed_request_is_counted_as_error(simulator, monkeypatch):
+    prometheus = Prometheus_Metrics()
+    monkeypatch.setattr(get_controller(MODEL), "METRICS", prometheus)
+    onu = simulator.onus[0]
+    handle = onu.handle
+    def dropping_handle(method, path, form, client_ip):
+        if path == "/status_wlan_info_11n.asp":
+            raise ValueError("conexion cortada")
+        return handle(method, path, form, client_ip)
+    monkeypatch.setattr(onu, "handle", dropping_handle)
+    Fleet_Executor().run(simulator.inventory(), "get_wifi_clients")
+    errors = samples(prometheus.export(), "cpe_manager_errors_total")
+    assert [labels for labels in errors if 'endpoint="/status_wlan_info_11n.asp"' in labels]
+    requests = samples(prometheus.export(), "cpe_manager_requests_total")
+    assert requests[f'model="{MODEL}",endpoint="/status_wlan_info_11n.asp",status=""'] == 1
+
+def test_disabled_metrics_record_nothing(simulator, monkeypatch):
+    controller_class = get_controller(MODEL)
+    assert controller_class.METRICS is None
+    def fail(*args, **kwargs):
+        raise AssertionError("se midio con METRICS = None")
+    monkeypatch.setattr(metrics, "event", fail)
+    monkeypatch.setattr(metrics.Timed_Parser, "__init__", fail)
+    [result] = Fleet_Executor().run(simulator.inventory(), "get_wifi_clients")
+    assert len(result["result"]) == 8
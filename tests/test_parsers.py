@@ -0,0 +1,17 @@
+import json
+import pytest
+from cpe_manager.corpus import CASES, available_parsers, load_page, page_path
+from cpe_manager.parsers import BS4_Parser, get_parser
+
+def expected_output(case):
+    page = load_page(case["model"], case["page"])
+    if case.get("expected"):
+        with open(page_path(case["model"], case["expected"]), encoding="utf-8") as expected_file:
+            return json.load(expected_file)
+    return getattr(get_parser(BS4_Parser.NAME), case["method"])(page)
+
+@pytest.mark.parametrize("parser_name", available_parsers())
+@pytest.mark.parametrize("case", CASES, ids=lambda case: f"{case['model']}/{case['page']}:{case['method']}")
+def test_parser_matches_reference(case, parser_name):
+    page = load_page(case["model"], case["page"])
+    assert getattr(get_parser(parser_name), case["method"])(page) == expected_output(case)
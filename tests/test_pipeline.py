@@ -0,0 +1,41 @@
+import pytest
+from cpe_manager.fleet import Fleet_Executor
+from cpe_manager.pipeline import Fetch_Parse_Pipeline, Parse_Pool
+from cpe_manager.simulator import ONU_Simulator
+
+@pytest.fixture(scope="module")
+def simulator():
+    with ONU_Simulator(6) as simulator:
+        yield simulator
+
+@pytest.fixture(scope="module")
+def parse_pool():
+    with Parse_Pool(workers=2) as parse_pool:
+        yield parse_pool
+
+@pytest.mark.parametrize("operation", ["get_wifi_clients", "get_dhcp_clients"])
+def test_pipeline_matches_in_process_parse(simulator, parse_pool, operation):
+    devices = simulator.inventory()
+    expected = Fleet_Executor(max_workers=4).run(devices, operation)
+    # Lotes chicos para que el parseo quede repartido en varios envios al pool
+    with Fetch_Parse_Pipeline(Fleet_Executor(max_workers=4), parse_pool, batch_size=2) as pipeline:
+        results = pipeline.run(devices, operation)
+    assert [result["cpe_address"] for result in results] == simulator.addresses
+    assert [result["result"] for result in results] == [result["result"] for result in expected]
+    assert all(isinstance(result["result"], list) and result["result"] for result in results)
+
+def test_pipeline_stream_and_operations_without_stages(simulator, parse_pool):
+    devices = simulator.inventory()
+    with Fetch_Parse_Pipeline(Fleet_Executor(max_workers=4), parse_pool) as pipeline:
+        streamed = list(pipeline.stream(devices, "get_wifi_clients"))
+        # Una funcion no tiene PARSE_STAGES, corre entera en la etapa de descarga
+        addresses = pipeline.run(devices, lambda controller: controller.CPE_ADDRESS)
+    assert sorted(result["cpe_address"] for result in streamed) == sorted(simulator.addresses)
+    assert [result["result"] for result in addresses] == simulator.addresses
+
+def test_parse_errors_are_reported_per_device():
+    with Parse_Pool(workers=0) as parse_pool:
+        future = parse_pool.submit([("no_existe", "vsol_2802dac_dhcp_clients", ""), ("regex", "vsol_2802dac_dhcp_clients", "<table></table>")])
+    error, parsed = future.result()
+    assert isinstance(error, tuple) and "no_existe" in error[1]
+    assert parsed == []
@@ -0,0 +1,82 @@
+import time
+import pytest
+from cpe_manager import scheduling
+from cpe_manager.scheduling import Adaptive_Concurrency, Circuit_Breaker, Retry_Policy, Scheduler, is_success, tcp_probe
+from cpe_manager.simulator import ONU_Simulator
+
+@pytest.fixture
+def simulator():
+    with ONU_Simulator(1) as simulator:
+        yield simulator
+
+def drop_first(onu, method, path):
+    """ La ONU corta la conexion sin responder la primera vez que recibe method path, devuelve la lista de llamadas """
+    calls = []
+    handle = onu.handle
+    def dropping_handle(request_method, request_path, form, client_ip):
+        if (request_method, request_path) == (method, path):
+            calls.append(request_path)
+            if len(calls) == 1:
+                raise ValueError("conexion cortada")
+        return handle(request_method, request_path, form, client_ip)
+    onu.handle = dropping_handle
+    return calls
+
+def scheduler():
+    return Scheduler(timeouts={"read": 2.0}, retry=Retry_Policy(attempts=3, base_delay=0))
+
+def test_read_is_retried_after_network_error(simulator):
+    calls = drop_first(simulator.onus[0], "GET", "/status_wlan_info_11n.asp")
+    result = scheduler().run_device(simulator.inventory()[0], "get_wifi_clients")
+    assert isinstance(result["result"], list)
+    assert len(calls) == 2
+
+def test_sent_write_is_not_retried(simulator):
+    calls = drop_first(simulator.onus[0], "POST", "/boaform/admin/formPasswordSetup")
+    result = scheduler().run_device(simulator.inventory()[0], "change_admin_password", "nueva")
+    assert not is_success(result["result"])
+    assert len(calls) == 1
+
+def test_breaker_opens_after_threshold_and_waits_for_probe(monkeypatch):
+    answers = []
+    monkeypatch.setattr(scheduling, "tcp_probe", lambda cpe_address, timeout: answers.pop(0))
+    breaker = Circuit_Breaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure("10.0.0.1")
+    assert breaker.allow("10.0.0.1")
+    breaker.record_failure("10.0.0.1")
+    assert breaker.is_open("10.0.0.1")
+    # Antes del reset_timeout ni siquiera se hace la sonda
+    assert not breaker.allow("10.0.0.1")
+    time.sleep(0.06)
+    answers.append(False)
+    assert not breaker.allow("10.0.0.1")
+    # La sonda fallida duplica la espera
+    time.sleep(0.06)
+    assert not breaker.allow("10.0.0.1")
+    time.sleep(0.05)
+    answers.append(True)
+    assert breaker.allow("10.0.0.1")
+    assert not breaker.is_open("10.0.0.1")
+    assert answers == []
+
+def test_tcp_probe(simulator):
+    assert tcp_probe(simulator.addresses[0])
+    assert not tcp_probe("127.0.0.1:1", timeout=0.2)
+
+def test_adaptive_concurrency_lowers_at_most_once_per_window():
+    concurrency = Adaptive_Concurrency(initial=20, minimum=4)
+    concurrency.observe(0.1, False)
+    assert concurrency.limit == 14
+    for _ in range(13):
+        concurrency.observe(0.1, False)
+    assert concurrency.limit == 14
+    # Una respuesta lenta cuenta como falla
+    concurrency.observe(concurrency.LATENCY_TARGET + 1, True)
+    assert concurrency.limit == 9
+
+def test_adaptive_concurrency_grows_on_good_responses():
+    concurrency = Adaptive_Concurrency(initial=8)
+    # +1/limite por respuesta, algo mas de una ventana para pasar de 8 a 9
+    for _ in range(9):
+        concurrency.observe(0.1, True)
+    assert concurrency.limit == 9
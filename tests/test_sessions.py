@@ -0,0 +1,54 @@
+import pytest
+from cpe_manager.models.base import Return_Codes
+from cpe_manager.models.vsol._2802dac import Controller
+from cpe_manager.sessions import SQLite_Session_Registry
+from cpe_manager.simulator import ONU_Simulator
+
+@pytest.fixture
+def simulator():
+    with ONU_Simulator(1) as simulator:
+        yield simulator
+
+def controller_for(simulator, registry):
+    controller = Controller(simulator.addresses[0], "admin", "admin")
+    controller.SESSION_REGISTRY = registry
+    return controller
+
+def test_expired_session_is_renewed_once_and_post_replayed_with_fresh_token(simulator, tmp_path):
+    onu = simulator.onus[0]
+    controller = controller_for(simulator, SQLite_Session_Registry(str(tmp_path / "sessions.db")))
+    assert controller.ensure_login() == (Return_Codes.SUCCESS,)
+    logins = onu.logins
+
+    # La ONU cierra la sesion justo antes de recibir el primer POST del cambio
+    posted_tokens = []
+    handle = onu.handle
+    def expiring_handle(method, path, form, client_ip):
+        if method == "POST" and path == "/boaform/admin/formWlanSetup":
+            posted_tokens.append((form.get("wlan_idx"), form.get("csrftoken")))
+            if len(posted_tokens) == 1:
+                onu.sessions.clear()
+        return handle(method, path, form, client_ip)
+    onu.handle = expiring_handle
+
+    assert controller.change_wifi_ssid("casa")[0] == Return_Codes.SUCCESS
+    assert onu.logins == logins + 1
+    # Una banda se manda dos veces (la rechazada y la repetida), la otra una sola
+    (first_band, rejected), (replayed_band, replayed) = posted_tokens[:2]
+    assert len(posted_tokens) == 3
+    assert replayed_band == first_band
+    assert replayed != rejected
+    assert onu.ssid[0] == onu.ssid[1] == "casa"
+
+def test_second_controller_reuses_session_from_shared_registry(simulator, tmp_path):
+    onu = simulator.onus[0]
+    path = str(tmp_path / "sessions.db")
+    first = controller_for(simulator, SQLite_Session_Registry(path))
+    assert first.ensure_login() == (Return_Codes.SUCCESS,)
+    logins = onu.logins
+
+    # Otro registro sobre el mismo archivo, como lo abriria otro proceso
+    second = controller_for(simulator, SQLite_Session_Registry(path))
+    assert second.ensure_login() == (Return_Codes.SUCCESS,)
+    assert isinstance(second.get_wifi_clients(), list)
+    assert onu.logins == logins
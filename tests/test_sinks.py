@@ -0,0 +1,71 @@
+import asyncio
+import io
+import json
+import os
+import subprocess
+import sys
+import pytest
+from cpe_manager.fleet import Fleet_Executor
+from cpe_manager.models.base import Return_Codes
+from cpe_manager.simulator import ONU_Simulator
+from cpe_manager.sinks import NDJSON_Sink, Parquet_Sink, awrite_stream, write_stream
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+RESULTS = [
+    {"cpe_address": "10.0.0.1", "model": "vsol_v2802dac", "result": [
+        {"device_name": "android", "device_ip": "192.168.1.43", "device_mac": "a5:4d:ca:18:25:30", "lease_time": 0}]},
+    {"cpe_address": "10.0.0.2", "model": "vsol_acz", "result": [
+        {"devname": "iPhone", "macAddr": "17:44:94:d6:49:3c", "ipAddr": "192.168.1.40", "liveTime": "70395"}]},
+    {"cpe_address": "10.0.0.3", "model": "vsol_acz", "result": []},
+    {"cpe_address": "10.0.0.4", "model": "vsol_v2802dac", "result": (Return_Codes.EXCEPTION, "cpe: 10.0.0.4 - msg: timeout")},
+]
+
+@pytest.fixture(scope="module")
+def simulator():
+    with ONU_Simulator(4) as simulator:
+        yield simulator
+
+def test_ndjson_sink_writes_one_line_per_cpe():
+    output = io.StringIO()
+    assert write_stream(RESULTS, NDJSON_Sink(output)) == 4
+    lines = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert [line["status"] for line in lines] == ["SUCCESS", "SUCCESS", "SUCCESS", "EXCEPTION"]
+    assert lines[0]["result"] == RESULTS[0]["result"]
+    assert lines[3]["result"] == ["EXCEPTION", "cpe: 10.0.0.4 - msg: timeout"]
+
+def test_parquet_rows_keep_zero_lease_time():
+    assert Parquet_Sink._client_fields(RESULTS[0]["result"][0])["lease_time"] == 0
+    assert Parquet_Sink._client_fields(RESULTS[1]["result"][0])["lease_time"] == "70395"
+    assert Parquet_Sink._client_fields({})["lease_time"] is None
+
+def test_parquet_sink_writes_one_row_per_client(tmp_path):
+    pyarrow_parquet = pytest.importorskip("pyarrow.parquet")
+    path = str(tmp_path / "clients.parquet")
+    write_stream(RESULTS, Parquet_Sink(path, row_group_size=2))
+    rows = pyarrow_parquet.read_table(path).to_pylist()
+    assert [(row["cpe_address"], row["status"]) for row in rows] == [
+        ("10.0.0.1", "SUCCESS"), ("10.0.0.2", "SUCCESS"), ("10.0.0.3", "SUCCESS"), ("10.0.0.4", "EXCEPTION")]
+    assert rows[0]["lease_time"] == "0"
+    assert rows[1]["device_mac"] == "17:44:94:d6:49:3c"
+
+def test_importing_sinks_does_not_import_pyarrow(tmp_path):
+    # Un pyarrow que falla al importarse: el modulo tiene que cargar igual y solo Parquet_Sink lo pide
+    (tmp_path / "pyarrow").mkdir()
+    (tmp_path / "pyarrow" / "__init__.py").write_text("raise ImportError('pyarrow roto')\n")
+    script = ("import sys, cpe_manager.sinks as sinks\n"
+              "assert 'pyarrow' not in sys.modules\n"
+              "try:\n    sinks.Parquet_Sink('x.parquet')\nexcept ImportError as e:\n    print(e)\n")
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([str(tmp_path), ROOT]))
+    output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True, env=env, cwd=tmp_path).stdout
+    assert output.strip() == "Parquet_Sink necesita el paquete pyarrow"
+
+def test_astream_to_ndjson(simulator, tmp_path):
+    path = str(tmp_path / "clients.ndjson")
+    executor = Fleet_Executor(max_workers=2)
+    count = asyncio.run(awrite_stream(executor.astream(simulator.inventory(), "get_wifi_clients", buffer_size=1), NDJSON_Sink(path)))
+    assert count == 4
+    with open(path, encoding="utf-8") as ndjson_file:
+        lines = [json.loads(line) for line in ndjson_file]
+    assert sorted(line["cpe_address"] for line in lines) == sorted(simulator.addresses)
+    assert all(line["status"] == "SUCCESS" and len(line["result"]) == 8 for line in lines)
@@ -0,0 +1,52 @@
+from cpe_manager.snapshot import Client_Snapshot
+
+def wifi(mac, sent="1200", received="3400", rate="72.2", rssi="-61", power_saving="no"):
+    return {"device_mac": mac, "packets_sent": sent, "packets_received": received,
+            "send_rate_mbps": rate, "rssi_dbm": rssi, "power_saving": power_saving}
+
+RESULTS = [
+    {"cpe_address": "10.0.0.1", "model": "vsol_v2802dac", "result": [
+        wifi("a4:5d:ca:18:25:30"),
+        wifi("bb:1d:6d:13:2c:de", rate="866.7", rssi="-90", power_saving="yes"),
+        # Fuera de rango para cada columna
+        wifi("cc:1d:6d:13:2c:de", sent="99999999999999999999999", rssi="-40000", rate="9999999999"),
+        # Valores que no vuelven iguales desde la columna tipada
+        wifi("DD:1D:6D:13:2C:DE", sent="007", rate="72.25", power_saving="maybe"),
+        # MAC en cero (antes era el sentinela) y una MAC que no entra en 48 bits
+        wifi("00:00:00:00:00:00"),
+        wifi("ff:ff:ff:ff:ff:ff:ff:ff"),
+    ]},
+    {"cpe_address": "10.0.0.2", "model": "vsol_v2802dac", "result": [
+        {"device_name": "android", "device_ip": "192.168.1.43", "device_mac": "a5:4d:ca:18:25:30", "lease_time": 14468},
+        {"device_name": "", "device_ip": "192.168.1.27", "device_mac": "9d:5c:34:60:be:31", "lease_time": 0},
+        {"device_name": None, "device_ip": "999.1.1.1", "device_mac": "", "lease_time": None},
+        # Faltan campos y sobra uno
+        {"device_ip": "0.0.0.0", "device_mac": "9d:5c:34:60:be:32", "hostname": "extra"},
+    ]},
+    {"cpe_address": "10.0.0.3", "model": "vsol_acz", "result": [
+        {"devname": "iPhone", "macAddr": "17:44:94:d6:49:3c", "ipAddr": "192.168.1.40", "liveTime": "70395"},
+        {"devname": "x", "macAddr": "17:44:94:d6:49:3d", "ipAddr": "192.168.1.41", "liveTime": "-9223372036854775808"},
+    ]},
+    # Los que no son listas de clientes se ignoran
+    {"cpe_address": "10.0.0.4", "model": "vsol_acz", "result": None},
+]
+
+def test_round_trip_is_exact():
+    snapshot = Client_Snapshot.from_results(RESULTS)
+    expected = { result["cpe_address"]: result["result"] for result in RESULTS if isinstance(result["result"], list) }
+    assert snapshot.to_results() == expected
+
+def test_by_mac_does_not_match_missing_macs():
+    snapshot = Client_Snapshot.from_results(RESULTS)
+    missing = [row for row in range(len(snapshot)) if snapshot[row].mac is None]
+    assert missing
+    zero = snapshot.by_mac("00:00:00:00:00:00")
+    assert [snapshot.to_dict(row)["device_mac"] for row in zero] == ["00:00:00:00:00:00"]
+    assert not set(zero) & set(missing)
+
+def test_select_keeps_rows_exact():
+    snapshot = Client_Snapshot.from_results(RESULTS)
+    rows = snapshot.by_mac("a5:4d:ca:18:25:30") + snapshot.rssi_below(-80)
+    selected = snapshot.select(rows)
+    assert [selected.to_dict(row) for row in range(len(selected))] == [snapshot.to_dict(row) for row in rows]
+    assert len(selected) == 2
@@ -0,0 +1,40 @@
+import json
+import os
+import subprocess
+import sys
+from cpe_manager.bench import HEAVY_MODULES, STARTUP_SCRIPT
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Un interprete nuevo tarda bastante mas que esto solo en arrancar, el limite es para notar un import pesado
+MAX_IMPORT_SECONDS = 1.0
+
+ENTRY_POINT_SCRIPT = """
+import json, sys
+from cpe_manager.cpe_manager import available_controllers, get_controller
+listed = "fake_model" in available_controllers()
+imported_before = "fake_cpe_module" in sys.modules
+controller = get_controller("fake_model")
+print(json.dumps({"listed": listed, "imported_before": imported_before, "name": controller.__name__, "model": controller.MODEL_NAME}))
+"""
+
+def run_python(script, *args, path=()):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([*path, ROOT]))
+    output = subprocess.run([sys.executable, "-c", script, *args], capture_output=True, text=True, check=True, env=env).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def test_get_controller_does_not_import_heavy_modules():
+    sample = run_python(STARTUP_SCRIPT, "vsol_v2802dac", *HEAVY_MODULES)
+    assert sample["heavy"] == []
+    assert sample["seconds"] < MAX_IMPORT_SECONDS
+
+def test_entry_point_controller_is_registered_lazily(tmp_path):
+    dist_info = tmp_path / "fake_cpe-1.0.dist-info"
+    dist_info.mkdir()
+    (dist_info / "METADATA").write_text("Metadata-Version: 2.1\nName: fake-cpe\nVersion: 1.0\n")
+    (dist_info / "entry_points.txt").write_text("[cpe_manager.controllers]\nfake_model = fake_cpe_module:Fake_Controller\n")
+    (tmp_path / "fake_cpe_module.py").write_text(
+        "from cpe_manager.models.base import CPE_HTTP_Controller\n"
+        "class Fake_Controller(CPE_HTTP_Controller):\n"
+        "    MODEL_NAME = 'fake_model'\n")
+    result = run_python(ENTRY_POINT_SCRIPT, path=[str(tmp_path)])
+    assert result == {"listed": True, "imported_before": False, "name": "Fake_Controller", "model": "fake_model"}
@@ -0,0 +1,71 @@
+import os
+from cpe_manager.store import Snapshot_Store
+
+def dhcp_results(cpe_address, *clients):
+    return [{"cpe_address": cpe_address, "model": "vsol_v2802dac",
+             "result": [{"device_name": name, "device_ip": ip, "device_mac": mac, "lease_time": 60} for mac, ip, name in clients]}]
+
+PHONE = ("aa:bb:cc:00:00:01", "192.168.1.10", "telefono")
+LAPTOP = ("aa:bb:cc:00:00:02", "192.168.1.11", "notebook")
+
+def fill(store):
+    for timestamp in range(10):
+        store.append_results(dhcp_results("10.0.0.1", PHONE, LAPTOP), timestamp=float(timestamp))
+    # El telefono se mueve de ONU
+    for timestamp in range(10, 15):
+        store.append_results(dhcp_results("10.0.0.2", PHONE), timestamp=float(timestamp))
+
+def test_append_reopen_and_query(tmp_path):
+    with Snapshot_Store(str(tmp_path), segment_records=4) as store:
+        fill(store)
+        assert len(store) == 25
+    with Snapshot_Store(str(tmp_path), segment_records=4) as store:
+        assert len(store) == 25
+        assert store.where_is(PHONE[0]) == ("10.0.0.2", 10.0, 14.0)
+        assert store.where_is("aa:bb:cc:00:00:99") is None
+        assert [record["timestamp"] for record in store.by_mac(LAPTOP[0])] == [float(t) for t in range(10)]
+        assert len(store.by_cpe("10.0.0.2")) == 5
+        records = list(store.time_range(3.0, 11.0))
+        assert [record["timestamp"] for record in records] == sorted(record["timestamp"] for record in records)
+        assert len(records) == 7 * 2 + 1
+        assert records[0] == {"timestamp": 3.0, "cpe_address": "10.0.0.1", "mac": PHONE[0], "ip": PHONE[1],
+                              "name": PHONE[2], "rssi_dbm": None, "kind": "dhcp"}
+
+def test_compact_while_time_range_is_iterating(tmp_path):
+    with Snapshot_Store(str(tmp_path), segment_records=4) as store:
+        fill(store)
+        iterator = store.time_range(0.0, 100.0)
+        first = [next(iterator) for _ in range(3)]
+        removed = store.compact()
+        rest = list(iterator)
+        assert len(first) + len(rest) == 25
+        # De cada estadia en los segmentos cerrados quedan la primera y la ultima observacion, el activo no se toca
+        assert removed == 24 - 6
+        assert len(store) == 7
+        assert store.where_is(PHONE[0]) == ("10.0.0.2", 10.0, 14.0)
+    with Snapshot_Store(str(tmp_path), segment_records=4) as store:
+        assert len(store) == 7
+
+def test_files_not_in_manifest_are_removed_on_open(tmp_path):
+    with Snapshot_Store(str(tmp_path), segment_records=4) as store:
+        fill(store)
+        sealed = {segment.seq for segment in store.segments}
+    # Lo que deja una compactacion cortada antes de reemplazar el manifest
+    leftover = max(sealed) + 100
+    for suffix in ("seg", "mac", "cpe", "json"):
+        (tmp_path / f"{leftover:08d}.{suffix}").write_bytes(b"")
+    (tmp_path / f"{leftover + 1:08d}.seg.tmp").write_bytes(b"")
+    with Snapshot_Store(str(tmp_path), segment_records=4) as store:
+        assert {segment.seq for segment in store.segments} == sealed
+        assert len(store) == 25
+    assert not any(name.startswith(f"{leftover:08d}") or name.endswith(".tmp") for name in os.listdir(tmp_path))
+
+def test_retention_drops_old_segments(tmp_path):
+    with Snapshot_Store(str(tmp_path), segment_records=4) as store:
+        fill(store)
+        # Segmentos de 4 registros: solo sobreviven el de t=10..13 y el activo
+        assert store.apply_retention(max_age=5, now=15.0) == 5
+        assert [record["timestamp"] for record in store.time_range(0.0, 100.0)] == [10.0, 11.0, 12.0, 13.0, 14.0]
+    with Snapshot_Store(str(tmp_path), segment_records=4) as store:
+        assert store.by_mac(LAPTOP[0]) == []
+        assert len(store) == 5